@@ -2,38 +2,61 @@ import os
 import uvicorn
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response, PlainTextResponse
+from fastapi.middleware.gzip import GZipMiddleware
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any, Union
-from datetime import datetime, date
-from decimal import Decimal
-import json
+import asyncio
+import logging
+import time
 
 from config import Config
-from src.core import AskData
+from src.core import AskData, SQLCache
+from src.sql import ResultCache, CostGuard
 from src.utils.logger import setup_logging
+from src.utils.metrics import METRICS
+from src.utils.encoding import ENCODERS, negotiate, encode_json, encode_sse, StreamCompressor
 from contextlib import asynccontextmanager
 
 from fastapi.responses import JSONResponse
+from collections import OrderedDict
+import threading
 
-# 自定义 JSON 处理器处理 Decimal 等类型
-def json_serial(obj):
-    if isinstance(obj, (datetime, date)):
-        return obj.isoformat()
-    if isinstance(obj, Decimal):
-        return float(obj)
-    raise TypeError(f"Type {type(obj)} not serializable")
+logger = logging.getLogger(__name__)
 
+
+def _server_timing(encode_ms: float) -> str:
+    return f"encode;dur={encode_ms:.3f}"
+
+
+# 自定义 JSON 响应：走快速编码路径（原生处理 Decimal、日期、二进制），并记录编码耗时
 class CustomJSONResponse(JSONResponse):
     def render(self, content: Any) -> bytes:
-        return json.dumps(
-            content,
-            ensure_ascii=False,
-            allow_nan=False,
-            indent=None,
-            separators=(",", ":"),
-            default=json_serial,
-        ).encode("utf-8")
+        start = time.perf_counter()
+        body = encode_json(content)
+        self.encode_ms = (time.perf_counter() - start) * 1000
+        return body
+
+    def init_headers(self, headers=None):
+        super().init_headers(headers)
+        encode_ms = getattr(self, "encode_ms", None)
+        if encode_ms is not None:
+            self.raw_headers.append((b"server-timing", _server_timing(encode_ms).encode()))
+
+
+def negotiated_response(request: Request, content: Any) -> Response:
+    """按 Accept 请求头选择编码格式（JSON / msgpack）返回响应"""
+    media_type = negotiate(request.headers.get("accept"))
+    if media_type == "application/json":
+        return CustomJSONResponse(content)
+    start = time.perf_counter()
+    body = ENCODERS[media_type](content)
+    encode_ms = (time.perf_counter() - start) * 1000
+    return Response(
+        body,
+        media_type=media_type,
+        headers={"Server-Timing": _server_timing(encode_ms), "Vary": "Accept"},
+    )
 
 # 实例化 AskData
 asker = None
@@ -41,10 +64,13 @@ asker = None
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # 启动时：初始化日志和 Asker
-    setup_logging()
+    setup_logging(level=Config.LOG_LEVEL)
     get_asker()
     yield
     # 关闭时：清理资源
+    for variant in _asker_variants.values():
+        variant.close()
+    _asker_variants.clear()
     if asker:
         asker.close()
 
@@ -56,65 +82,203 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# 普通响应的 gzip 压缩（SSE 由 /api/ask 自行按事件压缩）
+if Config.COMPRESS_MIN_SIZE > 0:
+    app.add_middleware(GZipMiddleware, minimum_size=Config.COMPRESS_MIN_SIZE)
+
+# 按 LLM 配置缓存的派生实例 (LRU)，共享默认实例的数据库引擎和 schema 缓存
+_asker_variants: "OrderedDict[tuple, AskData]" = OrderedDict()
+_asker_lock = threading.Lock()
+
+
+def _resolve_llm_params(overrides: Optional[dict] = None) -> dict:
+    """根据请求中的覆盖配置解析 LLM 参数"""
+    safe_overrides = overrides or {}
+    base_model = safe_overrides.get("model")
+
+    # 智能判定 Provider
+    # 如果模型名包含 claude，则强制使用 anthropic 提供商
+    if base_model and "claude" in base_model.lower():
+        provider = "anthropic"
+    elif not base_model:
+        provider = Config.LLM_PROVIDER
+    else:
+        provider = "qwen"
+
+    llm_params = {
+        "llm_provider": provider,
+        "max_tokens": int(safe_overrides.get("max_tokens", Config.MAX_TOKENS)),
+        "temperature": float(safe_overrides.get("temperature", Config.TEMPERATURE)),
+        "model": base_model
+    }
+
+    if provider == "qwen":
+        llm_params.update({
+            "api_key": Config.QWEN_API_KEY,
+            "base_url": Config.QWEN_BASE_URL,
+        })
+        if not llm_params["model"]:
+            llm_params["model"] = Config.QWEN_MODEL
+    elif provider == "replay":
+        llm_params["llm_options"] = Config.replay_options()
+        if not llm_params["model"]:
+            llm_params["model"] = "replay"
+    else:
+        llm_params.update({
+            "api_key": Config.ANTHROPIC_API_KEY,
+        })
+        if not llm_params["model"]:
+            llm_params["model"] = Config.CLAUDE_MODEL
+    return llm_params
+
+
+def _variant_key(llm_params: dict) -> tuple:
+    return (
+        llm_params["llm_provider"],
+        llm_params["model"],
+        llm_params["temperature"],
+        llm_params["max_tokens"],
+    )
+
+
+def _build_sql_cache() -> Optional[SQLCache]:
+    if Config.SQL_CACHE_SIZE <= 0:
+        return None
+    return SQLCache(
+        max_size=Config.SQL_CACHE_SIZE,
+        ttl=Config.SQL_CACHE_TTL,
+        similarity_threshold=Config.SQL_CACHE_SIMILARITY,
+    )
+
+
+def _build_result_cache() -> Optional[ResultCache]:
+    if Config.RESULT_CACHE_MB <= 0:
+        return None
+    return ResultCache(
+        max_bytes=int(Config.RESULT_CACHE_MB * 1024 * 1024),
+        ttl=Config.RESULT_CACHE_TTL,
+    )
+
+
+def _build_cost_guard() -> Optional[CostGuard]:
+    if Config.COST_GUARD == "off":
+        return None
+    return CostGuard(
+        mode=Config.COST_GUARD,
+        max_rows=Config.COST_GUARD_MAX_ROWS,
+        max_cost=Config.COST_GUARD_MAX_COST,
+    )
+
+
 def get_asker(overrides: Optional[dict] = None):
     global asker
-    if asker is None or overrides:
-        Config.validate()
-        
-        # 基础配置
-        safe_overrides = overrides or {}
-        base_model = safe_overrides.get("model")
-        
-        # 智能判定 Provider
-        # 如果模型名包含 claude，则强制使用 anthropic 提供商
-        if base_model and "claude" in base_model.lower():
-            provider = "anthropic"
-        elif not base_model:
-            provider = Config.LLM_PROVIDER
-        else:
-            provider = "qwen"
-
-        llm_params = {
-            "llm_provider": provider,
-            "max_tokens": int(safe_overrides.get("max_tokens", Config.MAX_TOKENS)),
-            "temperature": float(safe_overrides.get("temperature", Config.TEMPERATURE)),
-            "model": base_model
-        }
-
-        if provider == "qwen":
-            llm_params.update({
-                "api_key": Config.QWEN_API_KEY,
-                "base_url": Config.QWEN_BASE_URL,
-            })
-            if not llm_params["model"]:
-                llm_params["model"] = Config.QWEN_MODEL
-        else:
-            llm_params.update({
-                "api_key": Config.ANTHROPIC_API_KEY,
-            })
-            if not llm_params["model"]:
-                llm_params["model"] = Config.CLAUDE_MODEL
-        
-        current_asker = AskData(
-            database_url=Config.DATABASE_URL,
-            allow_only_select=Config.ALLOW_ONLY_SELECT,
-            max_results=Config.MAX_RESULTS,
-            **llm_params
-        )
+    with _asker_lock:
+        if asker is None:
+            Config.validate()
+            asker = AskData(
+                database_url=Config.DATABASE_URL,
+                allow_only_select=Config.ALLOW_ONLY_SELECT,
+                max_results=Config.MAX_RESULTS,
+                db_max_workers=Config.DB_MAX_WORKERS,
+                schema_sample_workers=Config.SCHEMA_SAMPLE_WORKERS,
+                schema_snapshot_dir=Config.SCHEMA_SNAPSHOT_DIR or None,
+                schema_top_k=Config.SCHEMA_TOP_K,
+                sql_cache=_build_sql_cache(),
+                result_cache=_build_result_cache(),
+                probe_tables=Config.RESULT_CACHE_PROBE,
+                stream_chunk_size=Config.STREAM_CHUNK_SIZE,
+                db_options=Config.db_options(),
+                statement_timeout=Config.STATEMENT_TIMEOUT,
+                limit_pushdown=Config.LIMIT_PUSHDOWN,
+                cost_guard=_build_cost_guard(),
+                llm_record_file=Config.LLM_RECORD_FILE or None,
+                **_resolve_llm_params()
+            )
         if not overrides:
-            asker = current_asker
-        return current_asker
-    return asker
+            return asker
+
+        llm_params = _resolve_llm_params(overrides)
+        key = _variant_key(llm_params)
+        if key == _variant_key(_resolve_llm_params()):
+            return asker
+
+        variant = _asker_variants.get(key)
+        if variant is not None:
+            _asker_variants.move_to_end(key)
+            return variant
+
+        variant = asker.derive(**llm_params)
+        _asker_variants[key] = variant
+        if len(_asker_variants) > Config.ASKER_CACHE_SIZE:
+            _, evicted = _asker_variants.popitem(last=False)
+            evicted.close()
+        return variant
 
 class QuestionRequest(BaseModel):
     question: str
     config: Optional[dict] = None
 
 from fastapi.responses import FileResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+
+async def _wait_disconnect(request: Request):
+    while not await request.is_disconnected():
+        await asyncio.sleep(Config.DISCONNECT_POLL_INTERVAL)
+
+
+async def _until_disconnect(request: Request, events):
+    """
+    逐个转发事件，客户端断开时取消正在进行的步骤
+
+    取消会传入问数流程中正在等待的数据库查询（中断数据库上的查询）
+    或 LLM 流（关闭与模型服务的连接，不再消耗 token）。
+    """
+    disconnected = asyncio.ensure_future(_wait_disconnect(request))
+    pending = None
+    try:
+        while True:
+            pending = asyncio.ensure_future(events.__anext__())
+            await asyncio.wait({pending, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if not pending.done():
+                logger.info("客户端已断开，取消进行中的查询")
+                return
+            try:
+                event = pending.result()
+            except StopAsyncIteration:
+                return
+            pending = None
+            yield event
+    finally:
+        for task in (pending, disconnected):
+            if task is not None and not task.done():
+                task.cancel()
+        if pending is not None:
+            await asyncio.gather(pending, return_exceptions=True)
+        await events.aclose()
+
 
 @app.post("/api/ask")
 async def ask_question(request_body: QuestionRequest, request: Request):
+    compressor = None
+    headers = {}
+    if Config.SSE_COMPRESS and "gzip" in request.headers.get("accept-encoding", ""):
+        compressor = StreamCompressor()
+        headers = {"Content-Encoding": "gzip", "Vary": "Accept-Encoding"}
+
     async def event_generator():
+        encode_seconds, total_bytes = 0.0, 0
+
+        def emit(event) -> bytes:
+            nonlocal encode_seconds, total_bytes
+            start = time.perf_counter()
+            chunk = encode_sse(event)
+            total_bytes += len(chunk)
+            if compressor is not None:
+                chunk = compressor.compress(chunk)
+            encode_seconds += time.perf_counter() - start
+            return chunk
+
         try:
             # 提取访客信息
             user_context = {
@@ -124,14 +288,63 @@ async def ask_question(request_body: QuestionRequest, request: Request):
                 "referer": request.headers.get("referer")
             }
             
-            a = get_asker(overrides=request_body.config)
-            for event in a.ask_stream(request_body.question, user_context=user_context):
+            # 创建实例涉及建立数据库连接，放入线程池避免阻塞事件循环
+            a = await run_in_threadpool(get_asker, request_body.config)
+            events = a.ask_astream(request_body.question, user_context=user_context)
+            async for event in _until_disconnect(request, events):
+                if event["type"] == "timing":
+                    # 序列化在应用层完成，补充到最终的耗时事件中
+                    event["content"]["serialize_ms"] = round(encode_seconds * 1000, 2)
+                    METRICS.stage_seconds.observe("serialize", encode_seconds)
                 # 按照 SSE 格式发送数据
-                yield f"data: {json.dumps(event, default=json_serial, ensure_ascii=False)}\n\n"
+                yield emit(event)
         except Exception as e:
-            yield f"data: {json.dumps({'type': 'error', 'content': str(e)}, ensure_ascii=False)}\n\n"
+            yield emit({"type": "error", "content": str(e)})
+        finally:
+            logger.info(
+                f"SSE 编码耗时 {encode_seconds * 1000:.2f}ms, 原始 {total_bytes} 字节"
+            )
+        if compressor is not None:
+            yield compressor.finish()
 
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+    return StreamingResponse(
+        event_generator(), media_type="text/event-stream", headers=headers
+    )
+
+class BatchQuestionRequest(BaseModel):
+    questions: List[str]
+    explain: bool = False
+    config: Optional[dict] = None
+
+@app.post("/api/ask_batch")
+async def ask_batch(request_body: BatchQuestionRequest, request: Request):
+    """批量问数，按完成顺序以 JSONL 逐行返回每个问题的结果和耗时"""
+    if len(request_body.questions) > Config.BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"单次最多 {Config.BATCH_MAX_QUESTIONS} 个问题"
+        )
+
+    async def line_generator():
+        user_context = {
+            "ip": request.client.host,
+            "user_agent": request.headers.get("user-agent"),
+            "forwarded_for": request.headers.get("x-forwarded-for"),
+            "referer": request.headers.get("referer"),
+            "batch": True,
+        }
+        a = await run_in_threadpool(get_asker, request_body.config)
+        results = a.ask_many(
+            request_body.questions,
+            explain_results=request_body.explain,
+            llm_concurrency=Config.BATCH_LLM_CONCURRENCY,
+            db_concurrency=Config.BATCH_DB_CONCURRENCY,
+            user_context=user_context,
+        )
+        async for result in _until_disconnect(request, results):
+            yield encode_json(result) + b"\n"
+
+    return StreamingResponse(line_generator(), media_type="application/x-ndjson")
 
 @app.get("/api/examples")
 async def get_examples():
@@ -143,24 +356,48 @@ async def get_examples():
     ]
 
 @app.get("/api/full_schema")
-async def get_full_schema():
+async def get_full_schema(request: Request):
     try:
-        a = get_asker()
-        return a.schema_analyzer.get_database_schema()
+        a = await run_in_threadpool(get_asker)
+        schema = await run_in_threadpool(a.schema_analyzer.get_cached_schema)
+        return negotiated_response(request, schema)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/db_info")
-async def get_db_info():
+async def get_db_info(request: Request):
     try:
-        a = get_asker()
-        return {
-            "tables": a.get_tables(),
-            "schema_description": a.schema_description
-        }
+        a = await run_in_threadpool(get_asker)
+        # 冷启动时读取 schema 描述需要完整反射数据库，放到线程池中，不阻塞其他 SSE 流
+        tables = await run_in_threadpool(a.get_tables)
+        description = await run_in_threadpool(lambda: a.schema_description)
+        return negotiated_response(request, {
+            "tables": tables,
+            "schema_description": description
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/cache_stats")
+async def get_cache_stats():
+    a = get_asker()
+    return {
+        "sql_cache": a.sql_cache.stats() if a.sql_cache else None,
+        "result_cache": (
+            a.executor.result_cache.stats() if a.executor.result_cache else None
+        ),
+    }
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus 文本格式的各阶段耗时直方图与 token 用量"""
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/pool_stats")
+async def get_pool_stats():
+    a = get_asker()
+    return a.db_connector.pool_stats()
+
 # 挂载静态文件
 if not os.path.exists("static"):
     os.makedirs("static")
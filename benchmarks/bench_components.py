@@ -0,0 +1,213 @@
+"""
+组件级微基准
+
+在合成 SQLite 库上分别计时请求路径中由本项目代码负责的部分（不含 LLM 调用）：
+- schema 反射、SchemaAnalyzer.generate_schema_description、按问题筛选 schema，并报告提示词字符数
+- SQLValidator.validate / sanitize（解析缓存冷、热两种情况）
+- SQLExecutor.execute / format_results
+- 查询结果的 JSON 编码（SSE 使用的列式格式和 /api/ask 非流式使用的行字典格式）
+结果写入 JSON，可用 benchmarks.compare 对比不同提交。
+
+用法:
+    python -m benchmarks.bench_components --tables 2000 --columns 30 --rows 1000000
+"""
+
+from typing import Any, Dict
+import argparse
+
+from src.database import DatabaseConnector, SchemaAnalyzer
+from src.llm.prompts import get_text_to_sql_system_prompt, get_text_to_sql_user_prompt
+from src.sql import SQLValidator, SQLExecutor
+from src.sql import parser as sql_parser
+from src.utils.encoding import encode_json, orjson
+
+from .common import environment, measure, write_results
+from .gen_db import add_arguments, column_of, ensure_database, table_name
+
+QUESTION = "total amount of orders by customers status"
+
+
+def query_cases() -> Dict[str, str]:
+    """执行器基准的查询：点查、宽表扫描、聚合、关联聚合"""
+    fact, dim = table_name(0), table_name(1)
+    status, amount, name = column_of("status"), column_of("amount"), column_of("name")
+    return {
+        "point": f"SELECT * FROM {fact} WHERE id = 42",
+        "scan": f"SELECT * FROM {fact}",
+        "aggregate": (
+            f"SELECT {status}, COUNT(*) AS cnt, SUM({amount}) AS total "
+            f"FROM {fact} GROUP BY {status} ORDER BY total DESC"
+        ),
+        "join": (
+            f"SELECT d.{name}, COUNT(*) AS cnt, AVG(f.{amount}) AS avg_amount "
+            f"FROM {fact} f JOIN {dim} d ON f.dim_id = d.id "
+            f"GROUP BY d.{name} ORDER BY cnt DESC LIMIT 20"
+        ),
+    }
+
+
+def validator_cases() -> Dict[str, str]:
+    """校验器基准的SQL：执行器查询之外，再加上带注释/字符串/CTE 的长查询和长 IN 列表"""
+    fact, dim = table_name(0), table_name(1)
+    status, amount = column_of("status"), column_of("amount")
+    cases = dict(query_cases())
+    cases["cte"] = f"""```sql
+-- 各状态的金额分布
+WITH paid AS (
+    SELECT id, dim_id, {amount} FROM {fact}
+    WHERE {status} IN ('paid', 'done; shipped') /* 字符串中的分号不是语句结束 */
+), ranked AS (
+    SELECT d.id, SUM(p.{amount}) AS total
+    FROM paid p JOIN {dim} d ON p.dim_id = d.id
+    GROUP BY d.id
+)
+SELECT * FROM ranked WHERE total > 100 ORDER BY total DESC;
+```
+以上查询统计了各状态的金额。"""
+    ids = ", ".join(str(i) for i in range(1, 1001))
+    cases["in_list"] = f"SELECT * FROM {fact} WHERE id IN ({ids})"
+    return cases
+
+
+def bench_schema(analyzer: SchemaAnalyzer, args) -> Dict[str, Any]:
+    timings, sizes = {}, {}
+    holder = {}
+
+    def reflect():
+        holder["schema"] = analyzer.get_database_schema()
+
+    timings["schema.reflect"] = measure(reflect, repeat=args.reflect_repeat, warmup=0)
+    sizes["schema_build_ms"] = dict(analyzer.last_build_timings)
+    schema = holder["schema"]
+
+    timings["schema.describe"] = measure(
+        lambda: analyzer.generate_schema_description(schema), repeat=args.repeat
+    )
+    description = analyzer.generate_schema_description(schema)
+
+    # 先构建一次缓存（与服务首个请求相同），再计时按问题筛选
+    analyzer.get_cached_description()
+    timings["schema.relevant"] = measure(
+        lambda: analyzer.get_relevant_description(QUESTION, top_k=args.top_k), repeat=args.repeat
+    )
+    relevant = analyzer.get_relevant_description(QUESTION, top_k=args.top_k)
+
+    user_prompt = get_text_to_sql_user_prompt(QUESTION)
+    sizes.update({
+        "tables": len(schema["tables"]),
+        "schema_description_chars": len(description),
+        "system_prompt_chars": len(get_text_to_sql_system_prompt(description)),
+        "relevant_description_chars": len(relevant),
+        "relevant_system_prompt_chars": len(get_text_to_sql_system_prompt(relevant)),
+        "user_prompt_chars": len(user_prompt),
+    })
+    return {"timings": timings, "sizes": sizes}
+
+
+def bench_validator(dialect: str, args) -> Dict[str, Any]:
+    timings, sizes = {}, {}
+    validator = SQLValidator(dialect=dialect)
+    for case, sql in validator_cases().items():
+        is_valid, message = validator.validate(sql)
+        if not is_valid:
+            raise RuntimeError(f"基准SQL {case} 未通过校验: {message}")
+        sizes[f"{case}_chars"] = len(sql)
+
+        def cold(sql=sql):
+            # 清空解析缓存，计时完整的分词与解析
+            sql_parser._parse_cache.clear()
+            validator.validate(sql)
+
+        timings[f"validator.validate_cold.{case}"] = measure(cold, repeat=args.repeat)
+        timings[f"validator.validate_warm.{case}"] = measure(
+            lambda sql=sql: validator.validate(sql), repeat=args.repeat
+        )
+        timings[f"validator.sanitize_warm.{case}"] = measure(
+            lambda sql=sql: validator.sanitize(sql), repeat=args.repeat
+        )
+    return {"timings": timings, "sizes": sizes}
+
+
+def bench_executor(executor: SQLExecutor, args) -> Dict[str, Any]:
+    timings, sizes = {}, {}
+    for case, sql in query_cases().items():
+        timings[f"executor.execute.{case}"] = measure(
+            lambda sql=sql: executor.execute(sql), repeat=args.repeat
+        )
+        data = executor.execute(sql)
+        timings[f"executor.format_results.{case}"] = measure(
+            lambda data=data: executor.format_results(data), repeat=args.repeat
+        )
+        wire = data.to_wire()
+        timings[f"json.wire.{case}"] = measure(lambda wire=wire: encode_json(wire), repeat=args.repeat)
+        timings[f"json.records.{case}"] = measure(
+            lambda data=data: encode_json(list(data.records)), repeat=args.repeat
+        )
+        sizes[case] = {
+            "rows": len(data),
+            "columns": len(data.columns),
+            "truncated": data.truncated,
+            "wire_json_bytes": len(encode_json(wire)),
+            "records_json_bytes": len(encode_json(list(data.records))),
+        }
+    return {"timings": timings, "sizes": sizes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="组件级微基准")
+    add_arguments(parser)
+    parser.add_argument("--repeat", type=int, default=10, help="每项计时次数（默认 10）")
+    parser.add_argument("--reflect-repeat", type=int, default=3, help="schema 反射计时次数（默认 3）")
+    parser.add_argument("--max-results", type=int, default=1000, help="执行器最大返回行数（默认 1000）")
+    parser.add_argument("--top-k", type=int, default=10, help="按问题筛选保留的表数量（默认 10）")
+    parser.add_argument("--output", help="结果 JSON 路径，默认 benchmarks/results/components-<commit>.json")
+    args = parser.parse_args()
+
+    path = ensure_database(args.tables, args.columns, args.rows, args.dim_rows, args.data_dir)
+    connector = DatabaseConnector(f"sqlite:///{path}")
+    engine = connector.engine
+    analyzer = SchemaAnalyzer(engine)
+    executor = SQLExecutor(engine, max_results=args.max_results, probe_tables=False)
+
+    results = {
+        "meta": {
+            **environment(),
+            "benchmark": "components",
+            "json_encoder": f"orjson {orjson.__version__}",
+            "params": {
+                "tables": args.tables,
+                "columns": args.columns,
+                "rows": args.rows,
+                "dim_rows": args.dim_rows,
+                "repeat": args.repeat,
+                "max_results": args.max_results,
+                "top_k": args.top_k,
+            },
+        },
+        "timings": {},
+        "sizes": {},
+    }
+    try:
+        for name, run in (
+            ("schema", lambda: bench_schema(analyzer, args)),
+            ("validator", lambda: bench_validator(engine.dialect.name, args)),
+            ("executor", lambda: bench_executor(executor, args)),
+        ):
+            part = run()
+            results["timings"].update(part["timings"])
+            results["sizes"][name] = part["sizes"]
+    finally:
+        executor.close()
+        connector.close()
+
+    width = max(len(name) for name in results["timings"])
+    print(f"{'benchmark'.ljust(width)}  {'median_ms':>12}  {'p95_ms':>12}")
+    for name, stats in results["timings"].items():
+        print(f"{name.ljust(width)}  {stats['median_ms']:>12.4f}  {stats['p95_ms']:>12.4f}")
+    print(f"提示词字符数: {results['sizes']['schema']['system_prompt_chars']:,}"
+          f"（按问题筛选后 {results['sizes']['schema']['relevant_system_prompt_chars']:,}）")
+    print(f"结果已写入 {write_results(results, args.output, 'components')}")
+
+
+if __name__ == "__main__":
+    main()
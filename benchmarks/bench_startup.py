@@ -0,0 +1,120 @@
+"""
+启动（导入）耗时基准
+
+在全新的子进程中以 python -X importtime 导入各目标模块，重复多次取中位数，报告：
+- wall_ms: 子进程从启动到退出的总耗时（含解释器启动，与自动扩容时 worker 冷启动相当）
+- import_ms: -X importtime 统计的全部模块导入耗时
+- packages: 按顶层包汇总的导入耗时（最重的若干个），以及是否加载了 anthropic/openai/numpy
+结果写入 JSON，可用 benchmarks.compare 对比不同提交。
+
+用法:
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --target app --target src.llm.qwen --repeat 10
+"""
+
+from typing import Any, Dict, List
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+from .common import ROOT_DIR, environment, summarize, write_results
+
+DEFAULT_TARGETS = ("src.core", "app", "main", "src.llm.claude", "src.llm.qwen", "src.llm.replay")
+
+# 关注是否被意外提前加载的重量级依赖
+HEAVY_PACKAGES = ("anthropic", "openai", "numpy")
+
+
+def parse_importtime(stderr: str) -> Dict[str, Any]:
+    """解析 -X importtime 输出，返回总导入耗时（微秒）和各顶层包的自身耗时之和"""
+    total = 0
+    packages: Dict[str, int] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # 表头
+        self_us = int(fields[0])
+        package = fields[2].strip().split(".")[0]
+        total += self_us
+        packages[package] = packages.get(package, 0) + self_us
+    return {"total_us": total, "packages": packages}
+
+
+def run_once(target: str) -> Dict[str, Any]:
+    """在新进程中导入 target（为空时只启动解释器）"""
+    code = f"import {target}" if target else "pass"
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(f"导入 {target} 失败:\n{proc.stderr[-2000:]}")
+    parsed = parse_importtime(proc.stderr)
+    return {"wall_ms": wall_ms, **parsed}
+
+
+def bench_target(target: str, repeat: int, top: int) -> Dict[str, Any]:
+    runs = [run_once(target) for _ in range(repeat)]
+    packages: Dict[str, List[int]] = {}
+    for run in runs:
+        for name, us in run["packages"].items():
+            packages.setdefault(name, []).append(us)
+    # 各包取中位数，按耗时降序保留前 top 个
+    medians = {name: statistics.median(values) / 1000 for name, values in packages.items()}
+    heaviest = sorted(medians.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        "wall": summarize([run["wall_ms"] for run in runs]),
+        "import": summarize([run["total_us"] / 1000 for run in runs]),
+        "packages_ms": {name: round(ms, 2) for name, ms in heaviest},
+        "loaded": {name: name in packages for name in HEAVY_PACKAGES},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动（导入）耗时基准")
+    parser.add_argument("--target", action="append", help=f"要导入的模块，可重复（默认 {', '.join(DEFAULT_TARGETS)}）")
+    parser.add_argument("--repeat", type=int, default=5, help="每个目标的子进程次数（默认 5）")
+    parser.add_argument("--top", type=int, default=10, help="报告耗时最多的顶层包数量（默认 10）")
+    parser.add_argument("--output", help="结果 JSON 路径，默认 benchmarks/results/startup-<commit>.json")
+    args = parser.parse_args()
+
+    targets = args.target or list(DEFAULT_TARGETS)
+    results = {
+        "meta": {
+            **environment(),
+            "benchmark": "startup",
+            "params": {"targets": targets, "repeat": args.repeat},
+        },
+        "timings": {},
+        "targets": {},
+    }
+
+    # 解释器自身的启动耗时作为基线
+    baseline = bench_target("", args.repeat, args.top)
+    results["targets"]["(python)"] = baseline
+    results["timings"]["startup.wall.(python)"] = baseline["wall"]
+
+    print(f"{'target':<20} {'wall_ms':>10} {'import_ms':>10}  已加载")
+    print(f"{'(python)':<20} {baseline['wall']['median_ms']:>10.1f} {baseline['import']['median_ms']:>10.1f}")
+    for target in targets:
+        stats = bench_target(target, args.repeat, args.top)
+        results["targets"][target] = stats
+        # timings 与其他基准同构，便于 benchmarks.compare 对比
+        results["timings"][f"startup.wall.{target}"] = stats["wall"]
+        results["timings"][f"startup.import.{target}"] = stats["import"]
+        loaded = ", ".join(name for name, hit in stats["loaded"].items() if hit) or "-"
+        print(f"{target:<20} {stats['wall']['median_ms']:>10.1f} {stats['import']['median_ms']:>10.1f}  {loaded}")
+
+    print(f"结果已写入 {write_results(results, args.output, 'startup')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""基准测试公共工具：计时统计、运行环境信息和结果输出"""
+
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+
+def percentile(values: List[float], q: float) -> float:
+    """线性插值的分位数，q 取 0~100"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * q / 100
+    low = int(pos)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (pos - low)
+
+
+def summarize(samples_ms: List[float]) -> Dict[str, float]:
+    """耗时样本（毫秒）的统计摘要"""
+    return {
+        "repeat": len(samples_ms),
+        "min_ms": round(min(samples_ms), 4),
+        "median_ms": round(statistics.median(samples_ms), 4),
+        "mean_ms": round(statistics.fmean(samples_ms), 4),
+        "p95_ms": round(percentile(samples_ms, 95), 4),
+        "max_ms": round(max(samples_ms), 4),
+    }
+
+
+def measure(func: Callable[[], Any], repeat: int = 10, warmup: int = 1) -> Dict[str, float]:
+    """
+    重复调用 func 并统计耗时
+
+    Args:
+        func: 被测函数（无参数）
+        repeat: 计时次数
+        warmup: 不计时的预热次数
+
+    Returns:
+        统计摘要 {repeat, min_ms, median_ms, mean_ms, p95_ms, max_ms}
+    """
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(max(repeat, 1)):
+        start = time.perf_counter_ns()
+        func()
+        samples.append((time.perf_counter_ns() - start) / 1e6)
+    return summarize(samples)
+
+
+def _git(*args) -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", *args], cwd=ROOT_DIR, capture_output=True, text=True, timeout=10, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def environment() -> Dict[str, Any]:
+    """运行环境信息，用于跨提交对比结果时确认可比性"""
+    status = _git("status", "--porcelain", "--untracked-files=no")
+    return {
+        "commit": _git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(status) if status is not None else None,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def write_results(results: Dict[str, Any], output: Optional[str], prefix: str) -> str:
+    """
+    将结果写入 JSON 文件
+
+    Args:
+        results: 基准测试结果
+        output: 输出路径，为空时写入 benchmarks/results/<prefix>-<commit>.json
+        prefix: 默认文件名前缀
+
+    Returns:
+        实际写入的路径
+    """
+    if not output:
+        meta = results.get("meta", {})
+        tag = meta.get("commit") or datetime.now().strftime("%Y%m%d%H%M%S")
+        if meta.get("dirty"):
+            tag += "-dirty"
+        output = os.path.join(RESULTS_DIR, f"{prefix}-{tag}.json")
+    directory = os.path.dirname(os.path.abspath(output))
+    os.makedirs(directory, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    return output
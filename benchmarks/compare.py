@@ -0,0 +1,68 @@
+"""
+对比两次基准结果
+
+按同名计时项的中位数计算变化比例，超过阈值的变慢项标记为回归；
+存在回归时以非零状态码退出，便于在 CI 中使用。
+
+用法:
+    python -m benchmarks.compare benchmarks/results/components-abc123.json benchmarks/results/components-def456.json
+"""
+
+import argparse
+import json
+import sys
+
+
+def load(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(base: dict, head: dict, threshold: float = 0.1, metric: str = "median_ms") -> list:
+    """
+    逐项对比
+
+    Returns:
+        [(计时项, 基准值, 新值, 变化比例, 是否回归)]，只包含两边都有的计时项
+    """
+    rows = []
+    base_timings, head_timings = base.get("timings", {}), head.get("timings", {})
+    for name, stats in head_timings.items():
+        if name not in base_timings:
+            continue
+        old, new = base_timings[name][metric], stats[metric]
+        change = (new - old) / old if old > 0 else 0.0
+        rows.append((name, old, new, change, change > threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比两次基准结果")
+    parser.add_argument("base", help="基准结果 JSON")
+    parser.add_argument("head", help="新结果 JSON")
+    parser.add_argument("--threshold", type=float, default=0.1, help="判定回归的变慢比例（默认 0.1 即 10%%）")
+    parser.add_argument("--metric", default="median_ms", help="对比的统计量（默认 median_ms）")
+    args = parser.parse_args()
+
+    base, head = load(args.base), load(args.head)
+    if base.get("meta", {}).get("params") != head.get("meta", {}).get("params"):
+        print("警告: 两次结果的基准参数不同，对比可能没有意义", file=sys.stderr)
+
+    rows = compare(base, head, args.threshold, args.metric)
+    if not rows:
+        print("没有可对比的计时项")
+        return
+    width = max(len(row[0]) for row in rows)
+    print(f"{'benchmark'.ljust(width)}  {'base':>12}  {'head':>12}  {'change':>8}")
+    for name, old, new, change, regressed in rows:
+        flag = "  <- 回归" if regressed else ""
+        print(f"{name.ljust(width)}  {old:>12.4f}  {new:>12.4f}  {change:>+8.1%}{flag}")
+
+    regressions = sum(1 for row in rows if row[4])
+    if regressions:
+        print(f"{regressions} 项变慢超过 {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+基准测试用的合成 SQLite 数据库生成器
+
+生成一张大事实表和若干维度表：
+- 事实表（第 0 张）有 rows 行，dim_id 外键指向第 1 张表
+- 其余各表有 dim_rows 行，parent_id 外键沿树状关系指向前面的表（便于检验外键补全）
+- 除主键/外键外每张表有 columns 个数据列，按整数、金额、名称、状态、日期轮换
+数据由行号确定性地计算得到，相同参数生成的库内容完全一致。
+
+用法:
+    python -m benchmarks.gen_db --tables 500 --columns 40 --rows 2000000
+"""
+
+from datetime import date, timedelta
+from typing import Iterator, Optional, Tuple
+import argparse
+import os
+import sqlite3
+import time
+
+from .common import BENCH_DIR
+
+DATA_DIR = os.path.join(BENCH_DIR, "data")
+
+# 表名用业务词汇，使按问题检索表（BM25）的基准更接近真实场景
+TABLE_WORDS = (
+    "orders", "customers", "products", "payments", "shipments", "invoices",
+    "suppliers", "employees", "stores", "refunds", "coupons", "reviews",
+    "inventory", "regions", "campaigns", "sessions",
+)
+
+# 数据列类型轮换：(列名前缀, SQLite 类型)
+COLUMN_KINDS = (
+    ("qty", "INTEGER"),
+    ("amount", "REAL"),
+    ("name", "TEXT"),
+    ("status", "TEXT"),
+    ("created", "DATE"),
+)
+
+_STATUSES = ("pending", "paid", "shipped", "done", "cancelled", "refunded")
+_NAMES = tuple(f"{word}-{i:03d}" for word in TABLE_WORDS for i in range(64))
+_DATES = tuple((date(2015, 1, 1) + timedelta(days=d)).isoformat() for d in range(3650))
+
+BATCH_ROWS = 50_000
+
+
+def table_name(index: int) -> str:
+    """第 index 张表的表名"""
+    return f"{TABLE_WORDS[index % len(TABLE_WORDS)]}_{index:04d}"
+
+
+def column_name(index: int) -> str:
+    """第 index 个数据列的列名"""
+    return f"{COLUMN_KINDS[index % len(COLUMN_KINDS)][0]}_{index}"
+
+
+def column_of(kind: str) -> str:
+    """第一个指定类型（qty/amount/name/status/created）的数据列名"""
+    for j, (prefix, _) in enumerate(COLUMN_KINDS):
+        if prefix == kind:
+            return column_name(j)
+    raise ValueError(f"没有 {kind} 类型的列")
+
+
+def parent_of(index: int) -> Optional[int]:
+    """第 index 张表的外键目标表序号"""
+    if index == 0:
+        return 1
+    if index == 1:
+        return None
+    return max(1, index // 4)
+
+
+def database_path(tables: int, columns: int, rows: int, dim_rows: int, data_dir: str = DATA_DIR) -> str:
+    """按生成参数确定的库文件路径，参数相同即可复用"""
+    return os.path.join(data_dir, f"bench_{tables}t_{columns}c_{rows}r_{dim_rows}d.db")
+
+
+def _value(kind: str, row: int, col: int):
+    k = row * 7919 + col * 104729
+    if kind == "qty":
+        return k % 1000
+    if kind == "amount":
+        return (k % 1_000_000) / 100
+    if kind == "name":
+        return _NAMES[k % len(_NAMES)]
+    if kind == "status":
+        return _STATUSES[(row + col) % len(_STATUSES)]
+    return _DATES[k % len(_DATES)]
+
+
+def _rows(count: int, columns: int, ref_rows: int) -> Iterator[Tuple]:
+    kinds = [COLUMN_KINDS[j % len(COLUMN_KINDS)][0] for j in range(columns)]
+    for row in range(1, count + 1):
+        ref = (row * 31) % ref_rows + 1 if ref_rows else None
+        yield (row, ref, *(_value(kind, row, j) for j, kind in enumerate(kinds)))
+
+
+def _batched(rows: Iterator[Tuple], size: int) -> Iterator[list]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def generate_database(
+    path: str,
+    tables: int = 50,
+    columns: int = 20,
+    rows: int = 100_000,
+    dim_rows: int = 100,
+) -> str:
+    """
+    生成合成数据库（已存在的同名文件会被覆盖）
+
+    Args:
+        path: 库文件路径
+        tables: 表数量（至少 2 张）
+        columns: 每张表的数据列数量（至少覆盖每种列类型一次）
+        rows: 事实表行数
+        dim_rows: 其余各表的行数
+
+    Returns:
+        库文件路径
+    """
+    tables = max(tables, 2)
+    columns = max(columns, len(COLUMN_KINDS))
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        # 一次性批量导入，不需要回滚日志和逐次刷盘
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        data_columns = ", ".join(
+            f"{column_name(j)} {COLUMN_KINDS[j % len(COLUMN_KINDS)][1]}" for j in range(columns)
+        )
+        placeholders = ", ".join("?" * (columns + 2))
+        for i in range(tables):
+            name = table_name(i)
+            parent = parent_of(i)
+            ref_column = "dim_id" if i == 0 else "parent_id"
+            if parent is None:
+                ref_def = f"{ref_column} INTEGER"
+            else:
+                ref_def = f"{ref_column} INTEGER REFERENCES {table_name(parent)}(id)"
+            conn.execute(f"CREATE TABLE {name} (id INTEGER PRIMARY KEY, {ref_def}, {data_columns})")
+
+            count = rows if i == 0 else dim_rows
+            ref_rows = 0 if parent is None else dim_rows
+            for batch in _batched(_rows(count, columns, ref_rows), BATCH_ROWS):
+                conn.executemany(f"INSERT INTO {name} VALUES ({placeholders})", batch)
+            if parent is not None:
+                conn.execute(f"CREATE INDEX idx_{name}_{ref_column} ON {name} ({ref_column})")
+        conn.commit()
+        # 生成优化器统计（sqlite_stat1），与线上执行过 ANALYZE 的库一致
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+    return path
+
+
+def ensure_database(
+    tables: int = 50,
+    columns: int = 20,
+    rows: int = 100_000,
+    dim_rows: int = 100,
+    data_dir: str = DATA_DIR,
+    force: bool = False,
+) -> str:
+    """返回指定参数的合成库路径，不存在（或 force）时生成"""
+    tables = max(tables, 2)
+    columns = max(columns, len(COLUMN_KINDS))
+    path = database_path(tables, columns, rows, dim_rows, data_dir)
+    if force or not os.path.exists(path):
+        started = time.perf_counter()
+        generate_database(path, tables, columns, rows, dim_rows)
+        print(f"已生成 {path}（{time.perf_counter() - started:.1f}s）")
+    return path
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """生成参数（供各基准脚本复用）"""
+    parser.add_argument("--tables", type=int, default=50, help="表数量（默认 50）")
+    parser.add_argument("--columns", type=int, default=20, help="每张表的数据列数量（默认 20）")
+    parser.add_argument("--rows", type=int, default=100_000, help="事实表行数（默认 100000）")
+    parser.add_argument("--dim-rows", type=int, default=100, help="其余各表行数（默认 100）")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="库文件目录")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成基准测试用的合成 SQLite 数据库")
+    add_arguments(parser)
+    parser.add_argument("--force", action="store_true", help="已存在时重新生成")
+    args = parser.parse_args()
+    path = ensure_database(
+        args.tables, args.columns, args.rows, args.dim_rows, args.data_dir, force=args.force
+    )
+    print(path)
+
+
+if __name__ == "__main__":
+    main()
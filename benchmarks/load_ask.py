@@ -0,0 +1,322 @@
+"""
+/api/ask 流式接口的端到端压测
+
+逐级提高并发，每级由 N 个并发客户端各自循环发起请求（闭环压测），对每个 SSE 流记录：
+- sql: 收到 sql 事件的时间
+- data: 收到第一个 data / data_start 事件的时间
+- chunk_gap: 相邻 explanation_chunk 事件的间隔
+- total: 流结束的时间
+每级报告 p50/p95/p99、错误率和吞吐量，结果写入 JSON，吞吐/延迟随并发变化的饱和曲线另写入 CSV。
+HTTP 客户端只使用标准库（asyncio 流 + HTTP/1.1 分块编码），可在隔离环境中运行。
+
+用法（服务端使用回放提供商，无需访问模型服务）:
+    LLM_PROVIDER=replay uvicorn app:app --port 8000
+    python -m benchmarks.load_ask --url http://127.0.0.1:8000 --concurrency 1,2,4,8,16,32
+"""
+
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+import argparse
+import asyncio
+import csv
+import json
+import os
+import time
+
+from .common import environment, percentile, write_results
+
+DEFAULT_QUESTIONS = (
+    "有多少订单",
+    "统计每个用户的订单数量",
+    "显示最近的10条订单",
+    "how many customers are there",
+    "show payments",
+)
+
+METRICS = ("sql", "data", "chunk_gap", "total")
+
+
+class StreamError(Exception):
+    """请求失败（连接错误、非 200 状态码或 error 事件）"""
+
+
+async def _read_body(reader: asyncio.StreamReader, headers: Dict[str, str]):
+    """逐块读取响应体，兼容分块传输编码和 Content-Length"""
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        while True:
+            size_line = await reader.readline()
+            if not size_line:
+                raise StreamError("连接在分块传输中途关闭")
+            size = int(size_line.split(b";")[0].strip() or b"0", 16)
+            if size == 0:
+                await reader.readline()
+                return
+            data = await reader.readexactly(size)
+            await reader.readexactly(2)
+            yield data
+    elif "content-length" in headers:
+        remaining = int(headers["content-length"])
+        while remaining > 0:
+            data = await reader.read(min(remaining, 65536))
+            if not data:
+                raise StreamError("连接在响应体读取中途关闭")
+            remaining -= len(data)
+            yield data
+    else:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                return
+            yield data
+
+
+async def ask_once(url: str, question: str, timeout: float) -> Dict[str, Any]:
+    """
+    发起一次 /api/ask 流式请求并记录各事件的到达时间（秒）
+
+    Returns:
+        {ok, error, sql, data, total, chunk_gaps, events, server_total_ms}
+    """
+    parts = urlsplit(url)
+    if parts.scheme != "http":
+        raise ValueError("只支持 http:// 地址")
+    body = json.dumps({"question": question}, ensure_ascii=False).encode("utf-8")
+    request = (
+        f"POST {parts.path.rstrip('/')}/api/ask HTTP/1.1\r\n"
+        f"Host: {parts.netloc}\r\n"
+        "Content-Type: application/json\r\n"
+        "Accept: text/event-stream\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "Connection: close\r\n\r\n"
+    ).encode("ascii") + body
+
+    result: Dict[str, Any] = {
+        "ok": False, "error": None, "sql": None, "data": None, "total": None,
+        "chunk_gaps": [], "events": 0, "server_total_ms": None,
+    }
+    start = time.perf_counter()
+    writer = None
+
+    async def run():
+        nonlocal writer
+        reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+        writer.write(request)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        status = status_line.split(b" ", 2)
+        if len(status) < 2 or status[1] != b"200":
+            raise StreamError(f"HTTP {status_line.decode('latin-1').strip() or '无响应'}")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        buffer = b""
+        last_chunk = None
+        async for data in _read_body(reader, headers):
+            buffer += data
+            while b"\n\n" in buffer:
+                raw, buffer = buffer.split(b"\n\n", 1)
+                if not raw.startswith(b"data: "):
+                    continue
+                event = json.loads(raw[6:])
+                now = time.perf_counter() - start
+                result["events"] += 1
+                kind = event.get("type")
+                if kind == "sql" and result["sql"] is None:
+                    result["sql"] = now
+                elif kind in ("data", "data_start") and result["data"] is None:
+                    result["data"] = now
+                elif kind == "explanation_chunk":
+                    if last_chunk is not None:
+                        result["chunk_gaps"].append(now - last_chunk)
+                    last_chunk = now
+                elif kind == "timing":
+                    result["server_total_ms"] = event["content"].get("total_ms")
+                elif kind == "error":
+                    raise StreamError(f"error 事件: {event.get('content')}")
+
+    try:
+        await asyncio.wait_for(run(), timeout)
+        result["ok"] = True
+    except asyncio.TimeoutError:
+        result["error"] = "timeout"
+    except StreamError as e:
+        result["error"] = str(e)
+    except (OSError, ValueError) as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        result["total"] = time.perf_counter() - start
+        if writer is not None:
+            writer.close()
+    return result
+
+
+def _stats(values: List[float]) -> Optional[Dict[str, float]]:
+    """毫秒统计；没有样本时为 None"""
+    if not values:
+        return None
+    ms = [v * 1000 for v in values]
+    return {
+        "count": len(ms),
+        "p50_ms": round(percentile(ms, 50), 2),
+        "p95_ms": round(percentile(ms, 95), 2),
+        "p99_ms": round(percentile(ms, 99), 2),
+        "max_ms": round(max(ms), 2),
+    }
+
+
+async def run_level(url: str, questions: List[str], concurrency: int, rounds: int, timeout: float) -> Dict[str, Any]:
+    """以指定并发运行一级压测：每个并发客户端顺序发起 rounds 个请求"""
+    results: List[Dict[str, Any]] = []
+    counter = iter(range(concurrency * rounds))
+
+    async def worker():
+        for i in counter:
+            results.append(await ask_once(url, questions[i % len(questions)], timeout))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    ok = [r for r in results if r["ok"]]
+    errors: Dict[str, int] = {}
+    for r in results:
+        if not r["ok"]:
+            # 按错误类别聚合，去掉具体消息中的变化部分
+            key = r["error"].split(":")[0]
+            errors[key] = errors.get(key, 0) + 1
+    server_total = [r["server_total_ms"] / 1000 for r in ok if r["server_total_ms"] is not None]
+    return {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "error_rate": round((len(results) - len(ok)) / len(results), 4) if results else 0.0,
+        "error_kinds": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(ok) / elapsed, 3) if elapsed > 0 else 0.0,
+        "sql": _stats([r["sql"] for r in ok if r["sql"] is not None]),
+        "data": _stats([r["data"] for r in ok if r["data"] is not None]),
+        "chunk_gap": _stats([gap for r in ok for gap in r["chunk_gaps"]]),
+        "total": _stats([r["total"] for r in ok]),
+        "server_total": _stats(server_total),
+    }
+
+
+def load_questions(path: Optional[str]) -> List[str]:
+    """读取问题列表：每行一个问题，或 qa.log / cassette 等 JSONL 中的 question 字段"""
+    if not path:
+        return list(DEFAULT_QUESTIONS)
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            start = line.find("{")
+            if start >= 0:
+                try:
+                    record = json.loads(line[start:])
+                except ValueError:
+                    record = None
+                if isinstance(record, dict):
+                    if record.get("question"):
+                        questions.append(record["question"])
+                    continue
+            questions.append(line)
+    if not questions:
+        raise ValueError(f"{path} 中没有问题")
+    return questions
+
+
+def write_curve(levels: List[Dict[str, Any]], path: str):
+    """饱和曲线：各并发级别的吞吐量、错误率和延迟分位数"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    columns = ["concurrency", "throughput_rps", "error_rate"]
+    columns += [f"{metric}_{q}_ms" for metric in METRICS for q in ("p50", "p95", "p99")]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for level in levels:
+            row = [level["concurrency"], level["throughput_rps"], level["error_rate"]]
+            for metric in METRICS:
+                stats = level[metric] or {}
+                row += [stats.get(f"{q}_ms", "") for q in ("p50", "p95", "p99")]
+            writer.writerow(row)
+
+
+def _print_level(level: Dict[str, Any]):
+    def fmt(metric):
+        stats = level[metric]
+        if not stats:
+            return f"{metric} -"
+        return f"{metric} {stats['p50_ms']:.0f}/{stats['p95_ms']:.0f}/{stats['p99_ms']:.0f}"
+
+    print(
+        f"并发 {level['concurrency']:>4}  请求 {level['requests']:>5}  "
+        f"错误率 {level['error_rate']:>6.1%}  吞吐 {level['throughput_rps']:>8.2f} req/s  "
+        + "  ".join(fmt(m) for m in METRICS)
+        + "  (p50/p95/p99 ms)"
+    )
+
+
+async def run(args) -> Dict[str, Any]:
+    questions = load_questions(args.questions)
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    results = {
+        "meta": {
+            **environment(),
+            "benchmark": "load_ask",
+            "params": {
+                "url": args.url,
+                "concurrency": levels,
+                "rounds": args.rounds,
+                "timeout": args.timeout,
+                "questions": len(questions),
+            },
+        },
+        "levels": [],
+    }
+
+    if args.warmup:
+        # 预热：建立数据库连接、构建 schema 缓存
+        warm = await ask_once(args.url, questions[0], args.timeout)
+        if not warm["ok"]:
+            raise SystemExit(f"预热请求失败: {warm['error']}")
+
+    for concurrency in levels:
+        level = await run_level(args.url, questions, concurrency, args.rounds, args.timeout)
+        results["levels"].append(level)
+        _print_level(level)
+        if level["error_rate"] > args.stop_error_rate:
+            print(f"错误率超过 {args.stop_error_rate:.0%}，停止提高并发")
+            break
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/api/ask 流式接口的端到端压测")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="服务地址（默认 http://127.0.0.1:8000）")
+    parser.add_argument("--concurrency", default="1,2,4,8,16,32", help="逐级并发数，逗号分隔")
+    parser.add_argument("--rounds", type=int, default=5, help="每个并发客户端每级发起的请求数（默认 5）")
+    parser.add_argument("--timeout", type=float, default=120, help="单个请求超时秒数（默认 120）")
+    parser.add_argument("--questions", help="问题文件：每行一个问题，或 qa.log 等 JSONL")
+    parser.add_argument("--stop-error-rate", type=float, default=0.5, help="某级错误率超过该值后停止（默认 0.5）")
+    parser.add_argument("--no-warmup", dest="warmup", action="store_false", help="不发送预热请求")
+    parser.add_argument("--output", help="结果 JSON 路径，默认 benchmarks/results/load_ask-<commit>.json")
+    parser.add_argument("--curve", help="饱和曲线 CSV 路径，默认与结果 JSON 同名")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    output = write_results(results, args.output, "load_ask")
+    curve = args.curve or os.path.splitext(output)[0] + ".csv"
+    write_curve(results["levels"], curve)
+    print(f"结果已写入 {output}，饱和曲线已写入 {curve}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,7 @@ load_dotenv()
 class Config:
     """配置管理类"""
 
-    # LLM 选择: 'claude' 或 'qwen'
+    # LLM 选择: 'claude'、'qwen' 或 'replay'（离线回放录制的回复，不访问网络）
     LLM_PROVIDER = os.getenv("LLM_PROVIDER", "claude").lower()
 
     # Claude API配置
@@ -20,16 +20,111 @@ class Config:
     QWEN_MODEL = os.getenv("QWEN_MODEL", "qwen-plus")
     QWEN_BASE_URL = os.getenv("QWEN_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1")
 
+    # 回放提供商：录制文件（逗号分隔，qa.log 或 cassette JSONL）、未命中时是否按规则生成SQL、
+    # 注入的首 token 延迟（秒）和输出速度（token/秒，0 表示不限速）
+    LLM_REPLAY_FILES = [p.strip() for p in os.getenv("LLM_REPLAY_FILES", "logs/qa.log").split(",") if p.strip()]
+    LLM_REPLAY_FALLBACK = os.getenv("LLM_REPLAY_FALLBACK", "true").lower() == "true"
+    LLM_REPLAY_TTFT = float(os.getenv("LLM_REPLAY_TTFT", "0.5"))
+    LLM_REPLAY_TOKENS_PER_SEC = float(os.getenv("LLM_REPLAY_TOKENS_PER_SEC", "50"))
+    # 录制真实模型（claude/qwen）的回复到该 JSONL 文件，可作为 LLM_REPLAY_FILES 回放；为空不录制
+    LLM_RECORD_FILE = os.getenv("LLM_RECORD_FILE", "")
+
     MAX_TOKENS = int(os.getenv("MAX_TOKENS", "4096"))
     TEMPERATURE = float(os.getenv("TEMPERATURE", "0"))
 
     # 数据库配置
     DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///example.db")
 
+    # 异步接口中执行阻塞数据库操作的线程池大小
+    DB_MAX_WORKERS = int(os.getenv("DB_MAX_WORKERS", "8"))
+
+    # 构建 schema 时并行获取示例数据的最大并发连接数
+    SCHEMA_SAMPLE_WORKERS = int(os.getenv("SCHEMA_SAMPLE_WORKERS", "4"))
+
+    # schema 快照目录，重启时按表结构指纹增量复用；设为空字符串则禁用
+    SCHEMA_SNAPSHOT_DIR = os.getenv("SCHEMA_SNAPSHOT_DIR", ".schema_cache")
+
+    # 提示词中按问题相关性保留的表数量（另会沿外键补充关联表），0 表示始终使用完整 schema
+    SCHEMA_TOP_K = int(os.getenv("SCHEMA_TOP_K", "10"))
+
+    # 问题 -> SQL 缓存：条数上限（0 表示禁用）、过期秒数、近似匹配阈值（0 表示仅精确匹配）
+    SQL_CACHE_SIZE = int(os.getenv("SQL_CACHE_SIZE", "1024"))
+    SQL_CACHE_TTL = float(os.getenv("SQL_CACHE_TTL", "3600"))
+    SQL_CACHE_SIMILARITY = float(os.getenv("SQL_CACHE_SIMILARITY", "0"))
+
+    # 查询结果缓存：容量（MB，0 表示禁用）、过期秒数、命中时是否探测表变更
+    RESULT_CACHE_MB = float(os.getenv("RESULT_CACHE_MB", "0"))
+    RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "300"))
+    RESULT_CACHE_PROBE = os.getenv("RESULT_CACHE_PROBE", "true").lower() == "true"
+
+    # 流式接口分批返回查询结果的每批行数（服务端游标），0 表示一次性返回
+    STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", "200"))
+
+    # 响应压缩：普通响应超过该字节数时 gzip 压缩（0 表示禁用）；流式接口是否按事件 gzip 压缩
+    COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+    SSE_COMPRESS = os.getenv("SSE_COMPRESS", "true").lower() == "true"
+
+    # 批量问数：单次请求的问题数上限、LLM 调用并发数、数据库查询并发数
+    BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "500"))
+    BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "4"))
+    BATCH_DB_CONCURRENCY = int(os.getenv("BATCH_DB_CONCURRENCY", "4"))
+
+    # 数据库连接池：常驻连接数、溢出连接数、获取连接超时秒数、借出前检测、连接回收秒数（-1 表示不回收）
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))
+
+    # 只读副本：逗号分隔的URL列表（为空时只读查询走主库），路由策略 round_robin / least_connections
+    DB_REPLICA_URLS = [u.strip() for u in os.getenv("DB_REPLICA_URLS", "").split(",") if u.strip()]
+    DB_REPLICA_ROUTING = os.getenv("DB_REPLICA_ROUTING", "least_connections").lower()
+
+    # 是否将结果行数上限下推到生成的SQL中（LIMIT / TOP / FETCH FIRST）
+    LIMIT_PUSHDOWN = os.getenv("LIMIT_PUSHDOWN", "true").lower() == "true"
+
+    # 单条查询的超时秒数（0 表示不限制），以及检测客户端断开的轮询间隔秒数
+    STATEMENT_TIMEOUT = float(os.getenv("STATEMENT_TIMEOUT", "30"))
+    DISCONNECT_POLL_INTERVAL = float(os.getenv("DISCONNECT_POLL_INTERVAL", "0.5"))
+
+    # 执行前 EXPLAIN 代价预检：off 关闭 / warn 告警 / reject 拒绝；预估行数和代价阈值（0 表示不检查）
+    COST_GUARD = os.getenv("COST_GUARD", "off").lower()
+    COST_GUARD_MAX_ROWS = float(os.getenv("COST_GUARD_MAX_ROWS", "10000000"))
+    COST_GUARD_MAX_COST = float(os.getenv("COST_GUARD_MAX_COST", "0"))
+
+    # 日志级别：INFO 下提示词只记录 schema 前缀的哈希，DEBUG 才输出完整提示词
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+    # 按模型/温度等请求级配置缓存的问数实例数量上限
+    ASKER_CACHE_SIZE = int(os.getenv("ASKER_CACHE_SIZE", "8"))
+
     # 安全配置
     ALLOW_ONLY_SELECT = True  # 仅允许SELECT查询
     MAX_RESULTS = 1000  # 最大返回结果数
 
+    @classmethod
+    def db_options(cls) -> dict:
+        """连接池与只读副本配置（DatabaseConnector 参数）"""
+        return {
+            "replica_urls": cls.DB_REPLICA_URLS,
+            "replica_routing": cls.DB_REPLICA_ROUTING,
+            "pool_size": cls.DB_POOL_SIZE,
+            "max_overflow": cls.DB_MAX_OVERFLOW,
+            "pool_timeout": cls.DB_POOL_TIMEOUT,
+            "pool_pre_ping": cls.DB_POOL_PRE_PING,
+            "pool_recycle": cls.DB_POOL_RECYCLE,
+        }
+
+    @classmethod
+    def replay_options(cls) -> dict:
+        """回放提供商配置（ReplayClient 参数）"""
+        return {
+            "cassettes": cls.LLM_REPLAY_FILES,
+            "fallback": cls.LLM_REPLAY_FALLBACK,
+            "ttft": cls.LLM_REPLAY_TTFT,
+            "tokens_per_sec": cls.LLM_REPLAY_TOKENS_PER_SEC,
+        }
+
     @classmethod
     def validate(cls):
         """验证必要的配置是否存在"""
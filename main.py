@@ -4,29 +4,14 @@
 基于 AI 的数据库自然语言查询系统
 """
 
-import os
 import sys
 import logging
 from prompt_toolkit import PromptSession
 from config import Config
-from src.core import AskData
-
-# 配置双重日志 (控制台 + 文件)
-LOG_DIR = "logs"
-LOG_FILE = os.path.join(LOG_DIR, "ask_data.log")
-
-if not os.path.exists(LOG_DIR):
-    os.makedirs(LOG_DIR)
-
-# 设置根日志配置
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.StreamHandler(sys.stdout),  # 打印到控制台
-        logging.FileHandler(LOG_FILE, encoding='utf-8')  # 打印到文件
-    ]
-)
+from src.core import AskData, SQLCache
+from src.sql import CostGuard
+from src.utils.logger import setup_logging
+
 logger = logging.getLogger(__name__)
 
 
@@ -41,12 +26,21 @@ def print_result(result: dict):
     print(f"问题: {result['question']}")
     print(f"\n生成的SQL:\n{result['sql']}")
 
+    preflight = result.get("preflight")
+    if preflight and preflight["action"] == "warn":
+        print(f"\n代价预检告警: {preflight['reason']}")
+
     if result.get("formatted_results"):
         print(f"\n查询结果（展示给用户）:\n{result['formatted_results']}")
 
     if result.get("explanation"):
         print(f"\n结果解释（大模型思考过程）:\n{result['explanation']}")
 
+    timings = result.get("timings") or {}
+    if timings:
+        stages = ", ".join(f"{k[:-3]} {v:.0f}ms" for k, v in timings.items() if k.endswith("_ms"))
+        print(f"\n耗时: {stages}")
+
     print("=" * 60)
 
 
@@ -94,6 +88,9 @@ def interactive_mode(asker: AskData):
 
 def main():
     """主函数"""
+    # 与 Web 服务共用日志配置：app.log + 控制台经后台队列批量写出，问答记录写入 qa.log（JSONL）
+    setup_logging(level=Config.LOG_LEVEL)
+
     try:
         # 验证配置
         Config.validate()
@@ -115,6 +112,11 @@ def main():
             "model": Config.QWEN_MODEL,
             "base_url": Config.QWEN_BASE_URL,
         })
+    elif Config.LLM_PROVIDER == "replay":
+        llm_params.update({
+            "model": "replay",
+            "llm_options": Config.replay_options(),
+        })
     else:
         llm_params.update({
             "api_key": Config.ANTHROPIC_API_KEY,
@@ -128,6 +130,23 @@ def main():
             database_url=Config.DATABASE_URL,
             allow_only_select=Config.ALLOW_ONLY_SELECT,
             max_results=Config.MAX_RESULTS,
+            schema_sample_workers=Config.SCHEMA_SAMPLE_WORKERS,
+            schema_snapshot_dir=Config.SCHEMA_SNAPSHOT_DIR or None,
+            schema_top_k=Config.SCHEMA_TOP_K,
+            sql_cache=SQLCache(
+                max_size=Config.SQL_CACHE_SIZE,
+                ttl=Config.SQL_CACHE_TTL,
+                similarity_threshold=Config.SQL_CACHE_SIMILARITY,
+            ) if Config.SQL_CACHE_SIZE > 0 else None,
+            db_options=Config.db_options(),
+            statement_timeout=Config.STATEMENT_TIMEOUT,
+            limit_pushdown=Config.LIMIT_PUSHDOWN,
+            cost_guard=CostGuard(
+                mode=Config.COST_GUARD,
+                max_rows=Config.COST_GUARD_MAX_ROWS,
+                max_cost=Config.COST_GUARD_MAX_COST,
+            ) if Config.COST_GUARD != "off" else None,
+            llm_record_file=Config.LLM_RECORD_FILE or None,
             **llm_params
         )
     except Exception as e:
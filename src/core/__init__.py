@@ -1,5 +1,6 @@
 """核心模块"""
 
 from .asker import AskData
+from .sql_cache import SQLCache
 
-__all__ = ["AskData"]
+__all__ = ["AskData", "SQLCache"]
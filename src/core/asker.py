@@ -1,15 +1,30 @@
 """核心问数模块"""
 
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List
+from itertools import islice
+import asyncio
+import copy
 import logging
+import time
 
 from ..database import DatabaseConnector, SchemaAnalyzer
-from ..llm import ClaudeClient, QwenClient
-from ..sql import SQLValidator, SQLExecutor
+from ..llm import create_client
+from ..sql import (
+    SQLValidator, SQLExecutor, ResultCache, ResultSet, ResultSummarizer, format_summary,
+    CostGuard,
+)
 from ..utils.logger import log_qa
+from ..utils.metrics import RequestTimer
+from .sql_cache import SQLCache
+from ..llm.sql_stream import SQLStreamCollector
 
 logger = logging.getLogger(__name__)
 
+# 分批流式返回数据时，保留用于格式化展示和结果解释的前几行
+PREVIEW_ROWS = 20
+# 结果解释只使用统计概要和少量示例行，提示词大小与结果行数无关
+EXPLAIN_SAMPLE_ROWS = 5
+
 
 class AskData:
     """智能问数核心类"""
@@ -25,13 +40,27 @@ class AskData:
         temperature: float = 0,
         allow_only_select: bool = True,
         max_results: int = 1000,
+        db_max_workers: int = 8,
+        schema_sample_workers: int = 4,
+        schema_snapshot_dir: Optional[str] = None,
+        schema_top_k: int = 10,
+        sql_cache: Optional[SQLCache] = None,
+        result_cache: Optional[ResultCache] = None,
+        probe_tables: bool = True,
+        stream_chunk_size: int = 0,
+        db_options: Optional[Dict[str, Any]] = None,
+        statement_timeout: float = 0,
+        limit_pushdown: bool = True,
+        cost_guard: Optional[CostGuard] = None,
+        llm_options: Optional[Dict[str, Any]] = None,
+        llm_record_file: Optional[str] = None,
     ):
         """
         初始化智能问数系统
 
         Args:
             database_url: 数据库连接URL
-            llm_provider: LLM提供商 ('claude' 或 'qwen')
+            llm_provider: LLM提供商 ('claude'、'qwen' 或 'replay'，见 src.llm.registry)
             api_key: API密钥
             model: 模型名称
             base_url: API基础URL (针对Qwen等)
@@ -39,49 +68,254 @@ class AskData:
             temperature: 温度参数
             allow_only_select: 是否只允许SELECT查询
             max_results: 最大返回结果数
+            db_max_workers: 异步查询时数据库线程池大小
+            schema_sample_workers: 构建schema时并行获取示例数据的并发数
+            schema_snapshot_dir: schema快照目录，为空时不持久化
+            schema_top_k: 提示词中按问题筛选保留的最相关表数量，<= 0 时使用完整schema
+            sql_cache: 问题到SQL的缓存，为空时每次都调用LLM生成
+            result_cache: 查询结果缓存，为空时每次都查询数据库
+            probe_tables: 结果缓存命中时是否探测表变更
+            stream_chunk_size: 流式接口中分批返回数据的每批行数，<= 0 时一次性返回
+            db_options: 连接池与只读副本配置，传给 DatabaseConnector
+            statement_timeout: 单条查询的超时秒数，<= 0 表示不限制
+            limit_pushdown: 是否将结果行数上限下推到SQL中
+            cost_guard: 执行前的 EXPLAIN 代价预检，为空时不预检
+            llm_options: 提供商特有的客户端参数（如 replay 的录制文件和时延设置）
+            llm_record_file: 录制真实模型回复的文件路径（回放格式），为空时不录制
         """
         # 初始化数据库
-        self.db_connector = DatabaseConnector(database_url)
-        self.schema_analyzer = SchemaAnalyzer(self.db_connector.engine)
+        self.db_connector = DatabaseConnector(database_url, **(db_options or {}))
+        self.schema_analyzer = SchemaAnalyzer(
+            self.db_connector.engine,
+            sample_workers=schema_sample_workers,
+            snapshot_dir=schema_snapshot_dir,
+            router=self.db_connector.router,
+        )
+
+        self.schema_top_k = schema_top_k
+        self.sql_cache = sql_cache
+        self.stream_chunk_size = stream_chunk_size
 
         # 初始化LLM
-        if llm_provider == "qwen":
-            self.llm = QwenClient(
-                api_key=api_key,
-                model=model,
-                base_url=base_url,
-                max_tokens=max_tokens,
-                temperature=temperature,
-            )
-        else:
-            self.llm = ClaudeClient(
-                api_key=api_key,
-                model=model,
-                max_tokens=max_tokens,
-                temperature=temperature,
-            )
+        self.llm_record_file = llm_record_file
+        self.llm = self._create_llm(
+            llm_provider, api_key, model, base_url, max_tokens, temperature, llm_options,
+            llm_record_file,
+        )
 
         # 初始化SQL处理
-        self.validator = SQLValidator(allow_only_select=allow_only_select)
+        self.validator = SQLValidator(
+            allow_only_select=allow_only_select,
+            dialect=self.db_connector.engine.dialect.name,
+        )
         self.executor = SQLExecutor(
-            self.db_connector.engine, max_results=max_results
+            self.db_connector.engine,
+            max_results=max_results,
+            max_workers=db_max_workers,
+            result_cache=result_cache,
+            probe_tables=probe_tables,
+            router=self.db_connector.router,
+            statement_timeout=statement_timeout,
+            limit_pushdown=limit_pushdown,
+            cost_guard=cost_guard,
         )
 
-        # 缓存schema描述
-        self._schema_description: Optional[str] = None
+        # 数据库相关资源由本实例创建，关闭时负责释放
+        self._owns_resources = True
 
         logger.info(f"智能问数系统初始化完成 (提供商: {llm_provider},模型:{model})")
 
+    @staticmethod
+    def _create_llm(
+        llm_provider: str,
+        api_key: Optional[str],
+        model: Optional[str],
+        base_url: Optional[str],
+        max_tokens: int,
+        temperature: float,
+        llm_options: Optional[Dict[str, Any]] = None,
+        llm_record_file: Optional[str] = None,
+    ):
+        """根据提供商创建LLM客户端（只导入该提供商的 SDK）"""
+        return create_client(
+            llm_provider,
+            api_key=api_key,
+            model=model,
+            base_url=base_url,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            options=llm_options,
+            record_file=llm_record_file,
+        )
+
+    def derive(
+        self,
+        llm_provider: str = "claude",
+        api_key: Optional[str] = None,
+        model: Optional[str] = None,
+        base_url: Optional[str] = None,
+        max_tokens: int = 4096,
+        temperature: float = 0,
+        llm_options: Optional[Dict[str, Any]] = None,
+    ) -> "AskData":
+        """
+        基于当前实例创建一个仅LLM配置不同的新实例
+
+        新实例与当前实例共享数据库引擎、连接池、SQL执行器和schema缓存，
+        因此切换模型只需要额外创建LLM客户端。
+        """
+        variant = copy.copy(self)
+        variant.llm = self._create_llm(
+            llm_provider, api_key, model, base_url, max_tokens, temperature, llm_options,
+            self.llm_record_file,
+        )
+        variant._owns_resources = False
+        logger.info(f"已派生问数实例 (提供商: {llm_provider},模型:{model})")
+        return variant
+
     @property
     def schema_description(self) -> str:
         """获取数据库schema描述（带缓存）"""
-        if self._schema_description is None:
-            self._schema_description = self.schema_analyzer.generate_schema_description()
-        return self._schema_description
+        return self.schema_analyzer.get_cached_description()
+
+    def get_schema_for(self, question: str) -> str:
+        """获取与问题相关的schema描述（按相关性筛选表）"""
+        return self.schema_analyzer.get_relevant_description(
+            question, top_k=self.schema_top_k
+        )
+
+    def _sql_cache_namespace(self) -> tuple:
+        """SQL缓存命名空间：schema变化或切换模型后不复用旧SQL"""
+        return (
+            self.schema_analyzer.schema_version,
+            type(self.llm).__name__,
+            self.llm.model,
+        )
+
+    def _cached_sql(self, question: str) -> Optional[str]:
+        """查询SQL缓存，未启用或未命中时返回 None"""
+        if self.sql_cache is None:
+            return None
+        sql = self.sql_cache.get(question, self._sql_cache_namespace())
+        if sql is not None:
+            logger.info("SQL缓存命中，跳过LLM调用")
+        return sql
+
+    def _generate_sql(self, question: str, timer: RequestTimer):
+        """
+        生成SQL，优先查询缓存
+
+        Returns:
+            (SQL, 是否来自缓存)
+        """
+        from ..llm.prompts import EXAMPLES
+
+        sql = self._cached_sql(question)
+        if sql is not None:
+            return sql, True
+        with timer.stage("schema"):
+            schema_description = self.get_schema_for(question)
+        with timer.stage("llm_sql"):
+            sql = self.llm.generate_sql(
+                question, schema_description, EXAMPLES, on_usage=timer.add_usage
+            )
+        return sql, False
+
+    async def _agenerate_sql(self, question: str, timer: RequestTimer):
+        """生成SQL（异步），优先查询缓存"""
+        from ..llm.prompts import EXAMPLES
+
+        sql = await self.executor.arun(self._cached_sql, question)
+        if sql is not None:
+            return sql, True
+        with timer.stage("schema"):
+            schema_description = await self.executor.arun(self.get_schema_for, question)
+        with timer.stage("llm_sql"):
+            sql = await self.llm.agenerate_sql(
+                question, schema_description, EXAMPLES, on_usage=timer.add_usage
+            )
+        return sql, False
+
+    def _stream_sql(self, question: str, collector: SQLStreamCollector, timer: RequestTimer):
+        """
+        流式生成SQL，逐段产出 sql_partial 事件
+
+        检测到完整语句后立即关闭模型输出流，不再等待（也不再为）模型后续的解释文字付费。
+        提前关闭时各客户端仍通过 on_usage 上报已产生的用量。生成结果保存在 collector 中。
+        """
+        from ..llm.prompts import EXAMPLES
+
+        with timer.stage("schema"):
+            schema_description = self.get_schema_for(question)
+        started = time.perf_counter()
+        stream = self.llm.generate_sql_stream(
+            question, schema_description, EXAMPLES, on_usage=timer.add_usage
+        )
+        try:
+            for chunk in stream:
+                timer.first("llm_ttft", started)
+                done = collector.feed(chunk)
+                yield {"type": "sql_partial", "content": collector.sql}
+                if done:
+                    break
+        finally:
+            stream.close()
+            timer.add("llm_sql", time.perf_counter() - started)
+
+    async def _astream_sql(self, question: str, collector: SQLStreamCollector, timer: RequestTimer):
+        """流式生成SQL（异步），逐段产出 sql_partial 事件"""
+        from ..llm.prompts import EXAMPLES
+
+        with timer.stage("schema"):
+            schema_description = await self.executor.arun(self.get_schema_for, question)
+        started = time.perf_counter()
+        stream = self.llm.agenerate_sql_stream(
+            question, schema_description, EXAMPLES, on_usage=timer.add_usage
+        )
+        try:
+            async for chunk in stream:
+                timer.first("llm_ttft", started)
+                done = collector.feed(chunk)
+                yield {"type": "sql_partial", "content": collector.sql}
+                if done:
+                    break
+        finally:
+            await stream.aclose()
+            timer.add("llm_sql", time.perf_counter() - started)
+
+    def _remember_sql(self, question: str, sql: str, cached: bool):
+        """将通过校验的新SQL写入缓存"""
+        if self.sql_cache is not None and not cached:
+            self.sql_cache.put(question, self._sql_cache_namespace(), sql)
+
+    def _explanation_input(self, summarizer: ResultSummarizer, sample: ResultSet) -> str:
+        """结果解释的输入：全量结果的统计概要 + 前几行示例"""
+        summary = summarizer.finish()
+        sample_text = self.executor.format_results(
+            sample.head(EXPLAIN_SAMPLE_ROWS),
+            max_display=EXPLAIN_SAMPLE_ROWS,
+            total=summary["row_count"],
+        )
+        # 结果被截断时 format_results 会注明，统计仅针对返回的前 max_results 行
+        return f"{format_summary(summary)}\n\n前 {EXPLAIN_SAMPLE_ROWS} 行示例:\n{sample_text}"
+
+    def _validate_sql(self, sql: str, timer: RequestTimer) -> str:
+        """校验SQL，不通过时抛出异常；返回清理后的SQL"""
+        with timer.stage("validate"):
+            is_valid, message = self.validator.validate(sql)
+            if not is_valid:
+                raise ValueError(message)
+            return self.validator.sanitize(sql)
+
+    @staticmethod
+    def _enforce_preflight(verdict: Optional[Dict[str, Any]]):
+        """代价预检结论为拒绝时中止查询"""
+        if verdict and verdict["action"] == "reject":
+            raise ValueError(f"查询预估代价过高，已拒绝执行: {verdict['reason']}")
 
     def refresh_schema(self):
         """刷新schema缓存"""
-        self._schema_description = None
+        self.schema_analyzer.invalidate()
         logger.info("Schema缓存已刷新")
 
     def ask(
@@ -91,119 +325,396 @@ class AskData:
         用自然语言查询数据库
 
         Returns:
-            包含SQL、结果和解释的字典
+            包含SQL、结果、解释和各阶段耗时的字典
         """
         result = {
             "question": question,
             "sql": None,
             "data": None,
             "columns": None,
+            "result_set": None,
+            "truncated": False,
+            "preflight": None,
             "formatted_results": None,
             "explanation": None,
             "error": None,
+            "timings": None,
         }
+        timer = RequestTimer()
 
         try:
             logger.info("="*75)
             logger.info("="*75)
             # 1. 生成SQL
             logger.info(f"处理问题: {question}")
-            from ..llm.prompts import EXAMPLES
-            sql = self.llm.generate_sql(question, self.schema_description, EXAMPLES)
+            sql, cached = self._generate_sql(question, timer)
             result["sql"] = sql
 
-            # 2. 验证SQL
-            is_valid, message = self.validator.validate(sql)
-            if not is_valid:
-                result["error"] = message
-                return result
-
-            # 清理SQL
-            sql = self.validator.sanitize(sql)
+            # 2. 验证并清理SQL
+            sql = self._validate_sql(sql, timer)
             result["sql"] = sql
-
-            # 3. 执行SQL
-            data, columns = self.executor.execute(sql)
-            result["data"] = data
-            result["columns"] = columns
-            result["formatted_results"] = self.executor.format_results(
-                data, columns
-            )
+            self._remember_sql(question, sql, cached)
+
+            # 3. 执行前代价预检，然后执行SQL
+            with timer.stage("preflight"):
+                result["preflight"] = self.executor.preflight(sql)
+            self._enforce_preflight(result["preflight"])
+            with timer.stage("execute"):
+                data = self.executor.execute(sql)
+            result["result_set"] = data
+            # 行字典视图按需构造，不复制数据
+            result["data"] = data.records
+            result["columns"] = data.columns
+            result["truncated"] = data.truncated
+            with timer.stage("format"):
+                result["formatted_results"] = self.executor.format_results(data)
 
             # 4. 解释结果
             if explain_results and data:
-                result["explanation"] = self.llm.explain_results(
-                    question, sql, result["formatted_results"]
-                )
-            
+                with timer.stage("explain"):
+                    result["explanation"] = self.llm.explain_results(
+                        question, sql,
+                        self._explanation_input(ResultSummarizer().update(data), data),
+                        on_usage=timer.add_usage,
+                    )
+
             # 记录成功日志
-            log_qa(question, sql, True, user_context=user_context)
+            result["timings"] = timer.finish()
+            log_qa(question, sql, True, user_context=user_context, timings=result["timings"])
 
         except Exception as e:
             logger.error(f"查询失败: {e}")
             result["error"] = str(e)
             # 记录失败日志
-            log_qa(question, result.get("sql"), False, str(e), user_context=user_context)
+            result["timings"] = timer.finish(success=False)
+            log_qa(
+                question, result.get("sql"), False, str(e),
+                user_context=user_context, timings=result["timings"]
+            )
 
         return result
 
     def ask_stream(self, question: str, user_context: Optional[Dict] = None):
         """
         流式查询数据库
-        支持逐步返回: SQL -> 数据 -> 解释内容
+        支持逐步返回: SQL片段 -> SQL -> 数据 -> 解释内容 -> 各阶段耗时
         """
+        sql = None
+        timer = RequestTimer()
         try:
-            from ..llm.prompts import EXAMPLES, get_result_explanation_prompt
+            from ..llm.prompts import get_result_explanation_prompt
 
             # 1. 生成 SQL
             logger.info(f"正在为问题生成 SQL: {question}")
-            sql = self.llm.generate_sql(question, self.schema_description, EXAMPLES)
-            
+            sql = self._cached_sql(question)
+            cached = sql is not None
+            if not cached:
+                collector = SQLStreamCollector(self.db_connector.engine.dialect.name)
+                yield from self._stream_sql(question, collector, timer)
+                sql = collector.sql
+
             # 验证并清理 SQL
-            is_valid, message = self.validator.validate(sql)
-            if not is_valid:
-                yield {"type": "error", "content": message}
-                return
+            sql = self._validate_sql(sql, timer)
+            self._remember_sql(question, sql, cached)
+            yield {"type": "sql", "content": sql, "cached": cached}
 
-            sql = self.validator.sanitize(sql)
-            yield {"type": "sql", "content": sql}
+            # 执行前代价预检（分批执行不经过结果缓存，不能因缓存命中跳过）
+            with timer.stage("preflight"):
+                verdict = self.executor.preflight(sql, skip_cached=self.stream_chunk_size <= 0)
+            if verdict:
+                yield {"type": "preflight", "content": verdict}
+                self._enforce_preflight(verdict)
 
             # 2. 执行 SQL
             logger.info(f"正在执行 SQL 并获取数据")
-            data, columns = self.executor.execute(sql)
-            formatted_results = self.executor.format_results(data, columns)
-            
-            yield {
-                "type": "data", 
-                "content": {
-                    "data": data,
-                    "columns": columns,
-                    "formatted_results": formatted_results
+            if self.stream_chunk_size > 0:
+                # 服务端游标分批返回，只保留前几行用于格式化和解释
+                preview, columns, row_count, truncated = [], None, 0, False
+                summarizer = ResultSummarizer()
+                # 分批执行与发送交错进行，execute 阶段包含逐批发送的时间
+                with timer.stage("execute"):
+                    for chunk in self.executor.iter_chunks(
+                        sql, self.stream_chunk_size
+                    ):
+                        if columns is None:
+                            columns = chunk.columns
+                            yield {"type": "data_start", "content": {"columns": columns}}
+                        if chunk:
+                            yield {
+                                "type": "data_chunk",
+                                "content": {"rows": chunk.to_wire()["rows"], "offset": row_count}
+                            }
+                        row_count += len(chunk)
+                        truncated = truncated or chunk.truncated
+                        summarizer.update(chunk)
+                        if len(preview) < PREVIEW_ROWS:
+                            preview.extend(islice(chunk.rows(), PREVIEW_ROWS - len(preview)))
+                with timer.stage("format"):
+                    preview = ResultSet.from_rows(columns, preview, truncated)
+                    formatted_results = self.executor.format_results(
+                        preview, total=row_count
+                    )
+                yield {
+                    "type": "data_end",
+                    "content": {
+                        "row_count": row_count,
+                        "truncated": truncated,
+                        "formatted_results": formatted_results
+                    }
                 }
-            }
+                has_data = row_count > 0
+                explain_input = self._explanation_input(summarizer, preview)
+            else:
+                with timer.stage("execute"):
+                    data = self.executor.execute(sql)
+                with timer.stage("format"):
+                    formatted_results = self.executor.format_results(data)
+                    # 列式传输: 列名只出现一次，每行是一个数组
+                    content = {**data.to_wire(), "formatted_results": formatted_results}
+                yield {"type": "data", "content": content}
+                has_data = bool(data)
+                if has_data:
+                    explain_input = self._explanation_input(ResultSummarizer().update(data), data)
 
             # 3. 流式解释结果
-            if data:
+            if has_data:
                 logger.info(f"正在流式生成结果解释")
-                prompt = get_result_explanation_prompt(question, sql, formatted_results)
-                
+                prompt = get_result_explanation_prompt(question, sql, explain_input)
+
                 # 开始发送解释内容前的信号
                 yield {"type": "explanation_start", "content": ""}
-                
-                for chunk in self.llm.generate_stream(prompt):
+
+                started = time.perf_counter()
+                for chunk in self.llm.generate_stream(prompt, on_usage=timer.add_usage):
+                    timer.first("explain_ttft", started)
                     yield {"type": "explanation_chunk", "content": chunk}
-                
+                timer.add("explain", time.perf_counter() - started)
+
                 yield {"type": "explanation_end", "content": ""}
-            
+
             # 记录成功流式日志
-            log_qa(question, sql, True, user_context=user_context)
+            timings = timer.finish()
+            log_qa(question, sql, True, user_context=user_context, timings=timings)
 
         except Exception as e:
             logger.error(f"流式查询失败: {e}")
             yield {"type": "error", "content": str(e)}
             # 记录失败流式日志
-            log_qa(question, locals().get("sql"), False, str(e), user_context=user_context)
+            timings = timer.finish(success=False)
+            log_qa(question, sql, False, str(e), user_context=user_context, timings=timings)
+
+        # 最后发送各阶段耗时与 token 用量
+        yield {"type": "timing", "content": timings}
+
+    async def ask_astream(self, question: str, user_context: Optional[Dict] = None):
+        """
+        异步流式查询数据库
+        与 ask_stream 的事件顺序一致，但 LLM 调用走异步客户端，
+        数据库操作放入有界线程池，不会阻塞事件循环
+        """
+        sql = None
+        timer = RequestTimer()
+        try:
+            from ..llm.prompts import get_result_explanation_prompt
+
+            # 1. 生成 SQL
+            logger.info(f"正在为问题生成 SQL: {question}")
+            sql = await self.executor.arun(self._cached_sql, question)
+            cached = sql is not None
+            if not cached:
+                collector = SQLStreamCollector(self.db_connector.engine.dialect.name)
+                async for event in self._astream_sql(question, collector, timer):
+                    yield event
+                sql = collector.sql
+
+            # 验证并清理 SQL
+            sql = self._validate_sql(sql, timer)
+            self._remember_sql(question, sql, cached)
+            yield {"type": "sql", "content": sql, "cached": cached}
+
+            # 执行前代价预检（分批执行不经过结果缓存，不能因缓存命中跳过）
+            with timer.stage("preflight"):
+                verdict = await self.executor.apreflight(sql, skip_cached=self.stream_chunk_size <= 0)
+            if verdict:
+                yield {"type": "preflight", "content": verdict}
+                self._enforce_preflight(verdict)
+
+            # 2. 执行 SQL
+            logger.info(f"正在执行 SQL 并获取数据")
+            if self.stream_chunk_size > 0:
+                # 服务端游标分批返回，只保留前几行用于格式化和解释
+                preview, columns, row_count, truncated = [], None, 0, False
+                summarizer = ResultSummarizer()
+                with timer.stage("execute"):
+                    async for chunk in self.executor.aiter_chunks(
+                        sql, self.stream_chunk_size
+                    ):
+                        if columns is None:
+                            columns = chunk.columns
+                            yield {"type": "data_start", "content": {"columns": columns}}
+                        if chunk:
+                            yield {
+                                "type": "data_chunk",
+                                "content": {"rows": chunk.to_wire()["rows"], "offset": row_count}
+                            }
+                        row_count += len(chunk)
+                        truncated = truncated or chunk.truncated
+                        summarizer.update(chunk)
+                        if len(preview) < PREVIEW_ROWS:
+                            preview.extend(islice(chunk.rows(), PREVIEW_ROWS - len(preview)))
+                with timer.stage("format"):
+                    preview = ResultSet.from_rows(columns, preview, truncated)
+                    formatted_results = self.executor.format_results(
+                        preview, total=row_count
+                    )
+                yield {
+                    "type": "data_end",
+                    "content": {
+                        "row_count": row_count,
+                        "truncated": truncated,
+                        "formatted_results": formatted_results
+                    }
+                }
+                has_data = row_count > 0
+                explain_input = self._explanation_input(summarizer, preview)
+            else:
+                with timer.stage("execute"):
+                    data = await self.executor.aexecute(sql)
+                with timer.stage("format"):
+                    formatted_results = self.executor.format_results(data)
+                    # 列式传输: 列名只出现一次，每行是一个数组
+                    content = {**data.to_wire(), "formatted_results": formatted_results}
+                yield {"type": "data", "content": content}
+                has_data = bool(data)
+                if has_data:
+                    explain_input = self._explanation_input(ResultSummarizer().update(data), data)
+
+            # 3. 流式解释结果
+            if has_data:
+                logger.info(f"正在流式生成结果解释")
+                prompt = get_result_explanation_prompt(question, sql, explain_input)
+
+                yield {"type": "explanation_start", "content": ""}
+
+                started = time.perf_counter()
+                async for chunk in self.llm.agenerate_stream(prompt, on_usage=timer.add_usage):
+                    timer.first("explain_ttft", started)
+                    yield {"type": "explanation_chunk", "content": chunk}
+                timer.add("explain", time.perf_counter() - started)
+
+                yield {"type": "explanation_end", "content": ""}
+
+            timings = timer.finish()
+            log_qa(question, sql, True, user_context=user_context, timings=timings)
+
+        except Exception as e:
+            logger.error(f"异步流式查询失败: {e}")
+            yield {"type": "error", "content": str(e)}
+            timings = timer.finish(success=False)
+            log_qa(question, sql, False, str(e), user_context=user_context, timings=timings)
+
+        yield {"type": "timing", "content": timings}
+
+    async def _ask_one(
+        self,
+        index: int,
+        question: str,
+        explain_results: bool,
+        llm_semaphore: asyncio.Semaphore,
+        db_semaphore: asyncio.Semaphore,
+        user_context: Optional[Dict] = None,
+    ) -> Dict[str, Any]:
+        """批量查询中的单个问题，LLM 调用和数据库查询分别受各自的并发上限约束"""
+        from ..llm.prompts import get_result_explanation_prompt
+
+        timer = RequestTimer()
+        result = {
+            "index": index,
+            "question": question,
+            "sql": None,
+            "cached": False,
+            "columns": None,
+            "rows": None,
+            "row_count": 0,
+            "preflight": None,
+            "explanation": None,
+            "error": None,
+            "timings": None,
+        }
+
+        try:
+            async with llm_semaphore:
+                sql, cached = await self._agenerate_sql(question, timer)
+            result["sql"], result["cached"] = sql, cached
 
+            sql = self._validate_sql(sql, timer)
+            result["sql"] = sql
+            self._remember_sql(question, sql, cached)
+
+            async with db_semaphore:
+                with timer.stage("preflight"):
+                    result["preflight"] = await self.executor.apreflight(sql)
+                self._enforce_preflight(result["preflight"])
+                with timer.stage("execute"):
+                    data = await self.executor.aexecute(sql)
+            result.update(data.to_wire())
+            result["row_count"] = len(data)
+
+            if explain_results and data:
+                prompt = get_result_explanation_prompt(
+                    question, sql,
+                    self._explanation_input(ResultSummarizer().update(data), data)
+                )
+                async with llm_semaphore:
+                    with timer.stage("explain"):
+                        result["explanation"] = await self.llm.agenerate(
+                            prompt, on_usage=timer.add_usage
+                        )
+
+            result["timings"] = timer.finish()
+            log_qa(question, sql, True, user_context=user_context, timings=result["timings"])
+
+        except Exception as e:
+            logger.error(f"批量查询失败 [{index}] {question}: {e}")
+            result["error"] = str(e)
+            result["timings"] = timer.finish(success=False)
+            log_qa(
+                question, result["sql"], False, str(e),
+                user_context=user_context, timings=result["timings"]
+            )
+
+        return result
+
+    async def ask_many(
+        self,
+        questions: List[str],
+        explain_results: bool = False,
+        llm_concurrency: int = 4,
+        db_concurrency: int = 4,
+        user_context: Optional[Dict] = None,
+    ):
+        """
+        批量查询（异步）
+
+        所有问题并发处理：SQL 生成与结果解释共享 LLM 并发上限，
+        SQL 执行受数据库并发上限约束。结果按完成顺序逐个产出，
+        每个结果带有 index（在输入中的位置）和各阶段耗时（毫秒）。
+        调用方提前停止迭代时，尚未完成的问题会被取消。
+        """
+        llm_semaphore = asyncio.Semaphore(max(1, llm_concurrency))
+        db_semaphore = asyncio.Semaphore(max(1, db_concurrency))
+        tasks = [
+            asyncio.ensure_future(self._ask_one(
+                i, q, explain_results, llm_semaphore, db_semaphore, user_context
+            ))
+            for i, q in enumerate(questions)
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
 
     def get_tables(self) -> list:
         """获取数据库中的所有表"""
@@ -214,5 +725,8 @@ class AskData:
         return self.schema_analyzer.get_table_schema(table_name)
 
     def close(self):
-        """关闭连接"""
+        """关闭连接（派生实例不释放共享的数据库资源）"""
+        if not self._owns_resources:
+            return
+        self.executor.close()
         self.db_connector.close()
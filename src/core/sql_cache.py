@@ -0,0 +1,151 @@
+"""问题到SQL的缓存模块"""
+
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple, Hashable, Set
+import re
+import threading
+import time
+import unicodedata
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 问题首尾常见的标点，不影响语义
+_EDGE_PUNCT = "?？。.!！,，;；:： "
+_DIGITS_RE = re.compile(r"\d+")
+
+
+def normalize_question(question: str) -> str:
+    """规范化问题文本：全半角统一、小写、合并空白、去掉首尾标点"""
+    question = unicodedata.normalize("NFKC", question).lower()
+    question = " ".join(question.split())
+    return question.strip(_EDGE_PUNCT)
+
+
+def char_ngrams(text: str, n: int = 3) -> Set[str]:
+    """字符 n-gram 集合（忽略空白），文本短于 n 时返回整个文本"""
+    text = text.replace(" ", "")
+    if len(text) <= n:
+        return {text}
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class SQLCache:
+    """
+    问题 -> SQL 缓存（LRU + TTL）
+
+    键为规范化后的问题文本与命名空间（schema版本、LLM提供商、模型），
+    命中时可以跳过 LLM 调用直接进入校验和执行。
+    可选的近似匹配基于字符 n-gram 的 Dice 相似度，且要求问题中的数字完全一致，
+    避免 "前5个" 与 "前10个" 这类问题复用同一条 SQL。
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1024,
+        ttl: float = 3600,
+        similarity_threshold: float = 0.0,
+        ngram: int = 3,
+    ):
+        """
+        初始化SQL缓存
+
+        Args:
+            max_size: 最大缓存条数
+            ttl: 过期时间（秒），<= 0 表示不过期
+            similarity_threshold: 近似匹配的相似度阈值 (0, 1]，<= 0 时只做精确匹配
+            ngram: 近似匹配使用的字符 n-gram 长度
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.ngram = ngram
+        # 键: (命名空间, 规范化问题) -> (SQL, 写入时间, n-gram 集合, 数字)
+        self._entries: "OrderedDict[Tuple[Hashable, str], tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl > 0 and time.monotonic() - stored_at > self.ttl
+
+    def get(self, question: str, namespace: Hashable) -> Optional[str]:
+        """
+        查询缓存
+
+        Args:
+            question: 用户问题
+            namespace: 命名空间（如 schema 版本、提供商、模型组成的元组）
+
+        Returns:
+            缓存的SQL，未命中时返回 None
+        """
+        normalized = normalize_question(question)
+        key = (namespace, normalized)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self._expired(entry[1]):
+                    del self._entries[key]
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+
+            if self.similarity_threshold > 0:
+                sql = self._near_match(normalized, namespace)
+                if sql is not None:
+                    self.near_hits += 1
+                    return sql
+
+            self.misses += 1
+            return None
+
+    def _near_match(self, normalized: str, namespace: Hashable) -> Optional[str]:
+        """在同一命名空间内查找最相似的问题"""
+        grams = char_ngrams(normalized, self.ngram)
+        digits = _DIGITS_RE.findall(normalized)
+        best_key, best_score = None, 0.0
+        for key, (sql, stored_at, other_grams, other_digits) in self._entries.items():
+            if key[0] != namespace or other_digits != digits or self._expired(stored_at):
+                continue
+            score = 2 * len(grams & other_grams) / (len(grams) + len(other_grams))
+            if score > best_score:
+                best_key, best_score = key, score
+
+        if best_key is None or best_score < self.similarity_threshold:
+            return None
+        logger.info(f"SQL缓存近似命中 (相似度 {best_score:.2f}): {best_key[1]}")
+        self._entries.move_to_end(best_key)
+        return self._entries[best_key][0]
+
+    def put(self, question: str, namespace: Hashable, sql: str):
+        """写入缓存（只应写入已通过校验的SQL）"""
+        normalized = normalize_question(question)
+        entry = (
+            sql,
+            time.monotonic(),
+            char_ngrams(normalized, self.ngram),
+            _DIGITS_RE.findall(normalized),
+        )
+        with self._lock:
+            self._entries[(namespace, normalized)] = entry
+            self._entries.move_to_end((namespace, normalized))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """命中统计（在锁内读取，保证各计数是同一时刻的快照）"""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+            }
@@ -2,5 +2,7 @@
 
 from .connector import DatabaseConnector
 from .schema import SchemaAnalyzer
+from .snapshot import SchemaSnapshot
+from .router import ReplicaRouter
 
-__all__ = ["DatabaseConnector", "SchemaAnalyzer"]
+__all__ = ["DatabaseConnector", "SchemaAnalyzer", "SchemaSnapshot", "ReplicaRouter"]
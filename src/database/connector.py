@@ -2,33 +2,82 @@
 
 from sqlalchemy import create_engine, inspect
 from sqlalchemy.engine import Engine
-from typing import Optional
+from typing import Optional, List, Dict, Any
 import logging
 
+from .router import ReplicaRouter
+
 logger = logging.getLogger(__name__)
 
 
 class DatabaseConnector:
     """数据库连接器"""
 
-    def __init__(self, database_url: str):
+    def __init__(
+        self,
+        database_url: str,
+        replica_urls: Optional[List[str]] = None,
+        replica_routing: str = "least_connections",
+        pool_size: int = 5,
+        max_overflow: int = 10,
+        pool_timeout: float = 30,
+        pool_pre_ping: bool = True,
+        pool_recycle: int = 3600,
+    ):
         """
         初始化数据库连接
 
         Args:
-            database_url: 数据库连接URL
+            database_url: 数据库连接URL（主库）
+            replica_urls: 只读副本URL列表，为空时只读查询也走主库
+            replica_routing: 只读查询的路由策略，round_robin 或 least_connections
+            pool_size: 每个引擎连接池的常驻连接数
+            max_overflow: 超出 pool_size 后允许临时创建的连接数
+            pool_timeout: 连接池耗尽时获取连接的最长等待秒数
+            pool_pre_ping: 借出连接前是否检测连接可用
+            pool_recycle: 连接最长复用秒数，-1 表示不回收
         """
         self.database_url = database_url
+        self.replica_urls = list(replica_urls or [])
+        self.replica_routing = replica_routing
+        self.pool_options = {
+            "pool_size": pool_size,
+            "max_overflow": max_overflow,
+            "pool_timeout": pool_timeout,
+            "pool_pre_ping": pool_pre_ping,
+            "pool_recycle": pool_recycle,
+        }
         self._engine: Optional[Engine] = None
+        self._replica_engines: List[Engine] = []
+        self._router: Optional[ReplicaRouter] = None
+
+    def _create_engine(self, url: str) -> Engine:
+        try:
+            return create_engine(url, **self.pool_options)
+        except TypeError:
+            # 部分连接池（如 SQLite 内存库使用的 SingletonThreadPool）不支持 pool_size 等参数
+            return create_engine(
+                url,
+                pool_pre_ping=self.pool_options["pool_pre_ping"],
+                pool_recycle=self.pool_options["pool_recycle"],
+            )
 
     def connect(self) -> Engine:
         """建立数据库连接"""
         if self._engine is None:
             try:
-                self._engine = create_engine(self.database_url)
+                self._engine = self._create_engine(self.database_url)
                 # 测试连接
                 with self._engine.connect() as conn:
                     logger.info(f"数据库连接成功: {self.database_url.split(':/')[0]}")
+                self._replica_engines = [self._create_engine(url) for url in self.replica_urls]
+                if self._replica_engines:
+                    logger.info(
+                        f"已配置 {len(self._replica_engines)} 个只读副本 (路由: {self.replica_routing})"
+                    )
+                self._router = ReplicaRouter(
+                    self._replica_engines or [self._engine], self.replica_routing
+                )
                 return self._engine
             except Exception as e:
                 logger.error(f"数据库连接失败: {e}")
@@ -42,6 +91,21 @@ class DatabaseConnector:
             return self.connect()
         return self._engine
 
+    @property
+    def router(self) -> ReplicaRouter:
+        """只读查询的连接路由（未配置副本时路由到主库）"""
+        if self._router is None:
+            self.connect()
+        return self._router
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """连接池统计：只读路由的各引擎等待时间与使用率"""
+        return {
+            "routing": self.replica_routing,
+            "replicas": len(self._replica_engines),
+            "engines": self.router.stats(),
+        }
+
     def get_inspector(self):
         """获取数据库检查器"""
         return inspect(self.engine)
@@ -58,6 +122,10 @@ class DatabaseConnector:
 
     def close(self):
         """关闭数据库连接"""
+        for engine in self._replica_engines:
+            engine.dispose()
+        self._replica_engines = []
+        self._router = None
         if self._engine:
             self._engine.dispose()
             self._engine = None
@@ -0,0 +1,138 @@
+"""Schema相关性检索模块"""
+
+from collections import Counter
+from typing import Dict, List, Any, Iterable, Tuple
+import math
+import re
+
+# 英文单词 / 数字 / 连续中文
+_TOKEN_RE = re.compile(r"[A-Za-z]+|\d+|[\u4e00-\u9fff]+")
+# 拆分驼峰命名，如 OrderItem -> order, item
+_CAMEL_RE = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])")
+
+# 不同来源的词在表文档中的权重（重复次数）
+NAME_WEIGHT = 3
+COLUMN_WEIGHT = 2
+TEXT_WEIGHT = 1
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    将文本切分为检索用的词
+
+    英文按下划线/驼峰拆分并小写，去掉简单的复数后缀；
+    中文没有分词器，使用字符二元组（单字时保留单字）。
+    """
+    tokens = []
+    for piece in _TOKEN_RE.findall(text):
+        if "\u4e00" <= piece[0] <= "\u9fff":
+            if len(piece) == 1:
+                tokens.append(piece)
+            else:
+                tokens.extend(piece[i:i + 2] for i in range(len(piece) - 1))
+        elif piece.isdigit():
+            tokens.append(piece)
+        else:
+            for word in _CAMEL_RE.findall(piece) or [piece]:
+                word = word.lower()
+                if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+                    word = word[:-1]
+                tokens.append(word)
+    return tokens
+
+
+class SchemaRetriever:
+    """基于 BM25 的表级检索器，用于按问题筛选需要放入提示词的表"""
+
+    def __init__(self, schema: Dict[str, Any], k1: float = 1.5, b: float = 0.75):
+        """
+        初始化检索器
+
+        Args:
+            schema: SchemaAnalyzer 反射得到的schema
+            k1: BM25 词频饱和参数
+            b: BM25 文档长度归一化参数
+        """
+        self.k1 = k1
+        self.b = b
+        self.tables = schema["tables"]
+        # 倒排索引：词 -> [(表名, 词频)]，查询时只访问问题中出现的词
+        self._postings: Dict[str, List[Tuple[str, int]]] = {}
+        self._doc_lens: Dict[str, int] = {}
+
+        for table_name, table_info in self.tables.items():
+            tokens = self._table_tokens(table_name, table_info)
+            self._doc_lens[table_name] = len(tokens)
+            for term, freq in Counter(tokens).items():
+                self._postings.setdefault(term, []).append((table_name, freq))
+
+        n = max(len(self.tables), 1)
+        self._avg_len = sum(self._doc_lens.values()) / n if self._doc_lens else 0
+        self._idf = {
+            term: math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self._postings.items()
+        }
+
+        # 外键关系：表 -> 它引用的表 / 引用它的表
+        self._refers_to: Dict[str, set] = {name: set() for name in self.tables}
+        self._referred_by: Dict[str, set] = {name: set() for name in self.tables}
+        for table_name, table_info in self.tables.items():
+            for fk in table_info.get("foreign_keys", []):
+                target = fk.get("referred_table")
+                if target in self.tables and target != table_name:
+                    self._refers_to[table_name].add(target)
+                    self._referred_by[target].add(table_name)
+
+    @staticmethod
+    def _table_tokens(table_name: str, table_info: Dict[str, Any]) -> List[str]:
+        """生成表文档：表名、表注释、列名、列注释和示例值"""
+        tokens = tokenize(table_name) * NAME_WEIGHT
+        if table_info.get("comment"):
+            tokens += tokenize(str(table_info["comment"])) * NAME_WEIGHT
+        for col in table_info.get("columns", []):
+            tokens += tokenize(col["name"]) * COLUMN_WEIGHT
+            if col.get("comment"):
+                tokens += tokenize(str(col["comment"])) * COLUMN_WEIGHT
+        for row in table_info.get("sample_data", []):
+            values: Iterable[Any] = row.values() if isinstance(row, dict) else []
+            for value in values:
+                if isinstance(value, str) and len(value) <= 64:
+                    tokens += tokenize(value) * TEXT_WEIGHT
+        return tokens
+
+    def score(self, question: str) -> Dict[str, float]:
+        """计算问题与每张表的 BM25 得分"""
+        scores: Dict[str, float] = {}
+        avg_len = self._avg_len or 1
+        for term in set(tokenize(question)):
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for table_name, freq in self._postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self._doc_lens[table_name] / avg_len)
+                scores[table_name] = scores.get(table_name, 0.0) + (
+                    idf * freq * (self.k1 + 1) / (freq + norm)
+                )
+        return scores
+
+    def select(self, question: str, top_k: int = 10) -> List[str]:
+        """
+        为问题选择相关的表
+
+        取得分最高的 top_k 张表，再沿外键补充被引用的表（用于 JOIN），
+        以及同样与问题相关、引用了已选表的表。
+
+        Returns:
+            按原schema顺序排列的表名列表，没有任何命中时返回空列表
+        """
+        scores = self.score(question)
+        if not scores:
+            return []
+
+        ranked = sorted(scores, key=lambda name: scores[name], reverse=True)
+        selected = set(ranked[:top_k])
+        for table_name in list(selected):
+            selected |= self._refers_to[table_name]
+            selected |= {t for t in self._referred_by[table_name] if t in scores}
+
+        return [name for name in self.tables if name in selected]
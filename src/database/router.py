@@ -0,0 +1,108 @@
+"""读副本路由模块"""
+
+from sqlalchemy.engine import Engine, Connection
+from sqlalchemy.pool import QueuePool
+from typing import List, Dict, Any
+import itertools
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+ROUTING_STRATEGIES = ("round_robin", "least_connections")
+
+
+class _PoolStats:
+    """单个引擎的连接获取统计"""
+
+    __slots__ = ("checkouts", "wait_total", "wait_max")
+
+    def __init__(self):
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, wait: float):
+        self.checkouts += 1
+        self.wait_total += wait
+        if wait > self.wait_max:
+            self.wait_max = wait
+
+
+class ReplicaRouter:
+    """
+    只读查询的连接路由
+
+    在一组引擎（读副本，未配置副本时即主库）之间分配只读连接：
+    round_robin 轮询；least_connections 选择当前借出连接最少的引擎（相同时轮询）。
+    同时记录每个引擎获取连接的等待时间和连接池使用率。
+    """
+
+    def __init__(self, engines: List[Engine], strategy: str = "least_connections"):
+        """
+        初始化路由器
+
+        Args:
+            engines: 可用于只读查询的引擎
+            strategy: 路由策略，round_robin 或 least_connections
+        """
+        if not engines:
+            raise ValueError("至少需要一个数据库引擎")
+        if strategy not in ROUTING_STRATEGIES:
+            raise ValueError(f"不支持的路由策略: {strategy}，可选: {', '.join(ROUTING_STRATEGIES)}")
+        self.engines = engines
+        self.strategy = strategy
+        self._counter = itertools.count()
+        self._stats = [_PoolStats() for _ in engines]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _checked_out(engine: Engine) -> int:
+        # 只有 QueuePool 提供借出计数，其他连接池（如 SQLite 内存库）视为 0
+        pool = engine.pool
+        return pool.checkedout() if isinstance(pool, QueuePool) else 0
+
+    def _choose_index(self) -> int:
+        start = next(self._counter) % len(self.engines)
+        if self.strategy == "round_robin" or len(self.engines) == 1:
+            return start
+        order = [(start + i) % len(self.engines) for i in range(len(self.engines))]
+        return min(order, key=lambda i: self._checked_out(self.engines[i]))
+
+    def choose(self) -> Engine:
+        """选择一个引擎"""
+        return self.engines[self._choose_index()]
+
+    def connect(self) -> Connection:
+        """从选中的引擎获取连接，并记录等待时间（含连接池排队和新建连接）"""
+        index = self._choose_index()
+        start = time.perf_counter()
+        conn = self.engines[index].connect()
+        wait = time.perf_counter() - start
+        with self._lock:
+            self._stats[index].record(wait)
+        return conn
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """每个引擎的连接池统计"""
+        result = []
+        for engine, stats in zip(self.engines, self._stats):
+            pool = engine.pool
+            queued = isinstance(pool, QueuePool)
+            size = pool.size() if queued else None
+            # max_overflow < 0 表示不限制溢出连接，此时按 pool_size 计算使用率
+            capacity = size + max(pool._max_overflow, 0) if queued else 0
+            checked_out = self._checked_out(engine)
+            result.append({
+                "url": engine.url.render_as_string(hide_password=True),
+                "pool_size": size,
+                "checked_out": checked_out,
+                "overflow": pool.overflow() if queued else None,
+                "utilization": round(checked_out / capacity, 3) if capacity else None,
+                "checkouts": stats.checkouts,
+                "avg_wait_ms": round(stats.wait_total / stats.checkouts * 1000, 3)
+                if stats.checkouts else 0.0,
+                "max_wait_ms": round(stats.wait_max * 1000, 3),
+            })
+        return result
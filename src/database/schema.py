@@ -2,25 +2,55 @@
 
 from sqlalchemy import inspect, MetaData, Table, text
 from sqlalchemy.engine import Engine
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import threading
+import time
 import logging
 
+from .snapshot import SchemaSnapshot
+from .retriever import SchemaRetriever
+from .router import ReplicaRouter
+
 logger = logging.getLogger(__name__)
 
 
 class SchemaAnalyzer:
     """数据库Schema分析器"""
 
-    def __init__(self, engine: Engine):
+    def __init__(
+        self,
+        engine: Engine,
+        sample_workers: int = 4,
+        snapshot_dir: Optional[str] = None,
+        router: Optional[ReplicaRouter] = None,
+    ):
         """
         初始化Schema分析器
 
         Args:
             engine: SQLAlchemy数据库引擎
+            sample_workers: 并行获取示例数据时的最大并发连接数
+            snapshot_dir: schema快照目录，为空时不持久化
+            router: 只读副本路由，示例数据查询走副本；不使用快照时结构读取也走副本，
+                    使用快照时指纹和结构都在主库读取，以免延迟的副本把旧结构存到新指纹下
         """
         self.engine = engine
+        self.router = router
         self.inspector = inspect(engine)
         self.metadata = MetaData()
+        self.sample_workers = sample_workers
+        self.snapshot = SchemaSnapshot(engine, snapshot_dir) if snapshot_dir else None
+        # schema及其描述缓存，可被共享同一分析器的多个 AskData 实例复用
+        self._schema: Optional[Dict[str, Any]] = None
+        self._description: Optional[str] = None
+        self._fragments: Dict[str, str] = {}
+        self._retriever: Optional[SchemaRetriever] = None
+        self._version: Optional[str] = None
+        self._description_lock = threading.Lock()
+        # 最近一次构建schema的各阶段耗时（毫秒）
+        self.last_build_timings: Dict[str, float] = {}
 
     def get_all_tables(self) -> List[str]:
         """获取所有表名"""
@@ -54,78 +84,350 @@ class SchemaAnalyzer:
             "sample_data": self.get_sample_data(table_name, limit=5)
         }
 
-    def get_database_schema(self) -> Dict[str, Any]:
+    def get_database_schema(
+        self,
+        sample_limit: int = 5,
+        table_names: Optional[List[str]] = None,
+        primary: bool = False,
+    ) -> Dict[str, Any]:
         """
         获取整个数据库的schema
 
+        使用 SQLAlchemy 2 的 get_multi_* 批量接口一次性反射所有表的列、主键、
+        外键和索引，示例数据在有界线程池中并行获取，每张表只查询一次。
+
+        Args:
+            sample_limit: 每张表获取的示例数据行数
+            table_names: 只反射指定的表，为空时反射全部表
+            primary: 是否在主库上反射结构（配置了只读副本时默认按路由选择副本）
+
         Returns:
             包含所有表结构信息的字典
         """
-        tables = self.get_all_tables()
-        schema = {"tables": {}}
+        timings: Dict[str, float] = {}
+        started = time.perf_counter()
+
+        def mark(stage: str, since: float) -> float:
+            now = time.perf_counter()
+            timings[stage] = round((now - since) * 1000, 2)
+            return now
+
+        # 每次构建都使用新的检查器，避免读到检查器内部缓存的旧结构
+        self.inspector = inspect(
+            self.router.choose() if self.router and not primary else self.engine
+        )
+        t = started
+        if table_names is None:
+            tables = self.inspector.get_table_names()
+        else:
+            tables = list(table_names)
+        t = mark("table_names", t)
+        if not tables:
+            self.last_build_timings = timings
+            return {"tables": {}}
+        # 只反射部分表时通过 filter_names 限定范围
+        multi_kwargs = {} if table_names is None else {"filter_names": tables}
+        all_columns = self._by_table(self.inspector.get_multi_columns(**multi_kwargs))
+        t = mark("columns", t)
+        all_pks = self._by_table(self.inspector.get_multi_pk_constraint(**multi_kwargs))
+        t = mark("primary_keys", t)
+        all_fks = self._by_table(self.inspector.get_multi_foreign_keys(**multi_kwargs))
+        t = mark("foreign_keys", t)
+        all_indexes = self._by_table(self.inspector.get_multi_indexes(**multi_kwargs))
+        t = mark("indexes", t)
+        try:
+            all_comments = self._by_table(
+                self.inspector.get_multi_table_comment(**multi_kwargs)
+            )
+        except NotImplementedError:
+            # SQLite 等不支持表注释
+            all_comments = {}
+        t = mark("table_comments", t)
+        samples = self.get_sample_data_bulk(tables, limit=sample_limit)
+        mark("sample_data", t)
 
+        schema = {"tables": {}}
         for table_name in tables:
-            try:
-                schema["tables"][table_name] = self.get_table_schema(table_name)
-                logger.info(f"已分析表: {table_name}")
-            except Exception as e:
-                logger.error(f"分析表 {table_name} 失败: {e}")
+            if table_name not in all_columns:
+                logger.error(f"分析表 {table_name} 失败: 未反射到列信息")
+                continue
+            columns = all_columns[table_name]
+            # 将 SQLAlchemy 类型对象转换为字符串，方便 JSON 序列化和前端展示
+            for col in columns:
+                col["type"] = str(col["type"])
+            schema["tables"][table_name] = {
+                "table_name": table_name,
+                "comment": all_comments.get(table_name, {}).get("text"),
+                "columns": columns,
+                "primary_keys": all_pks.get(
+                    table_name, {"constrained_columns": [], "name": None}
+                ),
+                "foreign_keys": all_fks.get(table_name, []),
+                "indexes": all_indexes.get(table_name, []),
+                "sample_data": samples.get(table_name, []),
+            }
 
+        mark("total", started)
+        self.last_build_timings = timings
+        logger.info(f"已分析 {len(schema['tables'])} 张表，耗时(ms): {timings}")
         return schema
 
-    def generate_schema_description(self) -> str:
+    @staticmethod
+    def _by_table(multi: Dict[tuple, Any]) -> Dict[str, Any]:
+        """将 get_multi_* 返回的 {(schema, 表名): 值} 转换为 {表名: 值}"""
+        return {table_name: value for (_, table_name), value in multi.items()}
+
+    def get_cached_schema(self) -> Dict[str, Any]:
+        """获取整个数据库的schema（带缓存，与schema描述共用一次构建）"""
+        self.get_cached_description()
+        return self._schema
+
+    def generate_schema_description(self, schema: Optional[Dict[str, Any]] = None) -> str:
         """
         生成人类可读的数据库schema描述
 
+        Args:
+            schema: 已反射的schema，为空时重新获取
+
         Returns:
             格式化的schema描述字符串
         """
-        schema = self.get_database_schema()
-        dialect = self.engine.name
-        tables = list(schema["tables"].keys())
-        
-        description_parts = [
-            "数据库概况:",
-            f"  - 数据库类型: {dialect}",
-            f"  - 总表数: {len(tables)}",
-            f"  - 所有表: {', '.join(tables)}",
-            "\n详细结构:"
-        ]
-
-        for table_name, table_info in schema["tables"].items():
-            description_parts.append(f"\n表: {table_name}")
-
-            # 列信息
-            description_parts.append("  列:")
-            for col in table_info["columns"]:
-                col_desc = f"    - {col['name']}: {col['type']}"
-                if col.get("nullable") is False:
-                    col_desc += " (NOT NULL)"
-                if col.get("default"):
-                    col_desc += f" DEFAULT {col['default']}"
-                description_parts.append(col_desc)
-
-            # 主键
-            if table_info["primary_keys"]["constrained_columns"]:
-                pk_cols = ", ".join(table_info["primary_keys"]["constrained_columns"])
-                description_parts.append(f"  主键: {pk_cols}")
-
-            # 外键
-            if table_info["foreign_keys"]:
-                description_parts.append("  外键:")
-                for fk in table_info["foreign_keys"]:
-                    fk_desc = f"    - {fk['constrained_columns']} -> {fk['referred_table']}.{fk['referred_columns']}"
-                    description_parts.append(fk_desc)
-
-            # 示例数据
-            sample_data = self.get_sample_data(table_name, limit=3)
-            if sample_data:
-                description_parts.append("  示例数据 (前3行):")
-                for i, row in enumerate(sample_data):
-                    description_parts.append(f"    行 {i+1}: {row}")
+        if schema is None:
+            schema = self.get_database_schema()
+        started = time.perf_counter()
+        fragments = {
+            table_name: self.describe_table(table_name, table_info)
+            for table_name, table_info in schema["tables"].items()
+        }
+        description = self.compose_description(fragments)
+        self.last_build_timings["describe"] = round(
+            (time.perf_counter() - started) * 1000, 2
+        )
+        return description
+
+    def compose_description(
+        self, fragments: Dict[str, str], total_tables: Optional[int] = None
+    ) -> str:
+        """
+        将各表的描述片段拼接为完整的schema描述
 
+        Args:
+            fragments: {表名: 描述片段}
+            total_tables: 数据库总表数，大于片段数时表示只包含按问题筛选出的表
+        """
+        tables = list(fragments.keys())
+        if total_tables is not None and total_tables > len(tables):
+            description_parts = [
+                "数据库概况:",
+                f"  - 数据库类型: {self.engine.name}",
+                f"  - 总表数: {total_tables}",
+                f"  - 与问题相关的表: {', '.join(tables)}",
+                "\n详细结构:"
+            ]
+        else:
+            description_parts = [
+                "数据库概况:",
+                f"  - 数据库类型: {self.engine.name}",
+                f"  - 总表数: {len(tables)}",
+                f"  - 所有表: {', '.join(tables)}",
+                "\n详细结构:"
+            ]
+        description_parts.extend(fragments.values())
         return "\n".join(description_parts)
 
+    def describe_table(self, table_name: str, table_info: Dict[str, Any]) -> str:
+        """
+        生成单张表的描述片段
+
+        Args:
+            table_name: 表名
+            table_info: 表结构信息
+
+        Returns:
+            该表的描述文本
+        """
+        description_parts = [f"\n表: {table_name}"]
+        if table_info.get("comment"):
+            description_parts.append(f"  说明: {table_info['comment']}")
+
+        # 列信息
+        description_parts.append("  列:")
+        for col in table_info["columns"]:
+            col_desc = f"    - {col['name']}: {col['type']}"
+            if col.get("nullable") is False:
+                col_desc += " (NOT NULL)"
+            if col.get("default"):
+                col_desc += f" DEFAULT {col['default']}"
+            if col.get("comment"):
+                col_desc += f"  -- {col['comment']}"
+            description_parts.append(col_desc)
+
+        # 主键
+        if table_info["primary_keys"]["constrained_columns"]:
+            pk_cols = ", ".join(table_info["primary_keys"]["constrained_columns"])
+            description_parts.append(f"  主键: {pk_cols}")
+
+        # 外键
+        if table_info["foreign_keys"]:
+            description_parts.append("  外键:")
+            for fk in table_info["foreign_keys"]:
+                fk_desc = f"    - {fk['constrained_columns']} -> {fk['referred_table']}.{fk['referred_columns']}"
+                description_parts.append(fk_desc)
+
+        # 示例数据（复用反射时获取的数据，不再重复查询）
+        sample_data = table_info.get("sample_data", [])[:3]
+        if sample_data:
+            description_parts.append("  示例数据 (前3行):")
+            for i, row in enumerate(sample_data):
+                description_parts.append(f"    行 {i+1}: {row}")
+
+        return "\n".join(description_parts)
+
+    def _build_from_snapshot(self, fingerprints: Dict[str, str]):
+        """
+        基于快照增量构建schema
+
+        指纹未变化的表直接复用快照中的结构和描述片段，
+        只重新反射新增或结构发生变化的表，并回写快照。
+        """
+        started = time.perf_counter()
+        cached = self.snapshot.load()
+        entries: Dict[str, Dict[str, Any]] = {}
+        changed = []
+        for table_name, fingerprint in fingerprints.items():
+            entry = cached.get(table_name)
+            if entry and entry.get("fingerprint") == fingerprint:
+                entries[table_name] = entry
+            else:
+                changed.append(table_name)
+        reused = len(entries)
+
+        # 指纹在主库计算，结构也必须在主库反射，二者才对应同一版本
+        fresh = self.get_database_schema(table_names=changed, primary=True)
+        timings = self.last_build_timings
+        for table_name in changed:
+            table_info = fresh["tables"].get(table_name)
+            if table_info is None:
+                continue
+            entries[table_name] = {
+                "fingerprint": fingerprints[table_name],
+                "schema": table_info,
+                "description": self.describe_table(table_name, table_info),
+            }
+
+        # 保持与数据库一致的表顺序
+        entries = {name: entries[name] for name in fingerprints if name in entries}
+        if changed or set(cached) != set(entries):
+            self.snapshot.save(entries)
+
+        self._set_cache(
+            {"tables": {name: e["schema"] for name, e in entries.items()}},
+            {name: e["description"] for name, e in entries.items()},
+        )
+        timings["snapshot_total"] = round((time.perf_counter() - started) * 1000, 2)
+        self.last_build_timings = timings
+        logger.info(
+            f"schema增量构建完成: 复用 {reused} 张表，"
+            f"重新反射 {len(changed)} 张表，耗时(ms): {timings}"
+        )
+
+    def get_cached_description(self) -> str:
+        """获取schema描述（带缓存，并发调用时只构建一次）"""
+        if self._description is None:
+            with self._description_lock:
+                if self._description is None:
+                    fingerprints = None
+                    if self.snapshot:
+                        started = time.perf_counter()
+                        fingerprints = self.snapshot.fingerprint_tables()
+                        fingerprint_ms = round((time.perf_counter() - started) * 1000, 2)
+                    if fingerprints is not None:
+                        self._build_from_snapshot(fingerprints)
+                        self.last_build_timings["fingerprint"] = fingerprint_ms
+                    else:
+                        schema = self.get_database_schema()
+                        self._set_cache(schema, {
+                            table_name: self.describe_table(table_name, table_info)
+                            for table_name, table_info in schema["tables"].items()
+                        })
+        return self._description
+
+    def _set_cache(self, schema: Dict[str, Any], fragments: Dict[str, str]):
+        """更新schema、描述片段和完整描述缓存"""
+        self._schema = schema
+        self._fragments = fragments
+        self._retriever = None
+        description = self.compose_description(fragments)
+        self._version = hashlib.sha1(description.encode("utf-8")).hexdigest()[:16]
+        self._description = description
+
+    @property
+    def schema_version(self) -> str:
+        """当前schema的指纹，schema变化后随之改变，可用作缓存键的一部分"""
+        self.get_cached_description()
+        return self._version
+
+    def get_relevant_description(self, question: str, top_k: int = 10) -> str:
+        """
+        获取与问题相关的schema描述
+
+        通过 BM25 检索选出最相关的 top_k 张表，并沿外键补充关联表，
+        使提示词大小取决于问题本身而非数据库规模。
+
+        Args:
+            question: 用户问题
+            top_k: 最多直接命中的表数量，<= 0 时不筛选
+
+        Returns:
+            筛选后的schema描述；表数量不超过 top_k 或没有任何命中时返回完整描述
+        """
+        description = self.get_cached_description()
+        fragments = self._fragments
+        if top_k <= 0 or len(fragments) <= top_k:
+            return description
+
+        if self._retriever is None:
+            with self._description_lock:
+                if self._retriever is None:
+                    self._retriever = SchemaRetriever(self._schema)
+        tables = self._retriever.select(question, top_k=top_k)
+        if not tables:
+            logger.info("问题未命中任何表，使用完整schema描述")
+            return description
+
+        logger.info(f"按问题筛选出 {len(tables)}/{len(fragments)} 张表: {', '.join(tables)}")
+        return self.compose_description(
+            {name: fragments[name] for name in tables}, total_tables=len(fragments)
+        )
+
+    def invalidate(self):
+        """清除schema描述缓存"""
+        self._schema = None
+        self._fragments = {}
+        self._retriever = None
+        self._version = None
+        self._description = None
+
+    def get_sample_data_bulk(self, tables: List[str], limit: int = 3) -> Dict[str, List[Dict]]:
+        """
+        并行获取多张表的示例数据
+
+        并发数受 sample_workers 限制，避免占满连接池
+
+        Args:
+            tables: 表名列表
+            limit: 每张表返回的行数
+
+        Returns:
+            {表名: 示例数据列表}
+        """
+        if not tables:
+            return {}
+        workers = max(1, min(self.sample_workers, len(tables)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="schema-sample") as pool:
+            results = pool.map(lambda name: self.get_sample_data(name, limit=limit), tables)
+            return dict(zip(tables, results))
+
     def get_sample_data(self, table_name: str, limit: int = 3) -> List[Dict]:
         """
         获取表的示例数据
@@ -138,7 +440,7 @@ class SchemaAnalyzer:
             示例数据列表
         """
         try:
-            with self.engine.connect() as conn:
+            with (self.router.connect() if self.router else self.engine.connect()) as conn:
                 result = conn.execute(text(f"SELECT * FROM {table_name} LIMIT {limit}"))
                 columns = result.keys()
                 return [dict(zip(columns, row)) for row in result.fetchall()]
@@ -0,0 +1,137 @@
+"""Schema快照持久化模块"""
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from typing import Dict, Any, Optional
+import hashlib
+import json
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 各数据库获取表结构指纹的查询，结果按表名分组后计算哈希
+# 只读取系统目录，开销远小于完整反射
+FINGERPRINT_QUERIES = {
+    "sqlite": [
+        "SELECT name, sql FROM sqlite_master "
+        "WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name",
+        "SELECT tbl_name, type, name, sql FROM sqlite_master "
+        "WHERE type IN ('index', 'trigger') ORDER BY tbl_name, type, name",
+    ],
+    "mysql": [
+        "SELECT c.table_name, c.column_name, c.column_type, c.is_nullable, "
+        "c.column_default, c.column_key, c.column_comment "
+        "FROM information_schema.columns c "
+        "JOIN information_schema.tables t "
+        "ON t.table_schema = c.table_schema AND t.table_name = c.table_name "
+        "WHERE c.table_schema = DATABASE() AND t.table_type = 'BASE TABLE' "
+        "ORDER BY c.table_name, c.ordinal_position",
+        "SELECT table_name, constraint_name, column_name, "
+        "referenced_table_name, referenced_column_name "
+        "FROM information_schema.key_column_usage "
+        "WHERE table_schema = DATABASE() "
+        "ORDER BY table_name, constraint_name, ordinal_position",
+    ],
+    "postgresql": [
+        "SELECT c.table_name, c.column_name, c.data_type, c.is_nullable, c.column_default "
+        "FROM information_schema.columns c "
+        "JOIN information_schema.tables t "
+        "ON t.table_schema = c.table_schema AND t.table_name = c.table_name "
+        "WHERE c.table_schema = current_schema() AND t.table_type = 'BASE TABLE' "
+        "ORDER BY c.table_name, c.ordinal_position",
+        "SELECT table_name, constraint_name, column_name "
+        "FROM information_schema.key_column_usage "
+        "WHERE table_schema = current_schema() "
+        "ORDER BY table_name, constraint_name, ordinal_position",
+    ],
+}
+# mariadb 与 mysql 共用 information_schema 查询
+FINGERPRINT_QUERIES["mariadb"] = FINGERPRINT_QUERIES["mysql"]
+
+
+class SchemaSnapshot:
+    """Schema本地快照，按数据库URL区分，使用表结构指纹校验"""
+
+    VERSION = 2
+
+    def __init__(self, engine: Engine, snapshot_dir: str):
+        """
+        初始化Schema快照
+
+        Args:
+            engine: SQLAlchemy数据库引擎
+            snapshot_dir: 快照文件存放目录
+        """
+        self.engine = engine
+        url = engine.url.render_as_string(hide_password=False)
+        self.url_hash = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        self.path = os.path.join(
+            snapshot_dir, f"schema_{engine.name}_{self.url_hash[:16]}.json"
+        )
+
+    def fingerprint_tables(self) -> Optional[Dict[str, str]]:
+        """
+        计算每张表的结构指纹
+
+        Returns:
+            {表名: 指纹}，数据库类型不支持或查询失败时返回 None
+        """
+        queries = FINGERPRINT_QUERIES.get(self.engine.dialect.name)
+        if not queries:
+            return None
+
+        try:
+            hashers: Dict[str, Any] = {}
+            with self.engine.connect() as conn:
+                for i, query in enumerate(queries):
+                    for row in conn.execute(text(query)):
+                        table_name = row[0]
+                        # 只有主查询（第一条）中出现的表才是需要描述的表
+                        if i == 0:
+                            hashers.setdefault(table_name, hashlib.sha1())
+                        elif table_name not in hashers:
+                            continue
+                        hashers[table_name].update(repr(tuple(row[1:])).encode("utf-8"))
+
+            return {name: h.hexdigest() for name, h in sorted(hashers.items())}
+        except Exception as e:
+            logger.warning(f"计算schema指纹失败，将完整重建: {e}")
+            return None
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """
+        读取快照
+
+        Returns:
+            {表名: {"fingerprint", "schema", "description"}}，快照不存在或无效时返回空字典
+        """
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                payload = json.load(f)
+            if payload.get("version") != self.VERSION or payload.get("url_hash") != self.url_hash:
+                return {}
+            return payload.get("tables", {})
+        except Exception as e:
+            logger.warning(f"读取schema快照失败: {e}")
+            return {}
+
+    def save(self, tables: Dict[str, Dict[str, Any]]):
+        """写入快照（先写临时文件再替换，避免并发读到半个文件）"""
+        payload = {
+            "version": self.VERSION,
+            "url_hash": self.url_hash,
+            "dialect": self.engine.dialect.name,
+            "tables": tables,
+        }
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False, default=str)
+            os.replace(tmp_path, self.path)
+            logger.info(f"schema快照已保存: {self.path}")
+        except Exception as e:
+            logger.warning(f"保存schema快照失败: {e}")
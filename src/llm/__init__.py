@@ -1,12 +1,45 @@
 """LLM模块"""
 
-from .claude import ClaudeClient
-from .qwen import QwenClient
-from .prompts import get_text_to_sql_prompt, get_result_explanation_prompt
+from importlib import import_module
+
+from .registry import create_client, register_provider, available_providers
+from .prompts import (
+    get_text_to_sql_prompt,
+    get_text_to_sql_system_prompt,
+    get_text_to_sql_system_parts,
+    get_text_to_sql_user_prompt,
+    get_result_explanation_prompt,
+)
+
+# 客户端类按需导入（PEP 562），导入本模块不会加载 anthropic/openai SDK
+_LAZY_CLIENTS = {
+    "ClaudeClient": ".claude",
+    "QwenClient": ".qwen",
+    "ReplayClient": ".replay",
+    "RecordingClient": ".replay",
+}
+
+
+def __getattr__(name):
+    module = _LAZY_CLIENTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
 
 __all__ = [
     "ClaudeClient",
     "QwenClient",
+    "ReplayClient",
+    "RecordingClient",
+    "create_client",
+    "register_provider",
+    "available_providers",
     "get_text_to_sql_prompt",
+    "get_text_to_sql_system_prompt",
+    "get_text_to_sql_system_parts",
+    "get_text_to_sql_user_prompt",
     "get_result_explanation_prompt",
 ]
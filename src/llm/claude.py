@@ -1,11 +1,17 @@
 """Claude API交互模块"""
 
-from anthropic import Anthropic
-from typing import Optional
+from anthropic import Anthropic, AsyncAnthropic
+from typing import Optional, Dict, Any, Callable, Sequence, Union
 import logging
 
+from ..utils.logger import log_prompt
+from .sql_stream import clean_sql
+
 logger = logging.getLogger(__name__)
 
+# 单个请求允许的提示词缓存断点数上限
+MAX_CACHE_BREAKPOINTS = 4
+
 
 class ClaudeClient:
     """Claude API客户端"""
@@ -27,17 +33,78 @@ class ClaudeClient:
             temperature: 温度参数
         """
         self.client = Anthropic(api_key=api_key)
+        self.async_client = AsyncAnthropic(api_key=api_key)
         self.model = model
         self.max_tokens = max_tokens
         self.temperature = temperature
 
-    def generate(self, prompt: str, system_prompt: Optional[str] = None) -> str:
+    def _build_kwargs(
+        self,
+        prompt: str,
+        system_prompt: Optional[Union[str, Sequence[str]]],
+        cache_system: bool,
+    ) -> Dict[str, Any]:
+        """
+        构造请求参数
+
+        system_prompt 可以是多段文本，按顺序作为多个系统文本块发送。
+        cache_system 为 True 时，每段末尾都标记缓存断点（至多 MAX_CACHE_BREAKPOINTS 个）：
+        缓存的是到断点为止的整个前缀，而规则、示例一段通常短于模型的最小可缓存长度
+        （Sonnet 为 1024 token），单独标记不会生效；规则 + schema 的前缀超过该长度，
+        问题涉及的表相同（或未裁剪 schema）时即可命中 Anthropic 的提示词缓存。
+        """
+        kwargs = {
+            "model": self.model,
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "messages": [{"role": "user", "content": prompt}],
+        }
+        if isinstance(system_prompt, str):
+            system_prompt = [system_prompt]
+        blocks = [block for block in system_prompt or () if block]
+        if blocks:
+            if cache_system:
+                kwargs["system"] = [{"type": "text", "text": block} for block in blocks]
+                for block in kwargs["system"][:MAX_CACHE_BREAKPOINTS]:
+                    block["cache_control"] = {"type": "ephemeral"}
+            else:
+                kwargs["system"] = "\n\n".join(blocks)
+        log_prompt(logger, prompt, "\n\n".join(blocks) or None)
+        return kwargs
+
+    @staticmethod
+    def _log_usage(usage, on_usage: Optional[Callable[[Dict[str, int]], None]] = None):
+        """记录token用量，包括提示词缓存的读取/写入量，并回调给调用方"""
+        if usage is None:
+            return
+        counts = {
+            "input_tokens": usage.input_tokens,
+            "output_tokens": usage.output_tokens,
+            "cache_read_tokens": getattr(usage, "cache_read_input_tokens", 0) or 0,
+            "cache_write_tokens": getattr(usage, "cache_creation_input_tokens", 0) or 0,
+        }
+        logger.info(
+            f"Token用量: 输入 {counts['input_tokens']}, 输出 {counts['output_tokens']}, "
+            f"缓存读取 {counts['cache_read_tokens']}, 缓存写入 {counts['cache_write_tokens']}"
+        )
+        if on_usage is not None:
+            on_usage(counts)
+
+    def generate(
+        self,
+        prompt: str,
+        system_prompt: Optional[Union[str, Sequence[str]]] = None,
+        cache_system: bool = False,
+        on_usage: Optional[Callable[[Dict[str, int]], None]] = None,
+    ) -> str:
         """
         生成回复
 
         Args:
             prompt: 用户提示词
-            system_prompt: 系统提示词
+            system_prompt: 系统提示词，可以是多段文本
+            cache_system: 是否将系统提示词的各段标记为可缓存
+            on_usage: token 用量回调，参数为 {input_tokens, output_tokens, cache_read_tokens, cache_write_tokens}
 
         Returns:
             Claude的回复内容
@@ -45,26 +112,15 @@ class ClaudeClient:
         try:
             logger.info(f"正在调用Claude API (模型: {self.model})")
 
-            messages = [{"role": "user", "content": prompt}]
-
-            kwargs = {
-                "model": self.model,
-                "max_tokens": self.max_tokens,
-                "temperature": self.temperature,
-                "messages": messages,
-            }
+            kwargs = self._build_kwargs(prompt, system_prompt, cache_system)
 
-            if system_prompt:
-                kwargs["system"] = system_prompt
-                logger.debug(f"系统提示词: {system_prompt}")
-            
-            logger.info(f"发送用户提示词: \n{prompt}")
             response = self.client.messages.create(**kwargs)
 
             # 提取文本内容
             content = response.content[0].text
             logger.info(f"API调用成功，返回 {len(content)} 字符")
-            logger.info(f"API回复内容: \n{content}")
+            logger.info("API回复内容: \n%s", content)
+            self._log_usage(response.usage, on_usage)
 
             return content.strip()
 
@@ -72,30 +128,93 @@ class ClaudeClient:
             logger.error(f"Claude API调用失败: {e}")
             raise RuntimeError(f"Claude API调用失败: {e}")
 
-    def generate_stream(self, prompt: str, system_prompt: Optional[str] = None):
+    def generate_stream(
+        self,
+        prompt: str,
+        system_prompt: Optional[Union[str, Sequence[str]]] = None,
+        cache_system: bool = False,
+        on_usage: Optional[Callable[[Dict[str, int]], None]] = None,
+    ):
         """流式生成回复"""
         try:
             logger.info(f"正在启动 Claude 流式调用 (模型: {self.model})")
 
-            messages = [{"role": "user", "content": prompt}]
-            kwargs = {
-                "model": self.model,
-                "max_tokens": self.max_tokens,
-                "temperature": self.temperature,
-                "messages": messages,
-            }
-            if system_prompt:
-                kwargs["system"] = system_prompt
+            kwargs = self._build_kwargs(prompt, system_prompt, cache_system)
 
             with self.client.messages.stream(**kwargs) as stream:
-                for text in stream.text_stream:
-                    yield text
+                try:
+                    for text in stream.text_stream:
+                        yield text
+                except GeneratorExit:
+                    # 调用方提前关闭（如已检测到完整SQL）时拿不到最终消息，
+                    # 按 message_start 以来的用量快照上报，关闭前已计费的输入不会漏记
+                    self._log_usage(stream.current_message_snapshot.usage, on_usage)
+                    raise
+                self._log_usage(stream.get_final_message().usage, on_usage)
 
         except Exception as e:
             logger.error(f"Claude 流式内容失败: {e}")
             raise RuntimeError(f"Claude 流式内容失败: {e}")
 
-    def generate_sql(self, question: str, schema: str, examples: str = "") -> str:
+    async def agenerate(
+        self,
+        prompt: str,
+        system_prompt: Optional[Union[str, Sequence[str]]] = None,
+        cache_system: bool = False,
+        on_usage: Optional[Callable[[Dict[str, int]], None]] = None,
+    ) -> str:
+        """生成回复（异步，不阻塞事件循环）"""
+        try:
+            logger.info(f"正在异步调用Claude API (模型: {self.model})")
+
+            kwargs = self._build_kwargs(prompt, system_prompt, cache_system)
+
+            response = await self.async_client.messages.create(**kwargs)
+
+            content = response.content[0].text
+            logger.info(f"API调用成功，返回 {len(content)} 字符")
+            logger.info("API回复内容: \n%s", content)
+            self._log_usage(response.usage, on_usage)
+
+            return content.strip()
+
+        except Exception as e:
+            logger.error(f"Claude API调用失败: {e}")
+            raise RuntimeError(f"Claude API调用失败: {e}")
+
+    async def agenerate_stream(
+        self,
+        prompt: str,
+        system_prompt: Optional[Union[str, Sequence[str]]] = None,
+        cache_system: bool = False,
+        on_usage: Optional[Callable[[Dict[str, int]], None]] = None,
+    ):
+        """流式生成回复（异步）"""
+        try:
+            logger.info(f"正在启动 Claude 异步流式调用 (模型: {self.model})")
+
+            kwargs = self._build_kwargs(prompt, system_prompt, cache_system)
+
+            async with self.async_client.messages.stream(**kwargs) as stream:
+                try:
+                    async for text in stream.text_stream:
+                        yield text
+                except GeneratorExit:
+                    self._log_usage(stream.current_message_snapshot.usage, on_usage)
+                    raise
+                self._log_usage((await stream.get_final_message()).usage, on_usage)
+
+        except Exception as e:
+            logger.error(f"Claude 流式内容失败: {e}")
+            raise RuntimeError(f"Claude 流式内容失败: {e}")
+
+    def generate_sql(
+        self,
+        question: str,
+        schema: str,
+        examples: str = "",
+        on_usage: Optional[Callable[[Dict[str, int]], None]] = None,
+    ) -> str:
         """
         将自然语言问题转换为SQL
 
@@ -103,29 +222,82 @@ class ClaudeClient:
             question: 自然语言问题
             schema: 数据库schema
             examples: 可选的示例
+            on_usage: token 用量回调
 
         Returns:
             生成的SQL语句
         """
-        from .prompts import get_text_to_sql_prompt
+        from .prompts import get_text_to_sql_system_parts, get_text_to_sql_user_prompt
 
-        prompt = get_text_to_sql_prompt(question, schema, examples)
-        sql = self.generate(prompt)
+        sql = self.generate(
+            get_text_to_sql_user_prompt(question),
+            system_prompt=get_text_to_sql_system_parts(schema, examples),
+            cache_system=True,
+            on_usage=on_usage,
+        )
 
-        # 清理SQL语句
-        sql = sql.strip()
-        # 移除可能的markdown代码块标记
-        if sql.startswith("```sql"):
-            sql = sql[6:]
-        if sql.startswith("```"):
-            sql = sql[3:]
-        if sql.endswith("```"):
-            sql = sql[:-3]
-        sql = sql.strip()
+        return clean_sql(sql)
 
-        return sql
+    async def agenerate_sql(
+        self,
+        question: str,
+        schema: str,
+        examples: str = "",
+        on_usage: Optional[Callable[[Dict[str, int]], None]] = None,
+    ) -> str:
+        """将自然语言问题转换为SQL（异步）"""
+        from .prompts import get_text_to_sql_system_parts, get_text_to_sql_user_prompt
+
+        sql = await self.agenerate(
+            get_text_to_sql_user_prompt(question),
+            system_prompt=get_text_to_sql_system_parts(schema, examples),
+            cache_system=True,
+            on_usage=on_usage,
+        )
+
+        return clean_sql(sql)
+
+    def generate_sql_stream(
+        self,
+        question: str,
+        schema: str,
+        examples: str = "",
+        on_usage: Optional[Callable[[Dict[str, int]], None]] = None,
+    ):
+        """流式生成SQL，逐段返回模型输出（未清理，由调用方检测语句结束）"""
+        from .prompts import get_text_to_sql_system_parts, get_text_to_sql_user_prompt
 
-    def explain_results(self, question: str, sql: str, results: str) -> str:
+        return self.generate_stream(
+            get_text_to_sql_user_prompt(question),
+            system_prompt=get_text_to_sql_system_parts(schema, examples),
+            cache_system=True,
+            on_usage=on_usage,
+        )
+
+    def agenerate_sql_stream(
+        self,
+        question: str,
+        schema: str,
+        examples: str = "",
+        on_usage: Optional[Callable[[Dict[str, int]], None]] = None,
+    ):
+        """流式生成SQL（异步）"""
+        from .prompts import get_text_to_sql_system_parts, get_text_to_sql_user_prompt
+
+        return self.agenerate_stream(
+            get_text_to_sql_user_prompt(question),
+            system_prompt=get_text_to_sql_system_parts(schema, examples),
+            cache_system=True,
+            on_usage=on_usage,
+        )
+
+    def explain_results(
+        self,
+        question: str,
+        sql: str,
+        results: str,
+        on_usage: Optional[Callable[[Dict[str, int]], None]] = None,
+    ) -> str:
         """
         解释查询结果
 
@@ -133,6 +305,7 @@ class ClaudeClient:
             question: 原始问题
             sql: SQL语句
             results: 查询结果
+            on_usage: token 用量回调
 
         Returns:
             自然语言解释
@@ -140,6 +313,6 @@ class ClaudeClient:
         from .prompts import get_result_explanation_prompt
 
         prompt = get_result_explanation_prompt(question, sql, results)
-        explanation = self.generate(prompt)
+        explanation = self.generate(prompt, on_usage=on_usage)
 
         return explanation
@@ -1,5 +1,7 @@
 """提示词模板模块"""
 
+from typing import Tuple
+
 
 def get_text_to_sql_prompt(question: str, schema: str, examples: str = "") -> str:
     """
@@ -13,11 +15,29 @@ def get_text_to_sql_prompt(question: str, schema: str, examples: str = "") -> st
     Returns:
         完整的提示词
     """
-    prompt = f"""你是一个专业的 SQL 执行专家。请根据用户的问题和数据库结构，生成一条**纯净、准确、可直接执行**的 SQL 查询语句。
+    return (
+        get_text_to_sql_system_prompt(schema, examples)
+        + "\n\n"
+        + get_text_to_sql_user_prompt(question)
+    )
+
 
-{schema}
+def get_text_to_sql_system_parts(schema: str, examples: str = "") -> Tuple[str, str]:
+    """
+    生成Text-to-SQL系统提示词的两段
 
-注意：每个表都提供了“示例数据”。请通过观察这些真实数据来理解列的含义及常见的列值格式。
+    第一段是规则和示例，与问题和数据库都无关，跨请求完全不变，始终位于缓存前缀的最前面；
+    第二段是schema描述，开启 SCHEMA_TOP_K 裁剪时随问题涉及的表变化，
+    涉及的表相同（或未裁剪）的请求可以命中包含 schema 的整个前缀。
+
+    Args:
+        schema: 数据库schema描述
+        examples: 可选的示例
+
+    Returns:
+        (规则和示例, schema描述)
+    """
+    rules = f"""你是一个专业的 SQL 执行专家。请根据用户的问题和数据库结构，生成一条**纯净、准确、可直接执行**的 SQL 查询语句。
 
 要求:
 1. 只生成 SELECT 查询。
@@ -31,11 +51,41 @@ def get_text_to_sql_prompt(question: str, schema: str, examples: str = "") -> st
 
 {examples}
 
-用户问题: {question}
+注意：下面的数据库结构中每个表都提供了“示例数据”。请通过观察这些真实数据来理解列的含义及常见的列值格式。"""
 
-SQL查询语句:"""
+    return rules, schema
 
-    return prompt
+
+def get_text_to_sql_system_prompt(schema: str, examples: str = "") -> str:
+    """
+    生成Text-to-SQL的系统提示词
+
+    规则和示例在前、schema在后，不变的部分构成请求前缀，便于命中模型服务端的前缀缓存；
+    schema按问题裁剪时只有规则和示例部分能命中。
+
+    Args:
+        schema: 数据库schema描述
+        examples: 可选的示例
+
+    Returns:
+        系统提示词
+    """
+    return "\n\n".join(get_text_to_sql_system_parts(schema, examples))
+
+
+def get_text_to_sql_user_prompt(question: str) -> str:
+    """
+    生成Text-to-SQL提示词中随问题变化的部分
+
+    Args:
+        question: 用户的自然语言问题
+
+    Returns:
+        用户提示词
+    """
+    return f"""用户问题: {question}
+
+SQL查询语句:"""
 
 
 def get_result_explanation_prompt(question: str, sql: str, results: str) -> str:
@@ -45,7 +95,7 @@ def get_result_explanation_prompt(question: str, sql: str, results: str) -> str:
     Args:
         question: 用户的原始问题
         sql: 执行的SQL语句
-        results: 查询结果
+        results: 查询结果（各列统计概要与少量示例行）
 
     Returns:
         完整的提示词
@@ -56,7 +106,7 @@ def get_result_explanation_prompt(question: str, sql: str, results: str) -> str:
 
 执行的SQL: {sql}
 
-查询结果:
+查询结果（统计概要与示例行）:
 {results}
 
 请用1-3句话总结这个结果，重点关注:
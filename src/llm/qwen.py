@@ -1,9 +1,13 @@
 """Qwen API交互模块 (OpenAI兼容接口)"""
 
-from openai import OpenAI
-from typing import Optional
+from openai import OpenAI, AsyncOpenAI
+from typing import Optional, Dict, Callable
 import logging
 
+from ..utils.logger import log_prompt
+from .sql_stream import clean_sql
+from .replay import estimate_tokens
+
 logger = logging.getLogger(__name__)
 
 
@@ -29,11 +33,62 @@ class QwenClient:
             temperature: 温度参数
         """
         self.client = OpenAI(api_key=api_key, base_url=base_url)
+        self.async_client = AsyncOpenAI(api_key=api_key, base_url=base_url)
         self.model = model
         self.max_tokens = max_tokens
         self.temperature = temperature
 
-    def generate(self, prompt: str, system_prompt: Optional[str] = None) -> str:
+    @staticmethod
+    def _log_usage(usage, on_usage: Optional[Callable[[Dict[str, int]], None]] = None):
+        """记录token用量，包括命中服务端前缀缓存的token数，并回调给调用方"""
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = (getattr(details, "cached_tokens", 0) if details else 0) or 0
+        logger.info(
+            f"Token用量: 输入 {usage.prompt_tokens}, 输出 {usage.completion_tokens}, "
+            f"缓存命中 {cached}"
+        )
+        if on_usage is not None:
+            on_usage({
+                "input_tokens": usage.prompt_tokens,
+                "output_tokens": usage.completion_tokens,
+                "cache_read_tokens": cached,
+                "cache_write_tokens": 0,
+            })
+
+    @staticmethod
+    def _estimate_usage(
+        prompt: str,
+        system_prompt: Optional[str],
+        content: str,
+        on_usage: Optional[Callable[[Dict[str, int]], None]] = None,
+    ):
+        """
+        按文本估算用量并回调
+
+        用量只在 include_usage 的最后一个数据块中返回，调用方提前关闭流（如已检测到完整SQL）时
+        立即断开、不再等待剩余输出，用量改为按提示词和已收到的输出估算。
+        """
+        counts = {
+            "input_tokens": estimate_tokens(system_prompt or "") + estimate_tokens(prompt),
+            "output_tokens": estimate_tokens(content),
+            "cache_read_tokens": 0,
+            "cache_write_tokens": 0,
+        }
+        logger.info(
+            f"Token用量(估算，流式响应已提前关闭): 输入 {counts['input_tokens']}, "
+            f"输出 {counts['output_tokens']}"
+        )
+        if on_usage is not None:
+            on_usage(counts)
+
+    def generate(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        on_usage: Optional[Callable[[Dict[str, int]], None]] = None,
+    ) -> str:
         """生成回复"""
         try:
             logger.info(f"正在调用 Qwen API (模型: {self.model})")
@@ -42,6 +97,7 @@ class QwenClient:
             if system_prompt:
                 messages.append({"role": "system", "content": system_prompt})
             messages.append({"role": "user", "content": prompt})
+            log_prompt(logger, prompt, system_prompt)
 
             response = self.client.chat.completions.create(
                 model=self.model,
@@ -51,14 +107,20 @@ class QwenClient:
             )
 
             content = response.choices[0].message.content
-            logger.info(f"Qwen API 响应内容: {content}")
+            logger.info("Qwen API 响应内容: %s", content)
+            self._log_usage(response.usage, on_usage)
             return content.strip()
 
         except Exception as e:
             logger.error(f"Qwen API调用失败: {e}")
             raise RuntimeError(f"Qwen API调用失败: {e}")
 
-    def generate_stream(self, prompt: str, system_prompt: Optional[str] = None):
+    def generate_stream(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        on_usage: Optional[Callable[[Dict[str, int]], None]] = None,
+    ):
         """流式生成回复"""
         try:
             logger.info(f"正在启动 Qwen 流式调用 (模型: {self.model})")
@@ -67,6 +129,7 @@ class QwenClient:
             if system_prompt:
                 messages.append({"role": "system", "content": system_prompt})
             messages.append({"role": "user", "content": prompt})
+            log_prompt(logger, prompt, system_prompt)
 
             stream = self.client.chat.completions.create(
                 model=self.model,
@@ -74,46 +137,192 @@ class QwenClient:
                 max_tokens=self.max_tokens,
                 temperature=self.temperature,
                 stream=True,
+                stream_options={"include_usage": True},
             )
 
             full_content = []
-            for chunk in stream:
-                if chunk.choices and chunk.choices[0].delta.content:
-                    c = chunk.choices[0].delta.content
-                    full_content.append(c)
-                    yield c
+            # 调用方提前停止（如客户端断开）时关闭响应，不再继续生成
+            with stream:
+                try:
+                    for chunk in stream:
+                        # 开启 include_usage 后，最后一个数据块只携带用量信息
+                        if getattr(chunk, "usage", None):
+                            self._log_usage(chunk.usage, on_usage)
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            c = chunk.choices[0].delta.content
+                            full_content.append(c)
+                            yield c
+                except GeneratorExit:
+                    self._estimate_usage(prompt, system_prompt, "".join(full_content), on_usage)
+                    raise
             
             if full_content:
-                logger.info(f"Qwen API 流式响应完整内容 : {''.join(full_content)}")
+                logger.info("Qwen API 流式响应完整内容 : %s", "".join(full_content))
+
+        except Exception as e:
+            logger.error(f"Qwen 流式调用失败: {e}")
+            raise RuntimeError(f"Qwen 流式调用失败: {e}")
+
+    async def agenerate(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        on_usage: Optional[Callable[[Dict[str, int]], None]] = None,
+    ) -> str:
+        """生成回复（异步，不阻塞事件循环）"""
+        try:
+            logger.info(f"正在异步调用 Qwen API (模型: {self.model})")
+
+            messages = []
+            if system_prompt:
+                messages.append({"role": "system", "content": system_prompt})
+            messages.append({"role": "user", "content": prompt})
+            log_prompt(logger, prompt, system_prompt)
+
+            response = await self.async_client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                max_tokens=self.max_tokens,
+                temperature=self.temperature,
+            )
+
+            content = response.choices[0].message.content
+            logger.info("Qwen API 响应内容: %s", content)
+            self._log_usage(response.usage, on_usage)
+            return content.strip()
+
+        except Exception as e:
+            logger.error(f"Qwen API调用失败: {e}")
+            raise RuntimeError(f"Qwen API调用失败: {e}")
+
+    async def agenerate_stream(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        on_usage: Optional[Callable[[Dict[str, int]], None]] = None,
+    ):
+        """流式生成回复（异步）"""
+        try:
+            logger.info(f"正在启动 Qwen 异步流式调用 (模型: {self.model})")
+
+            messages = []
+            if system_prompt:
+                messages.append({"role": "system", "content": system_prompt})
+            messages.append({"role": "user", "content": prompt})
+            log_prompt(logger, prompt, system_prompt)
+
+            stream = await self.async_client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                max_tokens=self.max_tokens,
+                temperature=self.temperature,
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+
+            full_content = []
+            async with stream:
+                try:
+                    async for chunk in stream:
+                        if getattr(chunk, "usage", None):
+                            self._log_usage(chunk.usage, on_usage)
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            c = chunk.choices[0].delta.content
+                            full_content.append(c)
+                            yield c
+                except GeneratorExit:
+                    self._estimate_usage(prompt, system_prompt, "".join(full_content), on_usage)
+                    raise
+
+            if full_content:
+                logger.info("Qwen API 流式响应完整内容 : %s", "".join(full_content))
 
         except Exception as e:
             logger.error(f"Qwen 流式调用失败: {e}")
             raise RuntimeError(f"Qwen 流式调用失败: {e}")
 
-    def generate_sql(self, question: str, schema: str, examples: str = "") -> str:
+    def generate_sql(
+        self,
+        question: str,
+        schema: str,
+        examples: str = "",
+        on_usage: Optional[Callable[[Dict[str, int]], None]] = None,
+    ) -> str:
         """将自然语言问题转换为SQL"""
-        from .prompts import get_text_to_sql_prompt
+        from .prompts import get_text_to_sql_system_prompt, get_text_to_sql_user_prompt
 
-        prompt = get_text_to_sql_prompt(question, schema, examples)
-        sql = self.generate(prompt)
+        # 不变的规则/示例放在系统消息最前面，问题放在最后的用户消息中，
+        # 使请求前缀在多次调用间保持一致，以命中 OpenAI 兼容接口的前缀缓存；
+        # schema 按问题裁剪时随问题变化，只有规则/示例部分能命中
+        sql = self.generate(
+            get_text_to_sql_user_prompt(question),
+            system_prompt=get_text_to_sql_system_prompt(schema, examples),
+            on_usage=on_usage,
+        )
 
-        # 清理SQL语句
-        sql = sql.strip()
-        if sql.startswith("```sql"):
-            sql = sql[6:]
-        if sql.startswith("```"):
-            sql = sql[3:]
-        if sql.endswith("```"):
-            sql = sql[:-3]
-        sql = sql.strip()
+        return clean_sql(sql)
 
-        return sql
+    async def agenerate_sql(
+        self,
+        question: str,
+        schema: str,
+        examples: str = "",
+        on_usage: Optional[Callable[[Dict[str, int]], None]] = None,
+    ) -> str:
+        """将自然语言问题转换为SQL（异步）"""
+        from .prompts import get_text_to_sql_system_prompt, get_text_to_sql_user_prompt
+
+        sql = await self.agenerate(
+            get_text_to_sql_user_prompt(question),
+            system_prompt=get_text_to_sql_system_prompt(schema, examples),
+            on_usage=on_usage,
+        )
 
-    def explain_results(self, question: str, sql: str, results: str) -> str:
+        return clean_sql(sql)
+
+    def generate_sql_stream(
+        self,
+        question: str,
+        schema: str,
+        examples: str = "",
+        on_usage: Optional[Callable[[Dict[str, int]], None]] = None,
+    ):
+        """流式生成SQL，逐段返回模型输出（未清理，由调用方检测语句结束）"""
+        from .prompts import get_text_to_sql_system_prompt, get_text_to_sql_user_prompt
+
+        return self.generate_stream(
+            get_text_to_sql_user_prompt(question),
+            system_prompt=get_text_to_sql_system_prompt(schema, examples),
+            on_usage=on_usage,
+        )
+
+    def agenerate_sql_stream(
+        self,
+        question: str,
+        schema: str,
+        examples: str = "",
+        on_usage: Optional[Callable[[Dict[str, int]], None]] = None,
+    ):
+        """流式生成SQL（异步）"""
+        from .prompts import get_text_to_sql_system_prompt, get_text_to_sql_user_prompt
+
+        return self.agenerate_stream(
+            get_text_to_sql_user_prompt(question),
+            system_prompt=get_text_to_sql_system_prompt(schema, examples),
+            on_usage=on_usage,
+        )
+
+    def explain_results(
+        self,
+        question: str,
+        sql: str,
+        results: str,
+        on_usage: Optional[Callable[[Dict[str, int]], None]] = None,
+    ) -> str:
         """解释查询结果"""
         from .prompts import get_result_explanation_prompt
 
         prompt = get_result_explanation_prompt(question, sql, results)
-        explanation = self.generate(prompt)
+        explanation = self.generate(prompt, on_usage=on_usage)
 
         return explanation
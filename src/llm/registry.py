@@ -0,0 +1,86 @@
+"""LLM 提供商注册表：按 LLM_PROVIDER 延迟导入对应的客户端模块"""
+
+from typing import Any, Callable, Dict, Optional
+
+# 提供商名称 -> 客户端构造函数；构造函数内才导入对应 SDK，
+# 进程只为实际使用的提供商付出导入开销（anthropic/openai 各需数百毫秒）
+_PROVIDERS: Dict[str, Callable[..., Any]] = {}
+
+
+def register_provider(name: str, builder: Callable[..., Any]):
+    """
+    注册提供商
+
+    Args:
+        name: 提供商名称（不区分大小写）
+        builder: 构造函数，参数为 api_key, model, base_url, max_tokens, temperature, options
+    """
+    _PROVIDERS[name.lower()] = builder
+
+
+def available_providers():
+    """已注册的提供商名称"""
+    return sorted(_PROVIDERS)
+
+
+def create_client(
+    provider: str,
+    api_key: Optional[str] = None,
+    model: Optional[str] = None,
+    base_url: Optional[str] = None,
+    max_tokens: int = 4096,
+    temperature: float = 0,
+    options: Optional[Dict[str, Any]] = None,
+    record_file: Optional[str] = None,
+):
+    """
+    创建LLM客户端
+
+    Args:
+        provider: 提供商名称（claude/anthropic、qwen、replay）
+        options: 提供商特有的客户端参数
+        record_file: 录制文件路径，非空时把真实模型的回复录制为回放格式（replay 提供商忽略）
+
+    Returns:
+        对应提供商的客户端实例
+    """
+    name = (provider or "").lower()
+    builder = _PROVIDERS.get(name)
+    if builder is None:
+        raise ValueError(f"不支持的LLM提供商: {provider}，可选: {', '.join(available_providers())}")
+    client = builder(api_key, model, base_url, max_tokens, temperature, options or {})
+    if record_file and name != "replay":
+        from .replay import RecordingClient
+
+        client = RecordingClient(client, record_file)
+    return client
+
+
+def _claude(api_key, model, base_url, max_tokens, temperature, options):
+    from .claude import ClaudeClient
+
+    return ClaudeClient(api_key=api_key, model=model, max_tokens=max_tokens, temperature=temperature)
+
+
+def _qwen(api_key, model, base_url, max_tokens, temperature, options):
+    from .qwen import QwenClient
+
+    return QwenClient(
+        api_key=api_key,
+        model=model,
+        base_url=base_url,
+        max_tokens=max_tokens,
+        temperature=temperature,
+    )
+
+
+def _replay(api_key, model, base_url, max_tokens, temperature, options):
+    from .replay import ReplayClient
+
+    return ReplayClient(model=model or "replay", **options)
+
+
+register_provider("claude", _claude)
+register_provider("anthropic", _claude)
+register_provider("qwen", _qwen)
+register_provider("replay", _replay)
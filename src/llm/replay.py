@@ -0,0 +1,499 @@
+"""LLM 录制与回放模块：录制真实模型的回复，离线重放并注入真实的响应时延"""
+
+from typing import Any, Optional, Dict, Callable, Iterable, List, Sequence, Tuple, Union
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+
+from ..utils.logger import log_prompt
+from .sql_stream import clean_sql
+
+logger = logging.getLogger(__name__)
+
+# 流式输出时每个片段大约包含的 token 数
+CHUNK_TOKENS = 4
+
+_QUESTION_RE = re.compile(r"用户问题: (.*?)\n\nSQL查询语句:\s*$", re.DOTALL)
+_EXPLAIN_QUESTION_RE = re.compile(r"用户问题: (.*?)\n\n执行的SQL:", re.DOTALL)
+_TABLES_RE = re.compile(r"^\s*- (?:所有表|与问题相关的表): (.*)$", re.MULTILINE)
+_WORD_RE = re.compile(r"[a-z]+|[^\x00-\x7f]")
+_COUNT_HINTS = ("多少", "几", "数量", "总数", "count", "how many", "number of")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算 token 数：ASCII 约 4 个字符一个 token，中文等非 ASCII 字符约一个字符一个 token
+
+    按 UTF-8 字节数与字符数之差推算非 ASCII 字符数，不逐字符遍历，大段 schema 提示词也很快。
+    """
+    if not text:
+        return 0
+    chars = len(text)
+    wide = min((len(text.encode("utf-8")) - chars) // 2, chars)
+    return wide + math.ceil((chars - wide) / 4)
+
+
+def _digest(text: Optional[str]) -> str:
+    return hashlib.sha1((text or "").encode("utf-8")).hexdigest()
+
+
+def _split_chunks(text: str) -> List[str]:
+    """按约 CHUNK_TOKENS 个 token 切分回复，模拟模型逐段输出"""
+    chunks, start, weight = [], 0, 0.0
+    for i, ch in enumerate(text):
+        weight += 0.25 if ord(ch) < 0x80 else 1
+        if weight >= CHUNK_TOKENS:
+            chunks.append(text[start:i + 1])
+            start, weight = i + 1, 0.0
+    if start < len(text):
+        chunks.append(text[start:])
+    return chunks
+
+
+class ReplayClient:
+    """
+    回放客户端（LLM_PROVIDER=replay）
+
+    与 ClaudeClient/QwenClient 接口一致，不访问网络，用于离线压测和演示。按以下顺序查找回复：
+    1. 录制的提示词 -> 回复（系统提示词与用户提示词都相同，其次仅用户提示词相同）
+    2. 按问题匹配 qa.log 中成功执行过的 SQL
+    3. 规则生成：从 schema 描述中选出与问题最相关的表，生成计数或预览查询（fallback 开启时）
+    回复按 ttft（首 token 延迟）和 tokens_per_sec（输出速度）注入时延，
+    token 用量按字符数估算并通过 on_usage 回调，重复出现的系统提示词计为缓存读取。
+    """
+
+    def __init__(
+        self,
+        cassettes: Iterable[str] = (),
+        fallback: bool = True,
+        ttft: float = 0.5,
+        tokens_per_sec: float = 50,
+        model: str = "replay",
+    ):
+        """
+        初始化回放客户端
+
+        Args:
+            cassettes: 录制文件路径（JSONL）。每行为 {"prompt", "response", "system"(可选)}
+                       的提示词记录，或 qa.log 的问答记录 {"question", "sql", "success"}
+            fallback: 未找到录制回复时是否使用规则生成，否则抛出异常
+            ttft: 首 token 延迟（秒）
+            tokens_per_sec: 输出速度（token/秒），<= 0 表示不限速
+            model: 模型名称，用于缓存命名空间和日志
+        """
+        self.model = model
+        self.fallback = fallback
+        self.ttft = max(ttft, 0)
+        self.tokens_per_sec = tokens_per_sec
+        self._by_prompt: Dict[Tuple[str, str], str] = {}
+        self._by_user_prompt: Dict[str, str] = {}
+        self._by_question: Dict[str, str] = {}
+        self._seen_systems = set()
+        self._lock = threading.Lock()
+        for path in cassettes:
+            self.load(path)
+
+    def load(self, path: str) -> int:
+        """
+        加载录制文件，返回加载的记录数
+
+        兼容旧版 qa.log（每行 "时间 - 问答记录: {...}"），从行内第一个 { 开始解析。
+        """
+        if not os.path.exists(path):
+            logger.warning(f"回放录制文件不存在: {path}")
+            return 0
+        from ..core.sql_cache import normalize_question  # 避免与 core 循环导入
+
+        loaded = 0
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                start = line.find("{")
+                if start < 0:
+                    continue
+                try:
+                    record = json.loads(line[start:])
+                except ValueError:
+                    continue
+                if not isinstance(record, dict):
+                    continue
+                if isinstance(record.get("prompt"), str) and isinstance(record.get("response"), str):
+                    self._by_prompt[(_digest(record.get("system")), record["prompt"])] = record["response"]
+                    self._by_user_prompt[record["prompt"]] = record["response"]
+                    loaded += 1
+                elif record.get("question") and record.get("sql") and record.get("success", True):
+                    # 同一问题以最新的记录为准
+                    self._by_question[normalize_question(record["question"])] = record["sql"]
+                    loaded += 1
+        logger.info(f"已加载回放记录 {loaded} 条: {path}")
+        return loaded
+
+    def _lookup(self, prompt: str, system_prompt: Optional[str]) -> str:
+        """查找回复：录制的提示词 -> 问答记录中的SQL -> 规则生成"""
+        response = self._by_prompt.get((_digest(system_prompt), prompt))
+        if response is None:
+            response = self._by_user_prompt.get(prompt)
+        if response is not None:
+            logger.info("回放命中录制的提示词")
+            return response
+
+        match = _QUESTION_RE.search(prompt)
+        if match:
+            from ..core.sql_cache import normalize_question
+
+            sql = self._by_question.get(normalize_question(match.group(1)))
+            if sql is not None:
+                logger.info("回放命中问答记录")
+                return sql
+
+        if not self.fallback:
+            raise RuntimeError("回放未找到匹配的录制记录")
+        logger.info("回放未命中录制记录，使用规则生成")
+        if match:
+            return self._rule_sql(match.group(1), system_prompt or prompt)
+        return self._rule_text(prompt)
+
+    @staticmethod
+    def _rule_sql(question: str, schema: str) -> str:
+        """确定性的规则SQL：选出表名与问题重合词最多的表（并列取靠前的表），计数或预览"""
+        match = _TABLES_RE.search(schema)
+        tables = [t.strip() for t in match.group(1).split(",") if t.strip()] if match else []
+        if not tables:
+            return "ERROR: 回放模式无法从schema中确定要查询的表"
+        question_lower = question.lower()
+        words = set(_WORD_RE.findall(question_lower))
+
+        def score(table: str) -> int:
+            parts = set(_WORD_RE.findall(table.lower()))
+            # 英文词允许单复数差异（order/orders）
+            parts |= {p.rstrip("s") for p in parts}
+            return len(parts & (words | {w.rstrip("s") for w in words}))
+
+        table = max(tables, key=score)
+        if any(hint in question_lower for hint in _COUNT_HINTS):
+            return f"SELECT COUNT(*) AS total FROM {table};"
+        return f"SELECT * FROM {table} LIMIT 10;"
+
+    @staticmethod
+    def _rule_text(prompt: str) -> str:
+        """确定性的结果解释"""
+        match = _EXPLAIN_QUESTION_RE.search(prompt)
+        if match:
+            return f"以上是“{match.group(1).strip()}”的查询结果（回放模式生成的说明）。"
+        return "回放模式没有该提示词的录制回复。"
+
+    def _usage(self, prompt: str, system_prompt: Optional[str], content: str) -> Dict[str, int]:
+        """估算 token 用量，重复出现的系统提示词按命中提示词缓存计"""
+        cache_read = cache_write = 0
+        if system_prompt:
+            key = _digest(system_prompt)
+            with self._lock:
+                cached = key in self._seen_systems
+                self._seen_systems.add(key)
+            if cached:
+                cache_read = estimate_tokens(system_prompt)
+            else:
+                cache_write = estimate_tokens(system_prompt)
+        return {
+            "input_tokens": estimate_tokens(prompt),
+            "output_tokens": estimate_tokens(content),
+            "cache_read_tokens": cache_read,
+            "cache_write_tokens": cache_write,
+        }
+
+    def _report(self, usage: Dict[str, int], on_usage: Optional[Callable[[Dict[str, int]], None]]):
+        logger.info(
+            f"Token用量(估算): 输入 {usage['input_tokens']}, 输出 {usage['output_tokens']}, "
+            f"缓存读取 {usage['cache_read_tokens']}, 缓存写入 {usage['cache_write_tokens']}"
+        )
+        if on_usage is not None:
+            on_usage(usage)
+
+    def _delays(self, chunks: List[str]) -> List[float]:
+        """每个片段输出前的等待秒数：首个片段等待 ttft，其后按输出速度"""
+        delays = []
+        for i, chunk in enumerate(chunks):
+            delay = estimate_tokens(chunk) / self.tokens_per_sec if self.tokens_per_sec > 0 else 0.0
+            delays.append(self.ttft if i == 0 else delay)
+        return delays
+
+    def _total_delay(self, content: str) -> float:
+        if self.tokens_per_sec <= 0:
+            return self.ttft
+        return self.ttft + estimate_tokens(content) / self.tokens_per_sec
+
+    def generate(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        on_usage: Optional[Callable[[Dict[str, int]], None]] = None,
+    ) -> str:
+        """生成回复"""
+        log_prompt(logger, prompt, system_prompt)
+        content = self._lookup(prompt, system_prompt)
+        time.sleep(self._total_delay(content))
+        logger.info("回放回复内容: %s", content)
+        self._report(self._usage(prompt, system_prompt, content), on_usage)
+        return content.strip()
+
+    def generate_stream(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        on_usage: Optional[Callable[[Dict[str, int]], None]] = None,
+    ):
+        """流式生成回复"""
+        log_prompt(logger, prompt, system_prompt)
+        content = self._lookup(prompt, system_prompt)
+        chunks = _split_chunks(content)
+        emitted = []
+        try:
+            for chunk, delay in zip(chunks, self._delays(chunks)):
+                time.sleep(delay)
+                emitted.append(chunk)
+                yield chunk
+        finally:
+            # 调用方提前关闭时也上报用量，输出只计已产出的部分
+            self._report(self._usage(prompt, system_prompt, "".join(emitted)), on_usage)
+
+    async def agenerate(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        on_usage: Optional[Callable[[Dict[str, int]], None]] = None,
+    ) -> str:
+        """生成回复（异步）"""
+        log_prompt(logger, prompt, system_prompt)
+        content = self._lookup(prompt, system_prompt)
+        await asyncio.sleep(self._total_delay(content))
+        logger.info("回放回复内容: %s", content)
+        self._report(self._usage(prompt, system_prompt, content), on_usage)
+        return content.strip()
+
+    async def agenerate_stream(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        on_usage: Optional[Callable[[Dict[str, int]], None]] = None,
+    ):
+        """流式生成回复（异步）"""
+        log_prompt(logger, prompt, system_prompt)
+        content = self._lookup(prompt, system_prompt)
+        chunks = _split_chunks(content)
+        emitted = []
+        try:
+            for chunk, delay in zip(chunks, self._delays(chunks)):
+                await asyncio.sleep(delay)
+                emitted.append(chunk)
+                yield chunk
+        finally:
+            # 调用方提前关闭时也上报用量，输出只计已产出的部分
+            self._report(self._usage(prompt, system_prompt, "".join(emitted)), on_usage)
+
+    def generate_sql(
+        self,
+        question: str,
+        schema: str,
+        examples: str = "",
+        on_usage: Optional[Callable[[Dict[str, int]], None]] = None,
+    ) -> str:
+        """将自然语言问题转换为SQL"""
+        from .prompts import get_text_to_sql_system_prompt, get_text_to_sql_user_prompt
+
+        sql = self.generate(
+            get_text_to_sql_user_prompt(question),
+            system_prompt=get_text_to_sql_system_prompt(schema, examples),
+            on_usage=on_usage,
+        )
+        return clean_sql(sql)
+
+    async def agenerate_sql(
+        self,
+        question: str,
+        schema: str,
+        examples: str = "",
+        on_usage: Optional[Callable[[Dict[str, int]], None]] = None,
+    ) -> str:
+        """将自然语言问题转换为SQL（异步）"""
+        from .prompts import get_text_to_sql_system_prompt, get_text_to_sql_user_prompt
+
+        sql = await self.agenerate(
+            get_text_to_sql_user_prompt(question),
+            system_prompt=get_text_to_sql_system_prompt(schema, examples),
+            on_usage=on_usage,
+        )
+        return clean_sql(sql)
+
+    def generate_sql_stream(
+        self,
+        question: str,
+        schema: str,
+        examples: str = "",
+        on_usage: Optional[Callable[[Dict[str, int]], None]] = None,
+    ):
+        """流式生成SQL"""
+        from .prompts import get_text_to_sql_system_prompt, get_text_to_sql_user_prompt
+
+        return self.generate_stream(
+            get_text_to_sql_user_prompt(question),
+            system_prompt=get_text_to_sql_system_prompt(schema, examples),
+            on_usage=on_usage,
+        )
+
+    def agenerate_sql_stream(
+        self,
+        question: str,
+        schema: str,
+        examples: str = "",
+        on_usage: Optional[Callable[[Dict[str, int]], None]] = None,
+    ):
+        """流式生成SQL（异步）"""
+        from .prompts import get_text_to_sql_system_prompt, get_text_to_sql_user_prompt
+
+        return self.agenerate_stream(
+            get_text_to_sql_user_prompt(question),
+            system_prompt=get_text_to_sql_system_prompt(schema, examples),
+            on_usage=on_usage,
+        )
+
+    def explain_results(
+        self,
+        question: str,
+        sql: str,
+        results: str,
+        on_usage: Optional[Callable[[Dict[str, int]], None]] = None,
+    ) -> str:
+        """解释查询结果"""
+        from .prompts import get_result_explanation_prompt
+
+        prompt = get_result_explanation_prompt(question, sql, results)
+        return self.generate(prompt, on_usage=on_usage)
+
+
+class RecordingClient:
+    """
+    录制客户端（LLM_RECORD_FILE）
+
+    包装 ClaudeClient/QwenClient，调用照常转发给真实的模型服务，同时把每次调用的
+    系统提示词、用户提示词和完整回复追加到录制文件（JSONL），即 ReplayClient 加载的
+    {"system", "prompt", "response"} 格式。SQL 生成按 ReplayClient 构造的同一组提示词记录，
+    回放时可按系统提示词和用户提示词精确命中；流式调用被调用方提前关闭时（如已检测到完整SQL）
+    记录已收到的部分，调用出错时不记录。其他属性（如 model）透传给被包装的客户端。
+    """
+
+    def __init__(self, client: Any, path: str):
+        """
+        Args:
+            client: 被包装的真实提供商客户端
+            path: 录制文件路径，追加写入
+        """
+        self.client = client
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        logger.info(f"录制模型回复到: {path}")
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def _record(self, prompt: str, system_prompt: Optional[Union[str, Sequence[str]]], response: str):
+        if not response:
+            return
+        if system_prompt is not None and not isinstance(system_prompt, str):
+            # ClaudeClient 的多段系统提示词，按 get_text_to_sql_system_prompt 的方式拼接
+            system_prompt = "\n\n".join(part for part in system_prompt if part)
+        record = {"system": system_prompt or None, "prompt": prompt, "response": response}
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+    def _record_stream(self, prompt: str, system_prompt, stream):
+        parts = []
+        try:
+            for chunk in stream:
+                parts.append(chunk)
+                yield chunk
+        except GeneratorExit:
+            self._record(prompt, system_prompt, "".join(parts))
+            raise
+        finally:
+            stream.close()
+        self._record(prompt, system_prompt, "".join(parts))
+
+    async def _arecord_stream(self, prompt: str, system_prompt, stream):
+        parts = []
+        try:
+            async for chunk in stream:
+                parts.append(chunk)
+                yield chunk
+        except GeneratorExit:
+            self._record(prompt, system_prompt, "".join(parts))
+            raise
+        finally:
+            await stream.aclose()
+        self._record(prompt, system_prompt, "".join(parts))
+
+    def generate(self, prompt: str, system_prompt=None, **kwargs) -> str:
+        """生成回复并录制"""
+        content = self.client.generate(prompt, system_prompt=system_prompt, **kwargs)
+        self._record(prompt, system_prompt, content)
+        return content
+
+    async def agenerate(self, prompt: str, system_prompt=None, **kwargs) -> str:
+        """生成回复并录制（异步）"""
+        content = await self.client.agenerate(prompt, system_prompt=system_prompt, **kwargs)
+        self._record(prompt, system_prompt, content)
+        return content
+
+    def generate_stream(self, prompt: str, system_prompt=None, **kwargs):
+        """流式生成回复并录制"""
+        stream = self.client.generate_stream(prompt, system_prompt=system_prompt, **kwargs)
+        return self._record_stream(prompt, system_prompt, stream)
+
+    def agenerate_stream(self, prompt: str, system_prompt=None, **kwargs):
+        """流式生成回复并录制（异步）"""
+        stream = self.client.agenerate_stream(prompt, system_prompt=system_prompt, **kwargs)
+        return self._arecord_stream(prompt, system_prompt, stream)
+
+    @staticmethod
+    def _sql_prompts(question: str, schema: str, examples: str) -> Tuple[str, str]:
+        from .prompts import get_text_to_sql_system_prompt, get_text_to_sql_user_prompt
+
+        return get_text_to_sql_user_prompt(question), get_text_to_sql_system_prompt(schema, examples)
+
+    def generate_sql(self, question: str, schema: str, examples: str = "", **kwargs) -> str:
+        """将自然语言问题转换为SQL并录制"""
+        sql = self.client.generate_sql(question, schema, examples, **kwargs)
+        self._record(*self._sql_prompts(question, schema, examples), sql)
+        return sql
+
+    async def agenerate_sql(self, question: str, schema: str, examples: str = "", **kwargs) -> str:
+        """将自然语言问题转换为SQL并录制（异步）"""
+        sql = await self.client.agenerate_sql(question, schema, examples, **kwargs)
+        self._record(*self._sql_prompts(question, schema, examples), sql)
+        return sql
+
+    def generate_sql_stream(self, question: str, schema: str, examples: str = "", **kwargs):
+        """流式生成SQL并录制"""
+        stream = self.client.generate_sql_stream(question, schema, examples, **kwargs)
+        return self._record_stream(*self._sql_prompts(question, schema, examples), stream)
+
+    def agenerate_sql_stream(self, question: str, schema: str, examples: str = "", **kwargs):
+        """流式生成SQL并录制（异步）"""
+        stream = self.client.agenerate_sql_stream(question, schema, examples, **kwargs)
+        return self._arecord_stream(*self._sql_prompts(question, schema, examples), stream)
+
+    def explain_results(self, question: str, sql: str, results: str, **kwargs) -> str:
+        """解释查询结果并录制"""
+        from .prompts import get_result_explanation_prompt
+
+        explanation = self.client.explain_results(question, sql, results, **kwargs)
+        self._record(get_result_explanation_prompt(question, sql, results), None, explanation)
+        return explanation
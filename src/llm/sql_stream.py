@@ -0,0 +1,120 @@
+"""模型输出的SQL处理：流式收集与清理"""
+
+
+class SQLStreamCollector:
+    """
+    收集流式返回的SQL片段，并检测一条完整语句何时结束
+
+    在引号和注释之外遇到分号，或 markdown 代码块闭合时，即认为语句已完整，
+    调用方可以立即停止读取模型输出并开始校验、执行，
+    不必等待模型之后可能输出的解释文字。
+    MySQL/MariaDB 方言下，字符串中的反斜杠是转义符，# 开始单行注释。
+    """
+
+    def __init__(self, dialect: str = ""):
+        """
+        Args:
+            dialect: 数据库方言名称（SQLAlchemy 的 dialect.name）
+        """
+        self._mysql = dialect in ("mysql", "mariadb")
+        self._text = ""
+        self._pos = 0
+        self._quote = None          # 当前所在的引号字符
+        self._line_comment = False
+        self._block_comment = False
+        self.complete = False
+
+    def feed(self, chunk: str) -> bool:
+        """
+        追加一个片段
+
+        Returns:
+            是否已检测到完整语句
+        """
+        if self.complete:
+            return True
+        self._text += chunk
+        self._scan()
+        return self.complete
+
+    def _scan(self):
+        text = self._text
+        # 代码块内的SQL：检测到闭合的 ``` 即结束
+        stripped = text.lstrip()
+        if stripped.startswith("```"):
+            body_start = text.index("```") + 3
+            close = text.find("```", body_start)
+            if close != -1:
+                self._text = text[:close + 3]
+                self.complete = True
+                return
+
+        i = self._pos
+        while i < len(text):
+            ch = text[i]
+            nxt = text[i + 1] if i + 1 < len(text) else ""
+            if self._line_comment:
+                if ch == "\n":
+                    self._line_comment = False
+            elif self._block_comment:
+                if ch == "*" and nxt == "/":
+                    self._block_comment = False
+                    i += 1
+                elif ch == "*" and not nxt:
+                    # 可能是被切开的 "*/"，等待下一个片段
+                    break
+            elif self._quote:
+                if ch == "\\" and self._mysql and self._quote != "`":
+                    if not nxt:
+                        # 转义的字符在下一个片段中
+                        break
+                    i += 1
+                elif ch == self._quote:
+                    self._quote = None
+            elif ch == "`" and "```".startswith(text[i:i + 3]):
+                # 代码块标记 ```（或被切开的一部分），不是标识符引号
+                if not text.startswith("```", i):
+                    break
+                i += 3
+                continue
+            elif ch in ("'", '"', "`"):
+                self._quote = ch
+            elif ch in ("-", "/") and not nxt:
+                # 可能是被切开的 "--" 或 "/*"，等待下一个片段
+                break
+            elif ch == "#" and self._mysql:
+                self._line_comment = True
+            elif ch == "-" and nxt == "-":
+                self._line_comment = True
+                i += 1
+            elif ch == "/" and nxt == "*":
+                self._block_comment = True
+                i += 1
+            elif ch == ";":
+                self._text = text[:i + 1]
+                self.complete = True
+                return
+            i += 1
+        self._pos = i
+
+    @property
+    def text(self) -> str:
+        """已收到的原始文本（检测到完整语句后截断到语句结尾）"""
+        return self._text
+
+    @property
+    def sql(self) -> str:
+        """去掉 markdown 代码块标记后的SQL"""
+        return clean_sql(self._text)
+
+
+def clean_sql(sql: str) -> str:
+    """清理模型返回的SQL语句，移除可能的markdown代码块标记"""
+    sql = sql.strip()
+    if sql.startswith("```sql"):
+        sql = sql[6:]
+    if sql.startswith("```"):
+        sql = sql[3:]
+    if sql.endswith("```"):
+        sql = sql[:-3]
+    return sql.strip()
@@ -1,6 +1,12 @@
 """SQL处理模块"""
 
 from .validator import SQLValidator
+from .parser import ParsedSQL, parse_sql
 from .executor import SQLExecutor
+from .result_cache import ResultCache
+from .cost_guard import CostGuard
+from .result_set import ResultSet
+from .summary import ResultSummarizer, summarize_result, format_summary
 
-__all__ = ["SQLValidator", "SQLExecutor"]
+__all__ = ["SQLValidator", "ParsedSQL", "parse_sql", "SQLExecutor", "ResultCache", "CostGuard", "ResultSet",
+           "ResultSummarizer", "summarize_result", "format_summary"]
@@ -0,0 +1,167 @@
+"""执行前代价预检模块"""
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from typing import Dict, Any, Optional, Tuple
+import json
+import math
+import re
+import time
+import logging
+
+from .parser import ParsedSQL
+
+logger = logging.getLogger(__name__)
+
+COST_GUARD_MODES = ("off", "warn", "reject")
+
+# SQLite 查询计划中的全表扫描：SCAN t / SCAN TABLE t [AS a] / SCAN t USING COVERING INDEX ...
+_SQLITE_SCAN_RE = re.compile(r"^SCAN (?:TABLE )?(\S+)(?: AS (\S+))?", re.IGNORECASE)
+
+
+class CostGuard:
+    """
+    执行前代价预检
+
+    在执行前运行方言对应的 EXPLAIN，解析优化器估算的行数/代价，
+    超过阈值时告警或拒绝执行，让失控的分析查询在毫秒级被拦下：
+    - PostgreSQL: EXPLAIN (FORMAT JSON)，代价取根节点 Total Cost，行数取根节点 Plan Rows（即返回行数）
+    - MySQL/MariaDB: EXPLAIN FORMAT=JSON，代价取 query_cost，行数取各表扫描行数之积（嵌套循环）
+    - SQLite: EXPLAIN QUERY PLAN 不提供估算，行数取全表扫描（SCAN）各表行数之积，不给出代价
+    其他方言不做预检。
+    """
+
+    def __init__(self, mode: str = "warn", max_rows: float = 0, max_cost: float = 0):
+        """
+        初始化代价预检
+
+        Args:
+            mode: warn 仅告警，reject 拒绝执行，off 不预检
+            max_rows: 估算行数阈值，<= 0 表示不检查
+            max_cost: 估算代价阈值（优化器代价单位，仅 PostgreSQL/MySQL），<= 0 表示不检查
+        """
+        if mode not in COST_GUARD_MODES:
+            raise ValueError(f"不支持的预检模式: {mode}，可选: {', '.join(COST_GUARD_MODES)}")
+        self.mode = mode
+        self.max_rows = max_rows
+        self.max_cost = max_cost
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off" and (self.max_rows > 0 or self.max_cost > 0)
+
+    def check(self, conn: Connection, sql: str, parsed: ParsedSQL) -> Optional[Dict[str, Any]]:
+        """
+        对即将执行的SQL做预检
+
+        Args:
+            conn: 执行预检的连接（与实际查询相同的库）
+            sql: 实际执行的SQL（已下推行数上限）
+            parsed: 该SQL的解析结果，用于将计划中的别名映射回表名
+
+        Returns:
+            预检结论 {action: pass/warn/reject, estimated_rows, estimated_cost, reason, elapsed_ms}，
+            未启用、方言不支持或 EXPLAIN 失败时返回 None
+        """
+        if not self.enabled:
+            return None
+        estimate = {
+            "postgresql": self._estimate_postgresql,
+            "mysql": self._estimate_mysql,
+            "mariadb": self._estimate_mysql,
+            "sqlite": self._estimate_sqlite,
+        }.get(conn.dialect.name)
+        if estimate is None:
+            return None
+
+        start = time.perf_counter()
+        try:
+            rows, cost = estimate(conn, sql, parsed)
+        except Exception as e:
+            # 预检失败不影响执行，真正的语法错误会在执行时报告
+            logger.warning(f"EXPLAIN 预检失败: {e}")
+            return None
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 2)
+
+        reasons = []
+        if self.max_rows > 0 and rows is not None and rows > self.max_rows:
+            reasons.append(f"预估行数 {rows:,.0f} 超过上限 {self.max_rows:,.0f}")
+        if self.max_cost > 0 and cost is not None and cost > self.max_cost:
+            reasons.append(f"预估代价 {cost:,.0f} 超过上限 {self.max_cost:,.0f}")
+        action = self.mode if reasons else "pass"
+        verdict = {
+            "action": action,
+            "estimated_rows": rows,
+            "estimated_cost": cost,
+            "reason": "；".join(reasons) or None,
+            "elapsed_ms": elapsed_ms,
+        }
+        if reasons:
+            logger.warning(f"查询预检{'拒绝' if action == 'reject' else '告警'}: {verdict['reason']}")
+        return verdict
+
+    @staticmethod
+    def _estimate_postgresql(conn: Connection, sql: str, parsed: ParsedSQL) -> Tuple[Optional[float], Optional[float]]:
+        plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        # 只看根节点：各节点 Plan Rows 的最大值会把 COUNT(*) 等聚合下层的全表扫描也算进来，
+        # 而扫描本身的开销已经体现在根节点的 Total Cost 中
+        root = plan[0]["Plan"]
+        return float(root.get("Plan Rows", 0)), float(root.get("Total Cost", 0))
+
+    @staticmethod
+    def _estimate_mysql(conn: Connection, sql: str, parsed: ParsedSQL) -> Tuple[Optional[float], Optional[float]]:
+        plan = json.loads(conn.execute(text(f"EXPLAIN FORMAT=JSON {sql}")).scalar())
+        cost = None
+        scanned = []
+        stack = [plan]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, dict):
+                for key, value in node.items():
+                    if key == "query_cost" and cost is None:
+                        cost = float(value)
+                    elif key in ("rows_examined_per_scan", "rows") and isinstance(value, (int, float)):
+                        scanned.append(float(value))
+                    else:
+                        stack.append(value)
+            elif isinstance(node, list):
+                stack.extend(node)
+        return (math.prod(scanned) if scanned else None), cost
+
+    @staticmethod
+    def _estimate_sqlite(conn: Connection, sql: str, parsed: ParsedSQL) -> Tuple[Optional[float], Optional[float]]:
+        plan = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")).fetchall()
+        scans = []
+        for row in plan:
+            match = _SQLITE_SCAN_RE.match(row[-1])
+            if match:
+                name = (match.group(2) or match.group(1)).strip('"`[]').lower()
+                scans.append(parsed.aliases.get(name, name))
+        if not scans:
+            # 只有索引查找（SEARCH），代价可忽略
+            return 0.0, None
+
+        stats = {}
+        try:
+            # stat 的第一个数即表的行数
+            for table, stat in conn.execute(text("SELECT tbl, stat FROM sqlite_stat1")):
+                stats.setdefault(table.lower(), int(stat.split()[0]))
+        except Exception:
+            # 未执行过 ANALYZE 时没有 sqlite_stat1
+            pass
+
+        rows = 1.0
+        for table in scans:
+            count = stats.get(table.split(".")[-1])
+            if count is None:
+                # rowid 表的 MAX(rowid) 走 B 树末端，开销与表大小无关；
+                # 子查询、CTE 和 WITHOUT ROWID 表无法估算，按 1 计
+                quoted = ".".join(f'"{part}"' for part in table.split("."))
+                try:
+                    count = conn.execute(text(f"SELECT MAX(rowid) FROM {quoted}")).scalar()
+                except Exception:
+                    count = None
+            rows *= max(count or 1, 1)
+        return rows, None
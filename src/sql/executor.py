@@ -1,65 +1,445 @@
 """SQL执行模块"""
 
-from sqlalchemy import text
+from sqlalchemy import text, bindparam
 from sqlalchemy.engine import Engine
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Callable, Optional, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import asyncio
+import threading
+import time
 import logging
 
+from ..database.router import ReplicaRouter
+from .result_cache import ResultCache
+from .result_set import ResultSet
+from .parser import parse_sql
+from .cost_guard import CostGuard
+
 logger = logging.getLogger(__name__)
 
+# 低开销的表变更探测查询，返回 (表名, 版本...)；版本变化说明表数据可能变化
+TABLE_PROBE_QUERIES = {
+    "mysql": (
+        "SELECT table_name, update_time, table_rows FROM information_schema.tables "
+        "WHERE table_schema = DATABASE() AND table_name IN :names"
+    ),
+    "postgresql": (
+        "SELECT relname, n_tup_ins + n_tup_upd + n_tup_del, n_live_tup "
+        "FROM pg_stat_user_tables WHERE relname IN :names"
+    ),
+}
+TABLE_PROBE_QUERIES["mariadb"] = TABLE_PROBE_QUERIES["mysql"]
+
+# SQLite 进度回调的触发间隔（虚拟机指令数）
+SQLITE_PROGRESS_STEPS = 1000
+
+
+class QueryHandle:
+    """
+    正在执行的查询的取消句柄
+
+    由异步调用方持有，客户端断开时调用 cancel()，
+    执行线程中的查询会被数据库中断，从而尽快释放连接和工作线程。
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self._cancel_fn: Optional[Callable[[], None]] = None
+        self._lock = threading.Lock()
+
+    def bind(self, cancel_fn: Callable[[], None]):
+        """绑定当前连接的取消方式（在执行线程中调用）"""
+        with self._lock:
+            self._cancel_fn = cancel_fn
+            cancelled = self.cancelled
+        if cancelled:
+            cancel_fn()
+
+    def unbind(self):
+        with self._lock:
+            self._cancel_fn = None
+
+    def cancel(self):
+        """取消查询（可在任意线程调用）"""
+        with self._lock:
+            self.cancelled = True
+            cancel_fn = self._cancel_fn
+        if cancel_fn is not None:
+            try:
+                cancel_fn()
+            except Exception as e:
+                logger.warning(f"取消查询失败: {e}")
+
 
 class SQLExecutor:
     """SQL执行器"""
 
-    def __init__(self, engine: Engine, max_results: int = 1000):
+    def __init__(
+        self,
+        engine: Engine,
+        max_results: int = 1000,
+        max_workers: int = 8,
+        result_cache: Optional[ResultCache] = None,
+        probe_tables: bool = True,
+        router: Optional[ReplicaRouter] = None,
+        statement_timeout: float = 0,
+        limit_pushdown: bool = True,
+        cost_guard: Optional[CostGuard] = None,
+    ):
         """
         初始化SQL执行器
 
         Args:
             engine: SQLAlchemy数据库引擎
             max_results: 最大返回结果数
+            max_workers: 异步调用时用于执行阻塞数据库操作的线程池大小
+            result_cache: 查询结果缓存，为空时不缓存
+            probe_tables: 命中缓存时是否探测所读表的变更（否则仅依赖TTL）
+            router: 只读副本路由，查询走副本；表变更探测始终查询主库，
+                    以免各副本的统计信息不一致（PostgreSQL 的 pg_stat 不随复制同步）
+            statement_timeout: 单条查询的超时秒数，<= 0 表示不限制
+            limit_pushdown: 是否将 max_results + 1 的行数上限改写进最外层查询，
+                            让数据库提前停止扫描（多取的一行用于判断结果是否被截断）
+            cost_guard: 执行前的 EXPLAIN 代价预检，为空时不预检
         """
         self.engine = engine
+        self.router = router
+        self.statement_timeout = statement_timeout
+        self.limit_pushdown = limit_pushdown
+        self.cost_guard = cost_guard
         self.max_results = max_results
+        self.result_cache = result_cache
+        self.probe_tables = probe_tables
+        # 同步驱动（pymysql/psycopg2/sqlite3）没有异步支持，统一放到有界线程池中执行，
+        # 避免阻塞事件循环，同时限制并发占用的数据库连接数
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="sql-executor"
+        )
 
-    def execute(self, sql: str) -> Tuple[List[Dict[str, Any]], List[str]]:
+    def execute(self, sql: str, handle: Optional[QueryHandle] = None) -> ResultSet:
         """
         执行SQL查询
 
         Args:
             sql: SQL查询语句
+            handle: 取消句柄，为空时不可取消
 
         Returns:
-            (查询结果列表, 列名列表)
+            列式存储的查询结果
         """
+        probe = self.probe_table_versions if self.probe_tables else None
+        if self.result_cache is not None:
+            cached = self.result_cache.get(sql, probe)
+            if cached is not None:
+                logger.info(f"结果缓存命中: {sql}")
+                return cached
+            # 与校验器共享解析缓存，不会重新解析
+            tables = parse_sql(sql, self.engine.dialect.name).tables
+            # 在执行前记录表版本，执行期间发生的变更会在下次读取时被发现
+            versions = probe(tables) if probe else None
+
         try:
             logger.info(f"执行SQL: {sql}")
 
-            with self.engine.connect() as conn:
-                result = conn.execute(text(sql))
+            with self._query_connection(handle) as conn:
+                result = conn.execute(text(self._statement_sql(sql)))
                 columns = list(result.keys())
-                rows = result.fetchmany(self.max_results)
+                rows = result.fetchmany(self.max_results + 1)
+                truncated = len(rows) > self.max_results
+
+                # 按列存储，不再为每行构造字典
+                data = ResultSet.from_rows(columns, rows[:self.max_results], truncated)
+
+                logger.info(f"查询成功，返回 {len(data)} 行{'（已截断）' if truncated else ''}")
+
+            if self.result_cache is not None:
+                self.result_cache.put(sql, data, tables, versions)
+            return data
+
+        except Exception as e:
+            if handle is not None and handle.cancelled:
+                logger.info(f"查询已取消: {sql}")
+                raise RuntimeError("查询已取消")
+            logger.error(f"SQL执行失败: {e}")
+            raise RuntimeError(f"SQL执行失败: {e}")
+
+    def preflight(self, sql: str, skip_cached: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        执行前的代价预检（在实际执行查询的库上 EXPLAIN 下推行数上限后的SQL）
+
+        Args:
+            sql: SQL查询语句
+            skip_cached: 结果缓存中已有该SQL时跳过预检（随后的 execute 会直接命中，
+                无需为 EXPLAIN 多一次数据库往返）；不经过结果缓存的分批执行应传 False
+
+        Returns:
+            预检结论，未配置预检、方言不支持、预检失败或命中结果缓存时返回 None
+        """
+        if self.cost_guard is None or not self.cost_guard.enabled:
+            return None
+        if skip_cached and self.result_cache is not None and self.result_cache.contains(sql):
+            logger.debug(f"结果缓存已有该查询，跳过预检: {sql}")
+            return None
+        with self._query_connection() as conn:
+            return self.cost_guard.check(
+                conn, self.apply_limit(sql), parse_sql(sql, self.engine.dialect.name)
+            )
+
+    def _statement_sql(self, sql: str) -> str:
+        """
+        实际执行的SQL：下推行数上限，MySQL/MariaDB 再附加仅作用于本条语句的超时
+
+        MySQL 使用 /*+ MAX_EXECUTION_TIME(ms) */ 优化器提示，MariaDB 使用
+        SET STATEMENT max_statement_time = s FOR ...，都不需要额外往返，
+        也不会像会话变量那样遗留在归还连接池的连接上。
+        """
+        sql = self.apply_limit(sql)
+        if self.statement_timeout <= 0:
+            return sql
+        dialect = self.engine.dialect.name
+        if dialect == "mysql":
+            return parse_sql(sql, dialect).hint(
+                f"MAX_EXECUTION_TIME({int(self.statement_timeout * 1000)})"
+            )
+        if dialect == "mariadb":
+            return f"SET STATEMENT max_statement_time = {self.statement_timeout} FOR {sql}"
+        return sql
+
+    def apply_limit(self, sql: str) -> str:
+        """将 max_results + 1 的行数上限下推到SQL中（按当前数据库方言）"""
+        if not self.limit_pushdown:
+            return sql
+        limited = parse_sql(sql, self.engine.dialect.name).limit(self.max_results + 1)
+        if limited != sql:
+            logger.debug(f"下推行数上限后的SQL: {limited}")
+        return limited
+
+    def _read_connection(self):
+        """获取执行只读查询的连接（配置了副本时按路由策略选择）"""
+        return self.router.connect() if self.router else self.engine.connect()
+
+    @contextmanager
+    def _query_connection(self, handle: Optional[QueryHandle] = None):
+        """
+        获取只读查询连接，并按方言设置语句超时、绑定取消方式
 
-                # 转换为字典列表
-                data = [dict(zip(columns, row)) for row in rows]
+        - MySQL/MariaDB: 语句级超时写在SQL中（见 _statement_sql），这里不设置会话变量
+        - PostgreSQL: SET LOCAL statement_timeout，仅作用于当前事务，连接归还时随回滚失效
+        - SQLite: 进度回调检查截止时间和取消标记
+        取消时 SQLite 调用 interrupt()，PostgreSQL 调用驱动的 cancel()，
+        MySQL 通过新连接执行 KILL QUERY，连接ID在每个 DBAPI 连接上只查询一次，缓存在 conn.info 中。
+        """
+        with self._read_connection() as conn:
+            dialect = conn.dialect.name
+            dbapi_conn = conn.connection.dbapi_connection
+            timeout_ms = int(self.statement_timeout * 1000)
+            sqlite_progress = False
+            try:
+                if dialect == "sqlite":
+                    if timeout_ms > 0 or handle is not None:
+                        deadline = (
+                            time.monotonic() + self.statement_timeout if timeout_ms > 0 else None
+                        )
+
+                        def progress():
+                            if handle is not None and handle.cancelled:
+                                return 1
+                            return 1 if deadline is not None and time.monotonic() > deadline else 0
+
+                        dbapi_conn.set_progress_handler(progress, SQLITE_PROGRESS_STEPS)
+                        sqlite_progress = True
+                    if handle is not None:
+                        handle.bind(dbapi_conn.interrupt)
+                elif dialect == "postgresql":
+                    if timeout_ms > 0:
+                        conn.execute(text(f"SET LOCAL statement_timeout = {timeout_ms}"))
+                    if handle is not None and hasattr(dbapi_conn, "cancel"):
+                        handle.bind(dbapi_conn.cancel)
+                elif dialect in ("mysql", "mariadb"):
+                    if handle is not None:
+                        # conn.info 随底层 DBAPI 连接存活，连接池复用时不再查询
+                        thread_id = conn.info.get("mysql_thread_id")
+                        if thread_id is None:
+                            thread_id = conn.execute(text("SELECT CONNECTION_ID()")).scalar()
+                            conn.info["mysql_thread_id"] = thread_id
+                        handle.bind(lambda: self._kill_mysql_query(conn.engine, thread_id))
+                yield conn
+            finally:
+                if handle is not None:
+                    handle.unbind()
+                if sqlite_progress:
+                    dbapi_conn.set_progress_handler(None, SQLITE_PROGRESS_STEPS)
+
+    @staticmethod
+    def _kill_mysql_query(engine: Engine, thread_id: int):
+        """通过另一个连接终止 MySQL 上正在执行的查询（不断开原连接）"""
+        with engine.connect() as conn:
+            conn.execute(text(f"KILL QUERY {int(thread_id)}"))
+        logger.info(f"已终止 MySQL 查询 (连接 {thread_id})")
+
+    def iter_chunks(
+        self, sql: str, chunk_size: int = 500, handle: Optional[QueryHandle] = None
+    ) -> Iterator[ResultSet]:
+        """
+        以服务端游标流式执行SQL查询，按固定大小分批返回结果
 
-                logger.info(f"查询成功，返回 {len(data)} 行")
-                return data, columns
+        使用 stream_results 和 partitions(chunk_size)，内存占用只与批大小有关，
+        与结果宽度和 max_results 无关。除最后一批外每批恰好 chunk_size 行；
+        无数据时返回一次空批次以便获取列名；结果被 max_results 截断时，
+        最后一个批次的 truncated 为 True。
+
+        Args:
+            sql: SQL查询语句
+            chunk_size: 每批行数
+            handle: 取消句柄，为空时不可取消
+
+        Yields:
+            本批结果（列式存储）
+        """
+        try:
+            logger.info(f"流式执行SQL: {sql}")
+
+            with self._query_connection(handle) as conn:
+                result = conn.execution_options(stream_results=True).execute(
+                    text(self._statement_sql(sql))
+                )
+                columns = list(result.keys())
+                remaining = self.max_results
+                total = 0
+                truncated = False
+                # 取满 max_results 行的那一批暂不发送，读到下一批才能知道是否被截断
+                last = None
+                # 必须显式传入批大小：text() 查询上 yield_per 执行选项不生效，
+                # 无参数的 partitions() 会逐行返回
+                for partition in result.partitions(chunk_size):
+                    if remaining <= 0:
+                        truncated = True
+                        break
+                    rows = partition[:remaining]
+                    remaining -= len(rows)
+                    total += len(rows)
+                    if len(rows) < len(partition):
+                        truncated = True
+                        last = rows
+                        break
+                    if remaining > 0:
+                        yield ResultSet.from_rows(columns, rows)
+                    else:
+                        last = rows
+                if last is not None or total == 0:
+                    yield ResultSet.from_rows(columns, last or [], truncated)
+                logger.info(f"流式查询完成，返回 {total} 行")
 
         except Exception as e:
+            if handle is not None and handle.cancelled:
+                logger.info(f"查询已取消: {sql}")
+                raise RuntimeError("查询已取消")
             logger.error(f"SQL执行失败: {e}")
             raise RuntimeError(f"SQL执行失败: {e}")
 
+    async def aiter_chunks(self, sql: str, chunk_size: int = 500):
+        """
+        流式执行SQL查询（异步），每批的读取放在有界线程池中完成
+
+        调用方被取消（如客户端断开）时中断数据库上正在执行的查询。
+        """
+        done = object()
+        handle = QueryHandle()
+        chunks = self.iter_chunks(sql, chunk_size, handle)
+        try:
+            while True:
+                item = await self.arun(next, chunks, done)
+                if item is done:
+                    break
+                yield item
+        except asyncio.CancelledError:
+            # 线程中的 next() 可能仍在执行，中断查询后由其自行结束并释放连接
+            handle.cancel()
+            raise
+        finally:
+            if not handle.cancelled:
+                await self.arun(chunks.close)
+
+    def probe_table_versions(self, tables: List[str]) -> Optional[Dict[str, Any]]:
+        """
+        探测表的当前版本，用于判断结果缓存是否失效
+
+        MySQL 使用 information_schema.tables 的 update_time/table_rows，
+        PostgreSQL 使用 pg_stat_user_tables 的增删改计数，
+        SQLite 使用 COUNT(*) 与 MAX(rowid)（无法发现原地更新，需配合TTL）。
+
+        Returns:
+            {表名: 版本}，无法探测时返回 None
+        """
+        if not tables:
+            return None
+        names = sorted({t.split(".")[-1] for t in tables})
+        dialect = self.engine.dialect.name
+        try:
+            with self.engine.connect() as conn:
+                if dialect == "sqlite":
+                    versions = {}
+                    quote = self.engine.dialect.identifier_preparer.quote
+                    for name in names:
+                        row = conn.execute(
+                            text(f"SELECT COUNT(*), MAX(rowid) FROM {quote(name)}")
+                        ).fetchone()
+                        versions[name] = tuple(row)
+                    return versions
+
+                query = TABLE_PROBE_QUERIES.get(dialect)
+                if query is None:
+                    return None
+                stmt = text(query).bindparams(bindparam("names", expanding=True))
+                versions = {
+                    row[0].lower(): tuple(row[1:])
+                    for row in conn.execute(stmt, {"names": names})
+                }
+        except Exception as e:
+            logger.debug(f"表变更探测失败: {e}")
+            return None
+
+        # 有表未被探测到（如系统表）或 MySQL 未记录更新时间时视为不支持
+        if set(versions) != set(names) or any(v[0] is None for v in versions.values()):
+            return None
+        return versions
+
+    async def arun(self, func: Callable, *args) -> Any:
+        """在有界线程池中运行阻塞的数据库调用"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, func, *args)
+
+    async def aexecute(self, sql: str) -> ResultSet:
+        """执行SQL查询（异步），调用方被取消时中断数据库上正在执行的查询"""
+        handle = QueryHandle()
+        try:
+            return await self.arun(self.execute, sql, handle)
+        except asyncio.CancelledError:
+            handle.cancel()
+            raise
+
+    async def apreflight(self, sql: str, skip_cached: bool = True) -> Optional[Dict[str, Any]]:
+        """执行前的代价预检（异步）"""
+        return await self.arun(self.preflight, sql, skip_cached)
+
+    def close(self):
+        """关闭线程池"""
+        self._pool.shutdown(wait=False)
+
     def format_results(
-        self, data: List[Dict[str, Any]], columns: List[str], max_display: int = 20
+        self,
+        data: ResultSet,
+        max_display: int = 20,
+        total: Optional[int] = None,
     ) -> str:
         """
         格式化查询结果为表格字符串
 
         Args:
             data: 查询结果
-            columns: 列名
             max_display: 最大显示行数
+            total: 结果总行数，data 只是前几行预览时传入
 
         Returns:
             格式化的表格字符串
@@ -67,26 +447,28 @@ class SQLExecutor:
         if not data:
             return "（无数据）"
 
+        columns = data.columns
+        shown = [[str(v) for v in row] for row in data.head(max_display).rows()]
+
         # 计算每列的最大宽度
-        widths = {col: len(str(col)) for col in columns}
-        for row in data[:max_display]:
-            for col in columns:
-                val = str(row.get(col, ""))
-                widths[col] = max(widths[col], min(len(val), 50))
+        widths = [len(str(col)) for col in columns]
+        for row in shown:
+            for i, val in enumerate(row):
+                widths[i] = max(widths[i], min(len(val), 50))
 
         # 生成表头
-        header = " | ".join(str(col).ljust(widths[col]) for col in columns)
-        separator = "-+-".join("-" * widths[col] for col in columns)
+        header = " | ".join(str(col).ljust(w) for col, w in zip(columns, widths))
+        separator = "-+-".join("-" * w for w in widths)
 
         # 生成数据行
         lines = [header, separator]
-        for i, row in enumerate(data):
-            if i >= max_display:
-                lines.append(f"... 还有 {len(data) - max_display} 行未显示")
-                break
-            line = " | ".join(
-                str(row.get(col, ""))[:50].ljust(widths[col]) for col in columns
-            )
+        for row in shown:
+            line = " | ".join(val[:50].ljust(w) for val, w in zip(row, widths))
             lines.append(line)
+        total = len(data) if total is None else total
+        if total > max_display:
+            lines.append(f"... 还有 {total - max_display} 行未显示")
+        if data.truncated:
+            lines.append(f"（结果超过 {self.max_results} 行，已截断）")
 
         return "\n".join(lines)
@@ -0,0 +1,395 @@
+"""SQL词法分析与改写模块"""
+
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, NamedTuple, Optional
+import re
+import threading
+
+
+class Token(NamedTuple):
+    """词法单元"""
+
+    kind: str    # ws / comment / string / ident / number / word / param / punct / unterminated / op
+    value: str
+    start: int
+    end: int
+    depth: int   # 所在的括号嵌套深度（括号本身记为外层深度）
+
+    @property
+    def upper(self) -> str:
+        return self.value.upper()
+
+
+@lru_cache(maxsize=None)
+def _token_pattern(dialect: str) -> "re.Pattern":
+    """按方言构造词法规则：字符串转义、注释符号、标识符引号各有不同"""
+    mysql = dialect in ("mysql", "mariadb")
+    if mysql:
+        string = r"'(?:[^'\\]|\\.|'')*'"
+        comment = r"--[^\n]*|\#[^\n]*|/\*.*?\*/"
+    else:
+        string = r"'(?:[^']|'')*'"
+        comment = r"--[^\n]*|/\*.*?\*/"
+    idents = [r'"(?:[^"]|"")*"', r"`(?:[^`]|``)*`"]
+    params = [r"[:@]\w+", r"\?", r"%s", r"%\(\w+\)s"]
+    unterminated = [r"['\"`].*", r"/\*.*"]
+    if dialect in ("mssql", "sqlite"):
+        idents.append(r"\[[^\]]*\]")
+        unterminated.append(r"\[.*")
+    if dialect == "postgresql":
+        # 美元符号引用的字符串 $$...$$ / $tag$...$tag$，以及 $1 形式的位置参数
+        string = r"\$(?P<tag>[A-Za-z_]\w*)?\$.*?\$(?P=tag)\$|" + string
+        params.append(r"\$\d+")
+        unterminated.append(r"\$(?:[A-Za-z_]\w*)?\$.*")
+    parts = [
+        ("ws", r"\s+"),
+        ("comment", comment),
+        ("string", string),
+        ("ident", "|".join(idents)),
+        ("number", r"(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?"),
+        ("word", r"[^\W\d]\w*"),
+        ("param", "|".join(params)),
+        ("punct", r"[(),;.]"),
+        # 未闭合的引号或块注释一直延伸到末尾
+        ("unterminated", "|".join(unterminated)),
+        ("op", r"."),
+    ]
+    return re.compile(
+        "|".join(f"(?P<{name}>{regex})" for name, regex in parts), re.DOTALL
+    )
+
+
+def tokenize(sql: str, dialect: str = "") -> List[Token]:
+    """
+    单遍词法分析
+
+    字符串、带引号的标识符和注释作为整体识别，其中的内容不会被当作关键字；
+    每个词法单元记录括号嵌套深度，用于区分最外层语句与子查询。
+    """
+    tokens = []
+    depth = 0
+    for match in _token_pattern(dialect).finditer(sql):
+        kind = match.lastgroup
+        value = match.group()
+        if value == ")":
+            depth = max(depth - 1, 0)
+        tokens.append(Token(kind, value, match.start(), match.end(), depth))
+        if value == "(":
+            depth += 1
+    return tokens
+
+
+# 出现在分号之后即视为第二条语句的关键字，否则视为模型附带的说明文字
+STATEMENT_KEYWORDS = frozenset({
+    "SELECT", "WITH", "VALUES", "TABLE", "INSERT", "UPDATE", "DELETE", "MERGE",
+    "REPLACE", "UPSERT", "DROP", "CREATE", "ALTER", "TRUNCATE", "RENAME", "GRANT",
+    "REVOKE", "EXEC", "EXECUTE", "CALL", "DO", "SET", "USE", "SHOW", "DESCRIBE",
+    "EXPLAIN", "PRAGMA", "ATTACH", "DETACH", "VACUUM", "COPY", "LOAD", "LOCK",
+    "BEGIN", "START", "COMMIT", "ROLLBACK", "SAVEPOINT", "DECLARE",
+})
+
+# FROM 子句中结束表引用的关键字
+_CLAUSE_KEYWORDS = frozenset({
+    "WHERE", "GROUP", "ORDER", "HAVING", "LIMIT", "OFFSET", "FETCH", "UNION",
+    "INTERSECT", "EXCEPT", "MINUS", "JOIN", "INNER", "LEFT", "RIGHT", "FULL",
+    "OUTER", "CROSS", "NATURAL", "STRAIGHT_JOIN", "ON", "USING", "WINDOW",
+    "QUALIFY", "FOR", "LATERAL", "PIVOT", "UNPIVOT", "TABLESAMPLE",
+})
+
+_FENCE_RE = re.compile(r"```(?:sql)?", re.IGNORECASE)
+
+
+def _unquote(value: str) -> str:
+    if value[:1] in ('"', "`", "["):
+        return value[1:-1]
+    return value
+
+
+class ParsedSQL:
+    """
+    一次词法分析得到的SQL结构
+
+    构造时在同一遍遍历中完成清理（去掉代码块标记、注释、多余空白、末尾分号
+    以及分号后的说明文字）、语句数量统计和未闭合引号检测。
+    语句类型、关键字、引用的表和行数上限改写都基于这组词法单元，
+    校验器、执行器和结果缓存通过 parse_sql 共享同一个对象。
+    """
+
+    __slots__ = (
+        "sql", "dialect", "tokens", "statement_count", "unterminated",
+        "_keywords", "_tables", "_aliases",
+    )
+
+    def __init__(self, raw: str, dialect: str = ""):
+        self.dialect = dialect
+        self.statement_count = 0
+        self.unterminated = False
+        self._keywords: Optional[FrozenSet[str]] = None
+        self._tables: Optional[List[str]] = None
+        self._aliases: Optional[Dict[str, str]] = None
+
+        pieces: List[str] = []
+        tokens: List[Token] = []
+        pos = 0
+        space = False
+        ended = False
+        for token in tokenize(_FENCE_RE.sub(" ", raw), dialect):
+            if token.kind in ("ws", "comment"):
+                space = bool(pieces)
+                continue
+            if ended:
+                # 分号后以语句关键字开头即为第二条语句，否则是说明文字，直接截断
+                if token.kind == "word" and token.upper in STATEMENT_KEYWORDS:
+                    self.statement_count += 1
+                break
+            if token.value == ";" and token.depth == 0:
+                ended = bool(tokens)
+                continue
+            if token.kind == "unterminated":
+                self.unterminated = True
+            if space:
+                pieces.append(" ")
+                pos += 1
+                space = False
+            end = pos + len(token.value)
+            tokens.append(Token(token.kind, token.value, pos, end, token.depth))
+            pieces.append(token.value)
+            pos = end
+
+        if tokens:
+            self.statement_count += 1
+        self.sql = "".join(pieces)
+        self.tokens = tokens
+
+    def _word(self, index: int) -> Optional[str]:
+        """位置 index 处的关键字（大写）；非单词或 "t.limit" 这样的限定名返回 None"""
+        token = self.tokens[index]
+        if token.kind != "word" or (index > 0 and self.tokens[index - 1].value == "."):
+            return None
+        return token.upper
+
+    @property
+    def statement_type(self) -> Optional[str]:
+        """语句类型（SELECT / INSERT / ...），WITH 开头时为其主语句的类型"""
+        tokens = self.tokens
+        if not tokens:
+            return None
+        if tokens[0].value == "(":
+            return next(filter(None, map(self._word, range(len(tokens)))), None)
+        first = self._word(0)
+        if first != "WITH":
+            return first
+        # CTE 定义都在括号内，最外层的第一个语句关键字即主语句
+        for i in range(1, len(tokens)):
+            word = self._word(i)
+            if tokens[i].depth == 0 and word in STATEMENT_KEYWORDS and word != "WITH":
+                return word
+        return first
+
+    @property
+    def keywords(self) -> FrozenSet[str]:
+        """出现的所有关键字，不含字符串、带引号的标识符和注释中的内容"""
+        if self._keywords is None:
+            self._keywords = frozenset(filter(None, map(self._word, range(len(self.tokens)))))
+        return self._keywords
+
+    @property
+    def tables(self) -> List[str]:
+        """FROM / JOIN 引用的表名（小写、去引号、保留 schema 前缀），不含 CTE 名和子查询"""
+        if self._tables is None:
+            self._extract_tables()
+        return self._tables
+
+    @property
+    def aliases(self) -> Dict[str, str]:
+        """表别名（小写）到表名的映射，未使用别名的表映射到自身"""
+        if self._aliases is None:
+            self._extract_tables()
+        return self._aliases
+
+    def _cte_names(self) -> set:
+        tokens, n = self.tokens, len(self.tokens)
+        names = set()
+        if not n or self._word(0) != "WITH":
+            return names
+        i = 2 if n > 1 and self._word(1) == "RECURSIVE" else 1
+        # name [(列...)] AS [NOT] [MATERIALIZED] (...)，多个 CTE 以最外层逗号分隔
+        while i < n and tokens[i].kind in ("word", "ident"):
+            names.add(_unquote(tokens[i].value).lower())
+            while i < n and not (self._word(i) == "AS" and tokens[i].depth == 0):
+                i += 1
+            while i < n and tokens[i].value != "(":
+                i += 1
+            i += 1
+            while i < n and tokens[i].depth > 0:
+                i += 1
+            # tokens[i] 为 CTE 主体的右括号
+            if i + 1 < n and tokens[i + 1].value == ",":
+                i += 2
+            else:
+                break
+        return names
+
+    def _read_table(self, i: int, ctes: set, tables: List[str], aliases: Dict[str, str]) -> int:
+        """读取位置 i 处的一个表引用及其别名（追加到 tables/aliases），返回其后的位置；子查询和表值函数不算"""
+        tokens, n = self.tokens, len(self.tokens)
+        parts = []
+        while i < n and tokens[i].kind in ("word", "ident"):
+            if not parts and self._word(i) in _CLAUSE_KEYWORDS:
+                return i
+            parts.append(_unquote(tokens[i].value))
+            i += 1
+            if i + 1 < n and tokens[i].value == ".":
+                i += 1
+                continue
+            break
+        if not parts or (i < n and tokens[i].value == "("):
+            return i
+        name = ".".join(parts).lower()
+        if name in ctes:
+            return i
+        if name not in tables:
+            tables.append(name)
+        aliases.setdefault(name, name)
+        # [AS] alias
+        if i < n and self._word(i) == "AS":
+            i += 1
+        if i < n and tokens[i].kind in ("word", "ident") and self._word(i) not in _CLAUSE_KEYWORDS:
+            aliases[_unquote(tokens[i].value).lower()] = name
+            i += 1
+        return i
+
+    def _extract_tables(self):
+        # 解析结果经 parse_sql 缓存在线程间共享：先在局部变量中构建完整结果再赋值，
+        # 其他线程看到的要么是 None（自行计算一遍），要么是完整的列表
+        tokens, n = self.tokens, len(self.tokens)
+        ctes = self._cte_names()
+        tables: List[str] = []
+        aliases: Dict[str, str] = {}
+        for i in range(n):
+            word = self._word(i)
+            if word == "JOIN":
+                self._read_table(i + 1, ctes, tables, aliases)
+            elif word == "FROM":
+                depth = tokens[i].depth
+                j = self._read_table(i + 1, ctes, tables, aliases)
+                # FROM a, b 这样逗号分隔的多个表
+                while j < n and tokens[j].depth >= depth:
+                    if tokens[j].depth == depth:
+                        if self._word(j) in _CLAUSE_KEYWORDS:
+                            break
+                        if tokens[j].value == ",":
+                            j = self._read_table(j + 1, ctes, tables, aliases)
+                            continue
+                    j += 1
+        self._aliases = aliases
+        self._tables = tables
+
+    def limit(self, limit: int) -> str:
+        """
+        将行数上限下推到最外层查询
+
+        已有更小的 LIMIT / TOP / FETCH FIRST 时保持不变，已有更大的则改小；
+        没有时按方言追加：MySQL/PostgreSQL/SQLite 等使用 LIMIT，
+        Oracle 使用 FETCH FIRST，SQL Server 对单个 SELECT 使用 TOP，
+        对含集合运算或 ORDER BY 的查询使用 OFFSET ... FETCH NEXT。
+        非 SELECT 查询或多条语句原样返回清理后的SQL。
+        """
+        sql, tokens, dialect = self.sql, self.tokens, self.dialect
+        if self.statement_count != 1 or self.statement_type != "SELECT":
+            return sql
+
+        n = len(tokens)
+        words = [self._word(i) for i in range(n)]
+        top = [i for i in range(n) if tokens[i].depth == 0]
+
+        def at(i: int) -> Optional[Token]:
+            return tokens[i] if i < n else None
+
+        for i in top:
+            word = words[i]
+            if word == "LIMIT":
+                # LIMIT n [OFFSET m] 或 MySQL 的 LIMIT m, n
+                count = at(i + 3) if i + 2 < n and tokens[i + 2].value == "," else at(i + 1)
+                if count is not None and count.upper == "ALL":
+                    return sql[:count.start] + str(limit) + sql[count.end:]
+                return _replace_count(sql, count, limit)
+            if word == "FETCH" and i + 1 < n and words[i + 1] in ("FIRST", "NEXT"):
+                return _replace_count(sql, at(i + 2), limit)
+            if word == "TOP":
+                count = at(i + 1)
+                if count is not None and count.value == "(":
+                    count = at(i + 2)
+                return _replace_count(sql, count, limit)
+
+        if dialect == "mssql":
+            set_ops = any(words[i] in ("UNION", "INTERSECT", "EXCEPT") for i in top)
+            ordered = any(words[i] == "ORDER" and i + 1 < n and words[i + 1] == "BY" for i in top)
+            if ordered or set_ops:
+                order = "" if ordered else " ORDER BY (SELECT NULL)"
+                return f"{sql}{order} OFFSET 0 ROWS FETCH NEXT {limit} ROWS ONLY"
+            for i in top:
+                if words[i] == "SELECT":
+                    anchor = tokens[i + 1] if i + 1 < n and words[i + 1] in ("DISTINCT", "ALL") else tokens[i]
+                    return f"{sql[:anchor.end]} TOP {limit}{sql[anchor.end:]}"
+            return sql
+        if dialect == "oracle":
+            return f"{sql} FETCH FIRST {limit} ROWS ONLY"
+        return f"{sql} LIMIT {limit}"
+
+    def hint(self, hint: str) -> str:
+        """
+        插入语句级优化器提示 /*+ hint */（如 MySQL 的 MAX_EXECUTION_TIME）
+
+        提示放在最外层第一个 SELECT 之后：含 UNION 的语句作用于整条语句，
+        WITH 的各 CTE 在括号内，提示落在主查询上；整条语句以括号开头时放在第一个 SELECT 之后。
+        非 SELECT 查询或多条语句原样返回清理后的SQL。
+        """
+        sql, tokens = self.sql, self.tokens
+        if self.statement_count != 1 or self.statement_type != "SELECT":
+            return sql
+        nested = tokens[0].value == "("
+        for i, token in enumerate(tokens):
+            if (nested or token.depth == 0) and self._word(i) == "SELECT":
+                return f"{sql[:token.end]} /*+ {hint} */{sql[token.end:]}"
+        return sql
+
+
+def _replace_count(sql: str, token: Optional[Token], limit: int) -> str:
+    """行数为数字字面量且大于 limit 时替换为 limit，否则保持原样（如参数、表达式）"""
+    if token is None or token.kind != "number" or not token.value.isdigit():
+        return sql
+    if int(token.value) <= limit:
+        return sql
+    return sql[:token.start] + str(limit) + sql[token.end:]
+
+
+# 解析结果按 (SQL文本, 方言) 缓存；清理后的文本也作为键，
+# 校验通过后执行器和结果缓存用清理后的SQL查询时直接命中
+PARSE_CACHE_SIZE = 1024
+_parse_cache: "OrderedDict[tuple, ParsedSQL]" = OrderedDict()
+_parse_lock = threading.Lock()
+
+
+def parse_sql(sql: str, dialect: str = "") -> ParsedSQL:
+    """解析SQL（带缓存）"""
+    key = (sql, dialect)
+    with _parse_lock:
+        parsed = _parse_cache.get(key)
+        if parsed is not None:
+            _parse_cache.move_to_end(key)
+            return parsed
+
+    parsed = ParsedSQL(sql, dialect)
+    with _parse_lock:
+        _parse_cache[key] = parsed
+        _parse_cache[(parsed.sql, dialect)] = parsed
+        while len(_parse_cache) > PARSE_CACHE_SIZE:
+            _parse_cache.popitem(last=False)
+    return parsed
+
+
+def limit_sql(sql: str, dialect: str, limit: int) -> str:
+    """将行数上限下推到最外层查询（见 ParsedSQL.limit）"""
+    return parse_sql(sql, dialect).limit(limit)
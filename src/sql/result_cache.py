@@ -0,0 +1,158 @@
+"""SQL结果缓存模块"""
+
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Callable
+import threading
+import time
+import logging
+
+from .result_set import ResultSet
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_sql(sql: str) -> str:
+    """规范化SQL文本作为缓存键：合并空白、去掉末尾分号"""
+    return " ".join(sql.split()).rstrip(";").strip()
+
+
+class ResultCache:
+    """
+    查询结果缓存
+
+    按规范化SQL缓存结果，总容量按估算内存字节数限制（LRU淘汰）。
+    每条缓存记录查询读取的表及写入时的表版本，
+    读取时通过 TTL 以及可选的表变更探测（由执行器提供）判断是否失效。
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, ttl: float = 300):
+        """
+        初始化结果缓存
+
+        Args:
+            max_bytes: 缓存总容量（字节）
+            ttl: 过期时间（秒），<= 0 表示不过期，仅依赖表变更探测
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.current_bytes = 0
+        # 键: 规范化SQL -> (结果集, 表名列表, 表版本, 写入时间, 字节数)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(
+        self,
+        sql: str,
+        probe: Optional[Callable[[List[str]], Optional[Dict[str, Any]]]] = None,
+    ) -> Optional[ResultSet]:
+        """
+        读取缓存
+
+        Args:
+            sql: SQL语句
+            probe: 表变更探测函数，返回 {表名: 版本}，不支持时返回 None
+
+        Returns:
+            结果集，未命中或已失效时返回 None
+        """
+        key = normalize_sql(sql)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+        # 表变更探测要查询数据库，在锁外进行
+        result, tables, versions, stored_at, _ = entry
+        stale = self.ttl > 0 and time.monotonic() - stored_at > self.ttl
+        if not stale and versions is not None and probe is not None:
+            stale = probe(tables) != versions
+
+        with self._lock:
+            if stale:
+                self.invalidations += 1
+                self.misses += 1
+                # 探测期间可能已被重新写入，只删除读到的这一条
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+                    self.current_bytes -= entry[4]
+                return None
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self.hits += 1
+        return result
+
+    def contains(self, sql: str) -> bool:
+        """
+        是否有未过期的缓存（只检查 TTL，不探测表变更、不计入命中统计）
+
+        用于执行前判断能否跳过代价预检，真正读取仍以 get 为准。
+        """
+        key = normalize_sql(sql)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return False
+        return self.ttl <= 0 or time.monotonic() - entry[3] <= self.ttl
+
+    def put(
+        self,
+        sql: str,
+        result: ResultSet,
+        tables: List[str],
+        versions: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        写入缓存
+
+        Args:
+            sql: SQL语句
+            result: 查询结果
+            tables: 查询读取的表
+            versions: 执行查询前探测到的表版本
+        """
+        if versions is None and self.ttl <= 0:
+            # 既无法探测变更又不会过期，缓存后将永远无法失效
+            return
+        size = result.nbytes()
+        if size > self.max_bytes:
+            return
+        key = normalize_sql(sql)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[4]
+            self._entries[key] = (result, tables, versions, time.monotonic(), size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted[4]
+
+    def invalidate_table(self, table_name: str):
+        """使读取了指定表的缓存全部失效"""
+        table_name = table_name.lower()
+        with self._lock:
+            keys = [k for k, e in self._entries.items() if table_name in e[1]]
+            for key in keys:
+                self.current_bytes -= self._entries.pop(key)[4]
+            self.invalidations += len(keys)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """命中统计"""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "bytes": self.current_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
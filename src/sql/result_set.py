@@ -0,0 +1,156 @@
+"""查询结果集模块"""
+
+from array import array
+from collections.abc import Sequence
+from decimal import Decimal
+from typing import List, Dict, Any, Iterator, Tuple
+import base64
+import sys
+
+_BINARY_TYPES = (bytes, bytearray, memoryview)
+
+
+def _pack_column(values: List[Any]):
+    """
+    压缩一列数据
+
+    全为整数（不含布尔值）时使用 array('q')，全为浮点数时使用 array('d')，
+    其余情况（含 NULL、Decimal、字符串、日期等）保持列表。
+    """
+    if not values:
+        return values
+    first = type(values[0])
+    if first is int and all(type(v) is int for v in values):
+        try:
+            return array("q", values)
+        except OverflowError:
+            return values
+    if first is float and all(type(v) is float for v in values):
+        return array("d", values)
+    return values
+
+
+def _wire_column(values):
+    """
+    传输格式的一列：Decimal 转为浮点数，二进制转为 base64 字符串
+
+    按列首个非空值判断类型，整列只转换一次，编码器不必为每个单元格回调 Python；
+    类型化数组和不含这两种类型的列原样返回。
+    """
+    if isinstance(values, array):
+        return values
+    sample = next((v for v in values if v is not None), None)
+    if isinstance(sample, Decimal):
+        return [float(v) if isinstance(v, Decimal) else v for v in values]
+    if isinstance(sample, _BINARY_TYPES):
+        return [
+            base64.b64encode(bytes(v)).decode("ascii") if isinstance(v, _BINARY_TYPES) else v
+            for v in values
+        ]
+    return values
+
+
+class _RecordsView(Sequence):
+    """按行字典访问结果集的惰性视图，只在访问某一行时才构造字典"""
+
+    __slots__ = ("_result",)
+
+    def __init__(self, result: "ResultSet"):
+        self._result = result
+
+    def __len__(self) -> int:
+        return len(self._result)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return dict(zip(self._result.columns, self._result.row(index)))
+
+
+class ResultSet:
+    """
+    列式存储的查询结果
+
+    列名只保存一份，数据按列存储，数值列使用紧凑的类型化数组。
+    对外提供行元组迭代、惰性的行字典视图 (records) 和列式传输格式 (to_wire)。
+    """
+
+    __slots__ = ("columns", "_values", "_length", "truncated")
+
+    def __init__(self, columns: List[str], values: List[Any], truncated: bool = False):
+        """
+        初始化结果集
+
+        Args:
+            columns: 列名
+            values: 每列的数据（与 columns 一一对应）
+            truncated: 结果是否因行数上限被截断
+        """
+        self.columns = columns
+        self._values = values
+        self._length = len(values[0]) if values else 0
+        self.truncated = truncated
+
+    @classmethod
+    def from_rows(
+        cls, columns: List[str], rows: List[Tuple], truncated: bool = False
+    ) -> "ResultSet":
+        """由行元组列表（如 DBAPI 返回的行）构造结果集"""
+        if rows:
+            values = [_pack_column(list(col)) for col in zip(*rows)]
+        else:
+            values = [[] for _ in columns]
+        return cls(list(columns), values, truncated)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __bool__(self) -> bool:
+        return self._length > 0
+
+    def column(self, name: str):
+        """获取一列数据"""
+        return self._values[self.columns.index(name)]
+
+    def row(self, index: int) -> Tuple:
+        """获取一行数据（元组）"""
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("行号超出范围")
+        return tuple(col[index] for col in self._values)
+
+    def rows(self) -> Iterator[Tuple]:
+        """逐行迭代（元组）"""
+        return zip(*self._values) if self._values else iter(())
+
+    @property
+    def records(self) -> _RecordsView:
+        """行字典视图（惰性构造）"""
+        return _RecordsView(self)
+
+    def head(self, n: int) -> "ResultSet":
+        """前 n 行组成的新结果集"""
+        return ResultSet(self.columns, [col[:n] for col in self._values], self.truncated)
+
+    def to_wire(self) -> Dict[str, Any]:
+        """
+        列名只出现一次的传输格式: {"columns": [...], "rows": [[...], ...], "truncated": bool}
+
+        Decimal 和二进制列在这里按列转换为浮点数和 base64 字符串（JSON 与 msgpack 一致）。
+        """
+        columns = [_wire_column(col) for col in self._values]
+        return {
+            "columns": self.columns,
+            "rows": [list(r) for r in zip(*columns)] if columns else [],
+            "truncated": self.truncated,
+        }
+
+    def nbytes(self) -> int:
+        """估算占用的内存字节数"""
+        size = sys.getsizeof(self.columns) + sum(sys.getsizeof(c) for c in self.columns)
+        for col in self._values:
+            size += sys.getsizeof(col)
+            if not isinstance(col, array):
+                size += sum(sys.getsizeof(v) for v in col)
+        return size
@@ -0,0 +1,153 @@
+"""查询结果统计概要模块"""
+
+from array import array
+from collections import Counter
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+from .result_set import ResultSet
+
+_NUMERIC_TYPES = (int, float, Decimal)
+_TEMPORAL_TYPES = (datetime, date)
+
+
+class _ColumnStats:
+    """单列的累积统计"""
+
+    __slots__ = ("name", "nulls", "numeric", "categories", "temporal_min", "temporal_max")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.nulls = 0
+        # 各批数值组成的 ndarray 列表
+        self.numeric: List[Any] = []
+        self.categories: Counter = Counter()
+        self.temporal_min = None
+        self.temporal_max = None
+
+    def update(self, values):
+        # numpy 导入较慢，只在首次汇总结果时加载，不计入进程启动
+        import numpy as np
+
+        if isinstance(values, array):
+            # 类型化数组零拷贝转为 ndarray
+            self.numeric.append(np.frombuffer(values, dtype=np.int64 if values.typecode == "q" else np.float64))
+            return
+
+        present = [v for v in values if v is not None]
+        self.nulls += len(values) - len(present)
+        if not present:
+            return
+        kinds = set(map(type, present))
+        if all(issubclass(k, _NUMERIC_TYPES) and k is not bool for k in kinds):
+            self.numeric.append(np.array(present, dtype=np.float64))
+        elif all(issubclass(k, _TEMPORAL_TYPES) for k in kinds):
+            low, high = min(present), max(present)
+            if self.temporal_min is None or low < self.temporal_min:
+                self.temporal_min = low
+            if self.temporal_max is None or high > self.temporal_max:
+                self.temporal_max = high
+        else:
+            uniques, counts = np.unique(np.array([str(v) for v in present], dtype=object), return_counts=True)
+            self.categories.update(dict(zip(uniques.tolist(), counts.tolist())))
+
+    def finish(self, row_count: int, top_k: int) -> Dict[str, Any]:
+        import numpy as np
+
+        stats: Dict[str, Any] = {
+            "name": self.name,
+            "null_ratio": self.nulls / row_count if row_count else 0.0,
+        }
+
+        if self.categories or (not self.numeric and self.temporal_min is None):
+            # 同一列中混有数值和文本时按分类统计
+            for part in self.numeric:
+                uniques, counts = np.unique(part, return_counts=True)
+                self.categories.update({str(u): int(c) for u, c in zip(uniques.tolist(), counts.tolist())})
+            stats["kind"] = "categorical"
+            stats["distinct"] = len(self.categories)
+            stats["top"] = self.categories.most_common(top_k)
+        elif self.numeric:
+            values = np.concatenate(self.numeric) if len(self.numeric) > 1 else self.numeric[0]
+            q25, q50, q75 = np.percentile(values, [25, 50, 75])
+            stats.update({
+                "kind": "numeric",
+                "min": values.min().item(),
+                "max": values.max().item(),
+                "mean": float(values.mean()),
+                "p25": float(q25),
+                "p50": float(q50),
+                "p75": float(q75),
+            })
+        else:
+            stats.update({"kind": "temporal", "min": self.temporal_min, "max": self.temporal_max})
+        return stats
+
+
+class ResultSummarizer:
+    """
+    查询结果统计概要
+
+    按列向量化统计：数值列的最小/最大/均值/分位数，时间列的范围，
+    分类列的不同值个数和 Top-K 取值，以及每列空值比例和总行数。
+    支持分批累积（流式返回时逐批 update），概要大小与结果行数无关。
+    """
+
+    def __init__(self, top_k: int = 5):
+        self.top_k = top_k
+        self.columns: Optional[List[str]] = None
+        self.row_count = 0
+        self._stats: List[_ColumnStats] = []
+
+    def update(self, result: ResultSet) -> "ResultSummarizer":
+        """累积一批结果"""
+        if self.columns is None:
+            self.columns = list(result.columns)
+            self._stats = [_ColumnStats(name) for name in self.columns]
+        if result:
+            for stats, name in zip(self._stats, result.columns):
+                stats.update(result.column(name))
+            self.row_count += len(result)
+        return self
+
+    def finish(self) -> Dict[str, Any]:
+        """生成统计概要"""
+        return {
+            "row_count": self.row_count,
+            "columns": [s.finish(self.row_count, self.top_k) for s in self._stats],
+        }
+
+
+def _fmt(value: Any) -> str:
+    if isinstance(value, float):
+        return str(int(value)) if value.is_integer() and abs(value) < 1e15 else f"{value:.6g}"
+    return str(value)
+
+
+def summarize_result(result: ResultSet, top_k: int = 5) -> Dict[str, Any]:
+    """一次性统计整个结果集"""
+    return ResultSummarizer(top_k).update(result).finish()
+
+
+def format_summary(summary: Dict[str, Any]) -> str:
+    """将统计概要格式化为提示词中使用的紧凑文本"""
+    lines = [f"共 {summary['row_count']} 行, {len(summary['columns'])} 列"]
+    for col in summary["columns"]:
+        null_note = f", 空值 {col['null_ratio']:.1%}" if col["null_ratio"] else ""
+        if col["kind"] == "numeric":
+            lines.append(
+                f"- {col['name']} (数值): 最小 {_fmt(col['min'])}, 最大 {_fmt(col['max'])}, "
+                f"均值 {_fmt(col['mean'])}, P25/P50/P75 = "
+                f"{_fmt(col['p25'])}/{_fmt(col['p50'])}/{_fmt(col['p75'])}{null_note}"
+            )
+        elif col["kind"] == "temporal":
+            lines.append(
+                f"- {col['name']} (时间): 最早 {_fmt(col['min'])}, 最晚 {_fmt(col['max'])}{null_note}"
+            )
+        else:
+            top = ", ".join(f"{str(v)[:30]}({c})" for v, c in col["top"])
+            lines.append(
+                f"- {col['name']} (分类): {col['distinct']} 个不同值, 最常见: {top or '无'}{null_note}"
+            )
+    return "\n".join(lines)
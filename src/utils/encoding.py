@@ -0,0 +1,105 @@
+"""响应编码模块"""
+
+from datetime import datetime, date, time
+from decimal import Decimal
+from typing import Any, Callable, Dict, Optional
+import base64
+import zlib
+
+import orjson
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+def json_default(obj):
+    """JSON 无法直接表示的类型：Decimal 转为浮点数，日期时间转为 ISO 字符串，二进制转为 base64"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return base64.b64encode(bytes(obj)).decode("ascii")
+    raise TypeError(f"Type {type(obj)} not serializable")
+
+
+def _msgpack_default(obj):
+    """msgpack 原生支持二进制，只需转换 Decimal 和日期时间"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    raise TypeError(f"Type {type(obj)} not serializable")
+
+
+# orjson 在 C 层直接处理 datetime/date 和 str/int/float（NaN/Infinity 输出为 null），
+# 只有 Decimal、bytes 才回调 Python；查询结果在 ResultSet.to_wire 中已按列转换好
+_ORJSON_OPTS = orjson.OPT_NON_STR_KEYS
+
+
+def encode_json(content: Any) -> bytes:
+    return orjson.dumps(content, default=json_default, option=_ORJSON_OPTS)
+
+
+def encode_msgpack(content: Any) -> bytes:
+    return msgpack.packb(content, default=_msgpack_default, use_bin_type=True)
+
+
+# 媒体类型 -> 编码函数，按服务端偏好排序；可选依赖未安装时不注册对应格式
+ENCODERS: Dict[str, Callable[[Any], bytes]] = {"application/json": encode_json}
+if msgpack is not None:
+    ENCODERS["application/msgpack"] = encode_msgpack
+    ENCODERS["application/x-msgpack"] = encode_msgpack
+
+
+def negotiate(accept: Optional[str]) -> str:
+    """
+    根据 Accept 请求头选择响应格式
+
+    按 q 值从高到低匹配已注册的编码器，无法匹配时返回 application/json。
+    """
+    if not accept:
+        return "application/json"
+    candidates = []
+    for index, part in enumerate(accept.split(",")):
+        fields = part.strip().split(";")
+        media_type = fields[0].strip().lower()
+        q = 1.0
+        for param in fields[1:]:
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            candidates.append((-q, index, media_type))
+    for _, _, media_type in sorted(candidates):
+        if media_type in ENCODERS:
+            return media_type
+    return "application/json"
+
+
+def encode_sse(event: Dict[str, Any]) -> bytes:
+    """编码一条 SSE 事件"""
+    return b"data: " + encode_json(event) + b"\n\n"
+
+
+class StreamCompressor:
+    """
+    流式 gzip 压缩
+
+    每次写入后做一次 Z_SYNC_FLUSH，客户端可以立即解压出已发送的事件，
+    同一响应内的事件共享压缩字典，重复的列名、键名压缩效果更好。
+    """
+
+    def __init__(self, level: int = 6):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
@@ -1,12 +1,156 @@
 import os
+import atexit
+import hashlib
 import logging
 import logging.handlers
+import queue
+import threading
 from datetime import datetime
 
-def setup_logging(log_dir="logs"):
+from .encoding import encode_json
+
+# 日志线程每次最多合并写入的记录数
+LOG_BATCH_SIZE = 256
+
+_listeners = []
+
+
+class JSONLFormatter(logging.Formatter):
+    """每条记录一行 JSON：问答记录直接输出其结构化内容，其他记录输出基本字段"""
+
+    def format(self, record):
+        entry = getattr(record, "qa", None)
+        if entry is None:
+            entry = {
+                "timestamp": datetime.fromtimestamp(record.created).isoformat(),
+                "level": record.levelname,
+                "logger": record.name,
+                "message": record.getMessage(),
+            }
+        return encode_json(entry).decode("utf-8")
+
+
+class BatchQueueListener:
+    """
+    批量写入的队列监听器
+
+    请求线程只把日志记录放入队列，格式化（包括问答记录的 JSON 序列化）和文件写入
+    都在监听线程中完成；每次取出队列中已积压的所有记录（至多 LOG_BATCH_SIZE 条），
+    对每个文件只写一次、flush 一次。handler 的级别和过滤器在写入时检查。
+    """
+
+    # 停止标记：stop() 放入队列，监听线程写完它之前的记录后退出
+    _STOP = object()
+
+    def __init__(self, q, *handlers, batch_size: int = LOG_BATCH_SIZE):
+        self.queue = q
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self._thread = None
+
+    def start(self):
+        """启动后台写入线程"""
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """写完队列中已有的记录后停止后台线程"""
+        if self._thread is None:
+            return
+        self.queue.put(self._STOP)
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            records = [r for r in batch if r is not self._STOP]
+            if records:
+                for handler in self.handlers:
+                    _emit_batch(handler, records)
+            if len(records) < len(batch):
+                break
+
+
+def _emit_batch(handler: logging.Handler, records):
+    """将一批记录写入 handler：文件/流一次写入并 flush，其他 handler 逐条处理"""
+    records = [r for r in records if r.levelno >= handler.level and handler.filter(r)]
+    if not records:
+        return
+    if not isinstance(handler, logging.StreamHandler):
+        for record in records:
+            handler.handle(record)
+        return
+
+    handler.acquire()
+    try:
+        rotating = isinstance(handler, logging.handlers.RotatingFileHandler) and handler.maxBytes > 0
+        written = handler.stream.tell() if rotating else 0
+        # tell() 是字节偏移，行长度也要按文件编码的字节数计算（中文日志一个字符占多个字节）
+        encoding = getattr(handler, "encoding", None) or "utf-8"
+        pending = []
+        for record in records:
+            try:
+                line = handler.format(record) + handler.terminator
+            except Exception:
+                handler.handleError(record)
+                continue
+            size = len(line.encode(encoding, errors="replace")) if rotating else 0
+            if rotating and written > 0 and written + size >= handler.maxBytes:
+                # 写满前先落盘已积累的部分再轮转
+                handler.stream.write("".join(pending))
+                pending = []
+                handler.doRollover()
+                written = handler.stream.tell()
+            pending.append(line)
+            written += size
+        handler.stream.write("".join(pending))
+        handler.flush()
+    except Exception:
+        handler.handleError(records[-1])
+    finally:
+        handler.release()
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """同进程内的队列，记录原样入队，消息格式化推迟到监听线程"""
+
+    def prepare(self, record):
+        return record
+
+
+def _queue_logger(logger: logging.Logger, *handlers) -> BatchQueueListener:
+    """让 logger 只把记录放入队列，由后台线程批量写入 handlers"""
+    q = queue.SimpleQueue()
+    logger.addHandler(_DeferredQueueHandler(q))
+    listener = BatchQueueListener(q, *handlers)
+    listener.start()
+    _listeners.append(listener)
+    return listener
+
+
+def stop_logging():
+    """停止后台日志线程，写完队列中剩余的记录"""
+    while _listeners:
+        _listeners.pop().stop()
+
+
+atexit.register(stop_logging)
+
+
+def setup_logging(log_dir="logs", level="INFO"):
     """配置全局日志"""
     if not os.path.exists(log_dir):
         os.makedirs(log_dir)
+    level = logging.getLevelName(level.upper()) if isinstance(level, str) else level
+
+    # 重复初始化时先停止之前的后台线程
+    stop_logging()
 
     # 日志格式
     log_format = logging.Formatter(
@@ -19,41 +163,41 @@ def setup_logging(log_dir="logs"):
         app_log_path, maxBytes=10*1024*1024, backupCount=5, encoding='utf-8'
     )
     app_handler.setFormatter(log_format)
-    app_handler.setLevel(logging.INFO)
+    app_handler.setLevel(level)
 
     # 2. 控制台日志
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(log_format)
-    console_handler.setLevel(logging.INFO)
+    console_handler.setLevel(level)
 
     # 配置根日志
     root_logger = logging.getLogger()
-    root_logger.setLevel(logging.INFO)
-    
+    root_logger.setLevel(level)
+
     # 清除旧的 handler 防止重复
     if root_logger.hasHandlers():
         root_logger.handlers.clear()
-        
-    root_logger.addHandler(app_handler)
-    root_logger.addHandler(console_handler)
 
-    # 3. 专门的 SQL/问答日志 (qa.log) 用于追溯分析
+    _queue_logger(root_logger, app_handler, console_handler)
+
+    # 3. 专门的 SQL/问答日志 (qa.log) 用于追溯分析，每行一条 JSON
     qa_log_path = os.path.join(log_dir, "qa.log")
     qa_handler = logging.handlers.RotatingFileHandler(
         qa_log_path, maxBytes=5*1024*1024, backupCount=10, encoding='utf-8'
     )
-    qa_handler.setFormatter(log_format)
-    
+    qa_handler.setFormatter(JSONLFormatter())
+
     qa_logger = logging.getLogger("qa_logger")
     qa_logger.setLevel(logging.INFO)
-    qa_logger.addHandler(qa_handler)
+    qa_logger.handlers.clear()
+    _queue_logger(qa_logger, qa_handler)
     qa_logger.propagate = False # 不传递给 root 以免在 app.log 中重复（如果需要合并则设为 True）
 
     logging.info(f"日志系统初始化完成，存储目录: {log_dir}")
     return qa_logger
 
-def log_qa(question, sql, success, error_msg=None, user_context=None):
-    """记录问答追踪日志，增加访客上下文"""
+def log_qa(question, sql, success, error_msg=None, user_context=None, timings=None):
+    """记录问答追踪日志，增加访客上下文和各阶段耗时（JSON 序列化在日志线程中完成）"""
     qa_logger = logging.getLogger("qa_logger")
     log_entry = {
         "timestamp": datetime.now().isoformat(),
@@ -61,7 +205,42 @@ def log_qa(question, sql, success, error_msg=None, user_context=None):
         "sql": sql,
         "success": success,
         "error": error_msg,
-        "context": user_context or {}
+        "context": user_context or {},
+        # 复制一份，调用方之后对耗时字典的修改不影响尚未写出的记录
+        "timings": dict(timings or {})
     }
-    import json
-    qa_logger.info(json.dumps(log_entry, ensure_ascii=False))
+    qa_logger.info("问答记录: %s", question, extra={"qa": log_entry})
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+
+class _PromptSummary:
+    """提示词的惰性摘要：只有日志线程真正输出时才计算哈希"""
+
+    __slots__ = ("system_prompt", "prompt")
+
+    def __init__(self, system_prompt, prompt):
+        self.system_prompt = system_prompt
+        self.prompt = prompt
+
+    def __str__(self):
+        parts = []
+        if self.system_prompt:
+            parts.append(f"系统提示词 sha1={_digest(self.system_prompt)} ({len(self.system_prompt)} 字符)")
+        parts.append(f"用户提示词 ({len(self.prompt)} 字符):\n{self.prompt}")
+        return ", ".join(parts)
+
+
+def log_prompt(logger: logging.Logger, prompt: str, system_prompt=None):
+    """
+    记录发送给模型的提示词
+
+    系统提示词（规则、示例和完整 schema）是跨请求不变的大段前缀，
+    INFO 级别只记录其哈希和长度以及变化的用户提示词，完整内容仅在 DEBUG 级别输出。
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("系统提示词:\n%s\n用户提示词:\n%s", system_prompt or "", prompt)
+    elif logger.isEnabledFor(logging.INFO):
+        logger.info("发送提示词: %s", _PromptSummary(system_prompt, prompt))
@@ -0,0 +1,160 @@
+"""请求阶段耗时与 Token 用量指标模块"""
+
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Tuple
+import threading
+import time
+
+# 耗时直方图的桶上界（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+TOKEN_KINDS = ("input", "output", "cache_read", "cache_write")
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Histogram:
+    """按单个标签区分的直方图（Prometheus 累积桶语义）"""
+
+    def __init__(self, name: str, help_text: str, label: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = tuple(sorted(buckets))
+        # 标签值 -> [各桶计数..., 总和, 总数]
+        self._series: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value: str, value: float):
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for value, series in items:
+            label = f'{self.label}="{value}"'
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{label},le="{_format_value(bound)}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{label}}} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{{{label}}} {series[-1]}")
+        return lines
+
+
+class Counter:
+    """按单个标签区分的计数器"""
+
+    def __init__(self, name: str, help_text: str, label: str):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self._values: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_value: str, amount: float = 1):
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for value, total in items:
+            lines.append(f'{self.name}{{{self.label}="{value}"}} {_format_value(total)}')
+        return lines
+
+
+class MetricsRegistry:
+    """问数请求的指标汇总，以 Prometheus 文本格式输出"""
+
+    def __init__(self):
+        self.stage_seconds = Histogram(
+            "askdata_stage_seconds", "问数各阶段耗时（秒）", "stage"
+        )
+        self.llm_tokens = Counter("askdata_llm_tokens_total", "LLM token 用量", "kind")
+        self.requests = Counter("askdata_requests_total", "问数请求数（按结果）", "status")
+
+    def render(self) -> str:
+        lines = []
+        for metric in (self.stage_seconds, self.llm_tokens, self.requests):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+
+
+class RequestTimer:
+    """
+    单次问数请求的分阶段计时
+
+    各阶段耗时（同名阶段累加）和 token 用量在 finish() 时汇总为字典，
+    同时计入全局直方图/计数器，供 qa.log、SSE timing 事件和 /metrics 使用。
+    token 用量是本次请求所有 LLM 调用（SQL 生成与结果解释）之和，
+    流式 SQL 生成提前关闭时由客户端上报（或按文本估算）关闭前的用量。
+    """
+
+    def __init__(self, registry: Optional[MetricsRegistry] = METRICS):
+        self.registry = registry
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.tokens: Dict[str, int] = {kind: 0 for kind in TOKEN_KINDS}
+        self._summary: Optional[Dict[str, Any]] = None
+
+    def add(self, stage: str, seconds: float):
+        """累加一个阶段的耗时（秒）"""
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def first(self, stage: str, since: float):
+        """只记录第一次（如首个 token 的到达时间），since 为 perf_counter 起点"""
+        if stage not in self.stages:
+            self.stages[stage] = time.perf_counter() - since
+
+    @contextmanager
+    def stage(self, name: str):
+        """计时一个阶段"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add_usage(self, usage: Optional[Dict[str, int]]):
+        """累加一次 LLM 调用的 token 用量（作为 LLM 客户端的 on_usage 回调）"""
+        if not usage:
+            return
+        for kind in TOKEN_KINDS:
+            self.tokens[kind] += usage.get(f"{kind}_tokens", 0) or 0
+
+    def finish(self, success: bool = True) -> Dict[str, Any]:
+        """结束计时，返回 {阶段_ms..., total_ms, tokens}；重复调用返回同一结果"""
+        if self._summary is not None:
+            return self._summary
+        total = time.perf_counter() - self.started
+        summary: Dict[str, Any] = {
+            f"{name}_ms": round(seconds * 1000, 2) for name, seconds in self.stages.items()
+        }
+        summary["total_ms"] = round(total * 1000, 2)
+        summary["tokens"] = dict(self.tokens)
+        self._summary = summary
+
+        if self.registry is not None:
+            for name, seconds in self.stages.items():
+                self.registry.stage_seconds.observe(name, seconds)
+            self.registry.stage_seconds.observe("total", total)
+            for kind, count in self.tokens.items():
+                if count:
+                    self.registry.llm_tokens.inc(kind, count)
+            self.registry.requests.inc("success" if success else "error")
+        return summary
@@ -86,6 +86,7 @@ document.addEventListener('DOMContentLoaded', () => {
         let explanationDiv = null;
         let expSpanRef = null;
         let expHeaderOriginalHtml = '';
+        let streamColumns = [];
 
         try {
             const response = await fetch('/api/ask', {
@@ -117,6 +118,11 @@ document.addEventListener('DOMContentLoaded', () => {
                     const event = JSON.parse(line.trim().slice(6));
 
                     switch (event.type) {
+                        case 'sql_partial':
+                            // SQL 生成过程中逐步展示
+                            resultCard.querySelector('.sql-block').textContent = event.content;
+                            break;
+
                         case 'sql':
                             sql = event.content;
                             // 更新 SQL 内容
@@ -131,10 +137,19 @@ document.addEventListener('DOMContentLoaded', () => {
                             sqlSpanUpdate.innerHTML = baseSqlHtml; // 任务完成，移除“正在生成”
                             break;
 
+                        case 'preflight':
+                            // 执行前代价预检：告警时在 SQL 标题旁提示（拒绝时随后会收到 error 事件）
+                            if (event.content.action === 'warn') {
+                                const preflightSpan = resultCard.querySelector('.result-header span');
+                                preflightSpan.insertAdjacentHTML('beforeend', ` <span class="preflight-warn"><i class="fas fa-exclamation-triangle"></i> ${event.content.reason}</span>`);
+                            }
+                            break;
+
                         case 'data':
-                            const { data, columns } = event.content;
+                            // 列式格式: columns 只出现一次，rows 中每行是一个数组
+                            const { rows, columns, truncated } = event.content;
                             const cardForData = botMsg.querySelector('.result-card');
-                            updateResultCard(botMsg, columns, data);
+                            updateResultCard(botMsg, columns, rows);
 
                             const dataHeader = cardForData.querySelector('.data-header');
                             const dataSpan = dataHeader.querySelector('span');
@@ -143,7 +158,21 @@ document.addEventListener('DOMContentLoaded', () => {
 
                             await sleep(500); // 缩短延时
                             // 移除检索提示，但保留带行数的标题
-                            dataSpan.innerHTML = ` <i class="fas fa-table"></i> 数据检索结果 (${data ? data.length : 0} 条)`;
+                            dataSpan.innerHTML = ` <i class="fas fa-table"></i> 数据检索结果 (${rowCountLabel(rows ? rows.length : 0, truncated)})`;
+                            break;
+
+                        case 'data_start':
+                            // 分批返回：先渲染表头，之后逐批追加行
+                            streamColumns = event.content.columns;
+                            startStreamTable(botMsg, streamColumns);
+                            break;
+
+                        case 'data_chunk':
+                            appendTableRows(botMsg, streamColumns, event.content.rows);
+                            break;
+
+                        case 'data_end':
+                            finishStreamTable(botMsg, event.content.row_count, event.content.truncated);
                             break;
 
                         case 'explanation_start':
@@ -179,6 +208,11 @@ document.addEventListener('DOMContentLoaded', () => {
                             scrollToBottom();
                             break;
 
+                        case 'timing':
+                            // 各阶段耗时与 token 用量，仅供调试
+                            console.debug('timing', event.content);
+                            break;
+
                         case 'error':
                             botBubble.style.display = 'block';
                             botBubble.innerHTML = `<div class="error-msg">❌ 出错了: ${event.content}</div>`;
@@ -232,7 +266,7 @@ document.addEventListener('DOMContentLoaded', () => {
         return card;
     }
 
-    function updateResultCard(msgDiv, columns, data) {
+    function updateResultCard(msgDiv, columns, rows) {
         const card = msgDiv.querySelector('.result-card');
         if (!card) return;
 
@@ -241,7 +275,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
         dataHeader.style.display = 'flex';
         dataHeader.classList.add('reveal');
-        wrapper.innerHTML = renderTable(columns, data);
+        wrapper.innerHTML = renderTable(columns, rows);
         wrapper.classList.add('reveal');
         scrollToBottom();
     }
@@ -279,10 +313,10 @@ document.addEventListener('DOMContentLoaded', () => {
                 <div class="sql-block">${result.sql}</div>
                 
                 <div class="result-header">
-                    <span><i class="fas fa-table"></i> 查询结果 (${result.data ? result.data.length : 0} 条)</span>
+                    <span><i class="fas fa-table"></i> 查询结果 (${result.rows ? result.rows.length : 0} 条)</span>
                 </div>
                 <div class="table-wrapper">
-                    ${renderTable(result.columns, result.data)}
+                    ${renderTable(result.columns, result.rows)}
                 </div>
             </div>
         `;
@@ -292,26 +326,70 @@ document.addEventListener('DOMContentLoaded', () => {
         scrollToBottom();
     }
 
-    function renderTable(columns, data) {
-        if (!data || data.length === 0) return '<div style="padding: 1rem; color: var(--text-muted);">无返回数据</div>';
+    function renderTable(columns, rows) {
+        if (!rows || rows.length === 0) return '<div style="padding: 1rem; color: var(--text-muted);">无返回数据</div>';
 
         let html = '<table><thead><tr>';
         columns.forEach(col => html += `<th>${col}</th>`);
         html += '</tr></thead><tbody>';
+        html += renderRows(columns, rows);
+        html += '</tbody></table>';
+        return html;
+    }
 
-        data.forEach(row => {
+    function renderRows(columns, rows) {
+        let html = '';
+        rows.forEach(row => {
             html += '<tr>';
-            columns.forEach(col => {
-                const cell = row[col];
+            columns.forEach((col, i) => {
+                const cell = row[i];
                 html += `<td>${cell === null || cell === undefined ? '<span class="muted">null</span>' : cell}</td>`;
             });
             html += '</tr>';
         });
-
-        html += '</tbody></table>';
         return html;
     }
 
+    function startStreamTable(msgDiv, columns) {
+        const card = msgDiv.querySelector('.result-card');
+        if (!card) return;
+
+        const dataHeader = card.querySelector('.data-header');
+        const wrapper = card.querySelector('.table-wrapper');
+
+        dataHeader.style.display = 'flex';
+        dataHeader.classList.add('reveal');
+        dataHeader.querySelector('span').innerHTML = `<i class="fas fa-table"></i> 数据检索结果 <span class="header-status"><i class="fas fa-spinner fa-spin"></i> 正在检索...</span>`;
+
+        let html = '<table><thead><tr>';
+        columns.forEach(col => html += `<th>${col}</th>`);
+        html += '</tr></thead><tbody></tbody></table>';
+        wrapper.innerHTML = html;
+        wrapper.classList.add('reveal');
+        scrollToBottom();
+    }
+
+    function appendTableRows(msgDiv, columns, rows) {
+        const tbody = msgDiv.querySelector('.result-card .table-wrapper tbody');
+        if (!tbody) return;
+        tbody.insertAdjacentHTML('beforeend', renderRows(columns, rows));
+        scrollToBottom();
+    }
+
+    function rowCountLabel(rowCount, truncated) {
+        return truncated ? `${rowCount} 条，已截断` : `${rowCount} 条`;
+    }
+
+    function finishStreamTable(msgDiv, rowCount, truncated) {
+        const card = msgDiv.querySelector('.result-card');
+        if (!card) return;
+
+        card.querySelector('.data-header span').innerHTML = `<i class="fas fa-table"></i> 数据检索结果 (${rowCountLabel(rowCount, truncated)})`;
+        if (rowCount === 0) {
+            card.querySelector('.table-wrapper').innerHTML = renderTable([], []);
+        }
+    }
+
     function scrollToBottom() {
         chatContainer.scrollTop = chatContainer.scrollHeight;
     }